@@ -0,0 +1,148 @@
+"""A local stand-in for the Percy API, with configurable latency, bandwidth and error rate."""
+import json
+import random
+import threading
+import time
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+__all__ = ['FakePercyServer']
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        fake._record(self.path, len(body))
+
+        # Simulate the network: a fixed round trip plus the time to move the body.
+        delay = fake.latency
+        if fake.bandwidth:
+            delay += float(len(body)) / fake.bandwidth
+        if delay:
+            time.sleep(delay)
+
+        if fake.error_rate and fake._random.random() < fake.error_rate:
+            fake._record_error()
+            return self._respond(503, {'errors': [{'status': '503'}]})
+
+        if self.headers.get('Content-Encoding') in ('gzip', 'zstd'):
+            if self.headers.get('Content-Encoding') == 'zstd':
+                import zstandard
+                body = zstandard.ZstdDecompressor().decompress(body)
+            else:
+                body = zlib.decompress(body, 47)
+        data = json.loads(body.decode('utf-8')) if body else {}
+        self._respond(200, fake._handle(self.path, data))
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/vnd.api+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakePercyServer(object):
+    """Serves just enough of the Percy API for the client to run a whole build against it.
+
+    latency is added to every request, in seconds. bandwidth, in bytes per second, adds the time
+    it would take to receive each request body. A fraction error_rate of requests fail with a 503,
+    which the client retries. missing_ratio is the fraction of a build's resources the server
+    asks for; snapshots always ask for their root resource.
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None, error_rate=0.0, missing_ratio=1.0, seed=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.missing_ratio = missing_ratio
+        self.stats = {'requests': 0, 'bytes_received': 0, 'errors': 0, 'by_endpoint': {}}
+        self._random = random.Random(seed)
+        self._ids = 0
+        self._lock = threading.Lock()
+        self._httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/api/v1'.format(self._httpd.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _record(self, path, size):
+        endpoint = self._endpoint(path)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_received'] += size
+            by_endpoint = self.stats['by_endpoint']
+            by_endpoint[endpoint] = by_endpoint.get(endpoint, 0) + 1
+
+    def _record_error(self):
+        with self._lock:
+            self.stats['errors'] += 1
+
+    def _next_id(self):
+        with self._lock:
+            self._ids += 1
+            return str(self._ids)
+
+    def _endpoint(self, path):
+        # "/api/v1/builds/12/snapshots/" -> "builds/:id/snapshots"
+        parts = [p for p in path.split('/')[3:] if p]
+        return '/'.join(':id' if p.isdigit() else p for p in parts)
+
+    def _missing(self, resources):
+        shas = sorted(set(r['id'] for r in resources))
+        count = int(round(len(shas) * self.missing_ratio))
+        return [{'type': 'resources', 'id': sha} for sha in shas[:count]]
+
+    def _handle(self, path, data):
+        endpoint = self._endpoint(path)
+        if endpoint in ('builds', 'builds/:id/snapshots'):
+            kind = 'builds' if endpoint == 'builds' else 'snapshots'
+            resources = data['data'].get('relationships', {}).get('resources', {}).get('data', [])
+            if kind == 'snapshots':
+                missing = [{'type': 'resources', 'id': r['id']} for r in resources[:1]]
+            else:
+                missing = self._missing(resources)
+            return {
+                'data': {
+                    'id': self._next_id(),
+                    'type': kind,
+                    'relationships': {'missing-resources': {'data': missing}},
+                },
+            }
+        return {'success': True}
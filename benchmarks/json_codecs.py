@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Compares the installed JSON codecs on a create_build payload.
+
+    python -m benchmarks.json_codecs --resources 5000
+
+Not a pass/fail speed check, timings vary too much between machines.
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import timeit
+
+from percy import json_codec
+
+
+def installed_codecs():
+    codecs = []
+    for name in json_codec.PREFERRED_CODECS:
+        codec = json_codec.get_codec(name)
+        if codec.name == name:
+            codecs.append(codec)
+    return codecs
+
+
+def build_payload(resource_count):
+    # Shaped like a create_build request for a tree of resource_count files.
+    resources = []
+    for i in range(resource_count):
+        resources.append({
+            'type': 'resources',
+            'id': hashlib.sha256(str(i).encode('utf-8')).hexdigest(),
+            'attributes': {
+                'resource-url': '/assets/pkg-{}/images/sprite-{}.png'.format(i // 100, i),
+                'mimetype': None,
+                'is-root': False,
+            },
+        })
+    return {
+        'data': {
+            'type': 'builds',
+            'attributes': {
+                'branch': 'master',
+                'commit-sha': 'a' * 40,
+                'commit-message': u'Fix the café page — again',
+                'pull-request-number': None,
+            },
+            'relationships': {'resources': {'data': resources}},
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--resources', type=int, default=5000,
+                        help='resources in the create_build payload')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    payload = build_payload(args.resources)
+    reference = json.loads(json.dumps(payload))
+    for codec in installed_codecs():
+        encoded = codec.encode(payload)
+        assert codec.decode(encoded) == reference
+        encode_seconds = min(timeit.repeat(
+            lambda: codec.encode(payload), number=args.repeat, repeat=3))
+        decode_seconds = min(timeit.repeat(
+            lambda: codec.decode(encoded), number=args.repeat, repeat=3))
+        print('{:<10} encode {:7.2f} ms  decode {:7.2f} ms  {:>9,} bytes'.format(
+            codec.name, encode_seconds / args.repeat * 1000,
+            decode_seconds / args.repeat * 1000, len(encoded)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Runs the client against a local fake Percy API and writes the results as JSON.
+
+    python -m benchmarks.run --sizes 1000,10000 --latency 0.02 --output bench-results.json
+
+Each tree size runs in its own process, so the reported peak RSS belongs to that size alone.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import percy
+from benchmarks.fake_server import FakePercyServer
+from benchmarks.trees import generate_tree
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_SIZES = (1000, 10000, 50000, 200000)
+
+
+class _FakeWebdriver(object):
+    def __init__(self):
+        self.current_url = 'http://localhost/'
+        self.page_source = ''
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where it can't be measured."""
+    getrusage = getattr(resource, 'getrusage', None)
+    if getrusage is None:
+        return None
+    peak = getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_scenario(root_dir, files, snapshots=50, workers=1, server_options=None,
+                 config_options=None):
+    """Benchmark one tree of `files` files, generating it under root_dir if it isn't there yet."""
+    tree_dir = os.path.join(root_dir, 'tree-{}'.format(files))
+    if not os.path.isdir(tree_dir):
+        generate_tree(tree_dir, files)
+    tree_bytes = sum(
+        os.path.getsize(os.path.join(dir_path, name))
+        for dir_path, _, names in os.walk(tree_dir) for name in names)
+
+    result = {'files': files, 'tree_bytes': tree_bytes, 'workers': workers}
+
+    start = time.time()
+    resources = percy.ResourceLoader(
+        root_dir=tree_dir, base_url='/assets/', workers=workers).build_resources
+    result['build_resources_seconds'] = time.time() - start
+    result['build_resources_per_second'] = \
+        len(resources) / max(result['build_resources_seconds'], 1e-9)
+    del resources
+
+    with FakePercyServer(**(server_options or {})) as server:
+        config = percy.Config(
+            api_url=server.url, access_token='benchmark', **(config_options or {}))
+        webdriver = _FakeWebdriver()
+        loader = percy.ResourceLoader(
+            root_dir=tree_dir, base_url='/assets/', webdriver=webdriver, workers=workers)
+        runner = percy.Runner(loader=loader, config=config)
+
+        start = time.time()
+        runner.initialize_build()
+        result['initialize_build_seconds'] = time.time() - start
+        if runner.build_id is None:
+            raise RuntimeError('Percy is disabled, check PERCY_ENABLE and PERCY_TOKEN.')
+
+        start = time.time()
+        for i in range(snapshots):
+            webdriver.page_source = '<html><body>Page {}</body></html>'.format(i)
+            runner.snapshot(name='Page {}'.format(i))
+        runner.finalize_build()
+        result['snapshots'] = snapshots
+        result['snapshot_seconds'] = time.time() - start
+        result['snapshots_per_second'] = snapshots / max(result['snapshot_seconds'], 1e-9)
+        runner.client.connection.close()
+        result['server'] = server.stats
+
+    result['peak_rss_bytes'] = peak_rss_bytes()
+    return result
+
+
+def _run_in_child(queue, args, kwargs):
+    try:
+        queue.put(run_scenario(*args, **kwargs))
+    except Exception as e:
+        queue.put({'error': repr(e)})
+
+
+def run_isolated(*args, **kwargs):
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_run_in_child, args=(queue, args, kwargs))
+    child.start()
+    result = queue.get()
+    child.join()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='comma-separated tree sizes, in files')
+    parser.add_argument('--snapshots', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=1, help='ResourceLoader hashing workers')
+    parser.add_argument('--upload-workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added per request')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='simulated upload bandwidth, in bytes per second')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests that fail with a 503')
+    parser.add_argument('--missing-ratio', type=float, default=1.0,
+                        help='fraction of build resources the server asks for')
+    parser.add_argument('--tree-dir', default=None,
+                        help='where to generate trees; kept between runs if given')
+    parser.add_argument('--output', default='bench-results.json')
+    args = parser.parse_args(argv)
+
+    server_options = {
+        'latency': args.latency,
+        'bandwidth': args.bandwidth,
+        'error_rate': args.error_rate,
+        'missing_ratio': args.missing_ratio,
+    }
+    config_options = {'upload_workers': args.upload_workers}
+    tree_dir = args.tree_dir or tempfile.mkdtemp(prefix='percy-bench-')
+
+    results = {
+        'percy_version': percy.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': int(time.time()),
+        'server_options': server_options,
+        'config_options': config_options,
+        'scenarios': [],
+    }
+    try:
+        for size in [int(s) for s in args.sizes.split(',') if s]:
+            print('Benchmarking {} files...'.format(size))
+            scenario = run_isolated(
+                tree_dir, size, snapshots=args.snapshots, workers=args.workers,
+                server_options=server_options, config_options=config_options)
+            results['scenarios'].append(scenario)
+            print(json.dumps(scenario, indent=2, sort_keys=True))
+    finally:
+        if not args.tree_dir:
+            shutil.rmtree(tree_dir)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('Wrote {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
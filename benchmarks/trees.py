@@ -0,0 +1,42 @@
+"""Synthetic static asset trees, generated deterministically so runs are comparable."""
+import os
+import random
+
+__all__ = ['generate_tree']
+
+EXTENSIONS = ('.css', '.js', '.png', '.svg', '.woff2', '.html')
+
+
+def generate_tree(root_dir, files, files_per_dir=100, min_size=256, max_size=16 * 1024,
+                  duplicate_ratio=0.05, seed=0):
+    """Write `files` files under root_dir, spread over nested directories.
+
+    Sizes are uniform between min_size and max_size. About duplicate_ratio of the files repeat
+    the content of an earlier file, as vendored or copied assets do in real trees. Returns the
+    total number of bytes written.
+    """
+    rng = random.Random(seed)
+    total_bytes = 0
+    contents = []
+    for i in range(files):
+        directory = os.path.join(
+            root_dir, 'pkg-{:03d}'.format(i // (files_per_dir * 10)),
+            'dir-{:03d}'.format((i // files_per_dir) % 10))
+        if i % files_per_dir == 0 and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        if contents and rng.random() < duplicate_ratio:
+            content = rng.choice(contents)
+        else:
+            size = rng.randint(min_size, max_size)
+            # Seeded bytes rather than os.urandom, so every run writes the same tree.
+            content = bytearray(rng.getrandbits(8) for _ in range(64)) * (size // 64 + 1)
+            content = bytes(content[:size - 16]) + '{:016d}'.format(i).encode('ascii')
+            if len(contents) < 100:
+                contents.append(content)
+
+        path = os.path.join(directory, 'asset-{:06d}{}'.format(i, EXTENSIONS[i % len(EXTENSIONS)]))
+        with open(path, 'wb') as f:
+            f.write(content)
+        total_bytes += len(content)
+    return total_bytes
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import sys
+
 __author__ = 'Perceptual Inc.'
 __email__ = 'team@percy.io'
 __version__ = '2.0.2'
@@ -9,4 +11,8 @@ from percy.config import *
 from percy.environment import *
 from percy.resource import *
 from percy.resource_loader import *
+from percy.resource_table import *
 from percy.runner import *
+
+if sys.version_info >= (3, 5):
+    from percy.aio import *
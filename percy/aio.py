@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from percy import errors
+from percy.client import Client
+from percy.config import Config
+from percy.resource_table import ResourceTable
+from percy.runner import Runner
+
+__all__ = ['AsyncClient', 'AsyncRunner']
+
+
+class AsyncClient(object):
+    """An asyncio counterpart of Client with the same methods, as coroutines.
+
+    Requests run on a private thread pool sized to the connection pool, so they never block the
+    event loop, many can be in flight at once, and they all reuse the keep-alive connections of
+    one shared Connection.
+    """
+
+    def __init__(self, connection=None, config=None, environment=None, executor=None):
+        self._client = Client(connection=connection, config=config, environment=environment)
+        self._executor = executor or ThreadPoolExecutor(max_workers=self.config.pool_maxsize)
+
+    @property
+    def connection(self):
+        return self._client.connection
+
+    @property
+    def config(self):
+        return self._client.config
+
+    @property
+    def environment(self):
+        return self._client.environment
+
+    @property
+    def upload_tracker(self):
+        return self._client.upload_tracker
+
+    def run_in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def create_build(self, **kwargs):
+        return await self.run_in_executor(self._client.create_build, **kwargs)
+
+    async def finalize_build(self, build_id):
+        return await self.run_in_executor(self._client.finalize_build, build_id)
+
+    async def create_snapshot(self, build_id, resources, **kwargs):
+        return await self.run_in_executor(
+            self._client.create_snapshot, build_id, resources, **kwargs)
+
+    async def finalize_snapshot(self, snapshot_id):
+        return await self.run_in_executor(self._client.finalize_snapshot, snapshot_id)
+
+    async def upload_resource(self, build_id, content):
+        return await self.run_in_executor(self._client.upload_resource, build_id, content)
+
+    async def upload_resource_from_path(self, build_id, local_path, sha=None):
+        return await self.run_in_executor(
+            self._client.upload_resource_from_path, build_id, local_path, sha=sha)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.connection.close()
+
+
+class AsyncRunner(Runner):
+    """An asyncio counterpart of Runner.
+
+    Missing build and snapshot resources are uploaded concurrently, at most
+    `config.upload_workers` at a time. A loader's snapshot_resources may also be awaitable, for
+    drivers that capture the DOM asynchronously. Call `close` (or use the runner as an async
+    context manager) when done, to shut down the client's thread pool.
+    """
+
+    def __init__(self, loader=None, config=None, client=None):
+        config = config or Config()
+        # Only a client created here is closed by close().
+        self._owns_client = client is None
+        client = client or AsyncClient(config=config)
+        super(AsyncRunner, self).__init__(loader=loader, config=config, client=client)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
+
+    async def _upload_resources(self, build_id, resources):
+        # Returns (resource, exception) for each upload that failed.
+        semaphore = asyncio.Semaphore(self.config.upload_workers)
+
+        async def upload(resource):
+            async with semaphore:
+                if resource.local_path:
+                    await self.client.upload_resource_from_path(
+                        build_id, resource.local_path, sha=resource.sha)
+                else:
+                    await self.client.upload_resource(build_id, resource.content)
+
+        results = await asyncio.gather(
+            *[upload(resource) for resource in resources], return_exceptions=True)
+        return [
+            (resource, result) for resource, result in zip(resources, results)
+            if isinstance(result, Exception)
+        ]
+
+    async def initialize_build(self, **kwargs):
+        # Silently pass if Percy is disabled.
+        if not self._is_enabled:
+            return
+
+        # Walking and hashing the tree is blocking work, so keep it off the event loop.
+        loader = self.loader
+        resource_table = await self.client.run_in_executor(
+            lambda: loader.build_resource_table() if loader else ResourceTable())
+
+        with self.instrumentation.phase('create_build'):
+            self._current_build = await self.client.create_build(
+                resources=resource_table, **kwargs)
+
+        missing_resources = self._current_build['data']['relationships']['missing-resources']
+        missing_resources = missing_resources.get('data', [])
+        resources = [
+            resource_table.get(r['id']) for r in missing_resources if r['id'] in resource_table
+        ]
+
+        build_id = self._current_build['data']['id']
+        for resource in resources:
+            print('Uploading new build resource: {}'.format(resource.resource_url))
+        with self.instrumentation.phase('upload'):
+            failures = await self._upload_resources(build_id, resources)
+        if failures:
+            raise errors.ResourceUploadError(failures)
+
+    async def snapshot(self, **kwargs):
+        # Silently pass if Percy is disabled.
+        if not self._is_enabled:
+            return
+        if not self._current_build:
+            raise errors.UninitializedBuildError('Cannot call snapshot before build is initialized')
+
+        snapshot_resources = self.loader.snapshot_resources
+        if inspect.isawaitable(snapshot_resources):
+            snapshot_resources = await snapshot_resources
+        build_id = self._current_build['data']['id']
+        with self.instrumentation.phase('snapshot'):
+            snapshot_data = await self.client.create_snapshot(
+                build_id, snapshot_resources, **kwargs)
+
+            missing_resources = snapshot_data['data']['relationships']['missing-resources']
+            missing_shas = set(r['id'] for r in missing_resources.get('data', []))
+            missing = []
+            for resource in snapshot_resources:
+                if resource.sha in missing_shas:
+                    missing_shas.discard(resource.sha)
+                    missing.append(resource)
+            failures = await self._upload_resources(build_id, missing)
+            if failures:
+                raise errors.ResourceUploadError(failures)
+
+            await self.client.finalize_snapshot(snapshot_data['data']['id'])
+
+    async def finalize_build(self):
+        # Silently pass if Percy is disabled.
+        if not self._is_enabled:
+            return
+        if not self._current_build:
+            raise errors.UninitializedBuildError(
+                'Cannot finalize_build before build is initialized.')
+        build_id = self._current_build['data']['id']
+        try:
+            with self.instrumentation.phase('finalize'):
+                await self.client.finalize_build(build_id)
+        finally:
+            self._write_report()
+        self.client.upload_tracker.forget(build_id)
+        self._current_build = None
@@ -0,0 +1,125 @@
+import re
+import threading
+
+try:
+    from html.parser import HTMLParser
+except ImportError:
+    from HTMLParser import HTMLParser
+
+from percy import utils
+
+__all__ = ['AssetParser', 'css_references', 'html_references']
+
+# Attributes whose value is a single asset URL, by tag. `href` on <a> links to pages, not assets.
+URL_ATTRIBUTES = {
+    'audio': ('src',),
+    'embed': ('src',),
+    'iframe': ('src',),
+    'image': ('href', 'xlink:href'),
+    'img': ('src',),
+    'input': ('src',),
+    'link': ('href',),
+    'object': ('data',),
+    'script': ('src',),
+    'source': ('src',),
+    'track': ('src',),
+    'use': ('href', 'xlink:href'),
+    'video': ('src', 'poster'),
+}
+
+_CSS_URL_RE = re.compile(r'url\(\s*(?:"([^"]*)"|\'([^\']*)\'|([^)\s]*))\s*\)', re.IGNORECASE)
+_CSS_IMPORT_RE = re.compile(r'@import\s+(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+
+def _first_group(match):
+    return next(group for group in match.groups() if group is not None)
+
+
+def css_references(css):
+    """Return the URLs referenced by a stylesheet through url() and @import, in order."""
+    css = _CSS_COMMENT_RE.sub('', css)
+    urls = [_first_group(m) for m in _CSS_IMPORT_RE.finditer(css)]
+    urls.extend(_first_group(m) for m in _CSS_URL_RE.finditer(css))
+    return [url.strip() for url in urls if url.strip()]
+
+
+def _srcset_urls(srcset):
+    # "a.png 1x, b.png 2x" -> ["a.png", "b.png"]
+    return [candidate.split()[0] for candidate in srcset.split(',') if candidate.strip()]
+
+
+class _ReferenceParser(HTMLParser):
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.urls = []
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict((name, value) for name, value in attrs if value)
+        for name in URL_ATTRIBUTES.get(tag, ()):
+            if name in attrs:
+                self.urls.append(attrs[name].strip())
+        if 'srcset' in attrs:
+            self.urls.extend(_srcset_urls(attrs['srcset']))
+        if 'style' in attrs:
+            self.urls.extend(css_references(attrs['style']))
+        self._in_style = tag == 'style'
+
+    def handle_endtag(self, tag):
+        self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.urls.extend(css_references(data))
+
+
+def html_references(html):
+    """Return the asset URLs referenced by an HTML document, in order.
+
+    Covers URL attributes like src and href, srcset candidates, and url() and @import in inline
+    styles and <style> blocks.
+    """
+    parser = _ReferenceParser()
+    parser.feed(html)
+    parser.close()
+    return [url for url in parser.urls if url]
+
+
+class AssetParser(object):
+    """Extracts referenced URLs from HTML and CSS, caching results by content SHA.
+
+    The same layout HTML and stylesheets come up in snapshot after snapshot, so each distinct
+    document is only parsed once.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def references(self, content, mimetype, sha=None):
+        """Return the URLs referenced by content, parsed as CSS if mimetype is text/css.
+
+        content may also be a callable returning it, so that a file whose SHA is already known
+        and cached is never read.
+        """
+        key = (mimetype, sha or utils.sha256hash(content))
+        with self._lock:
+            urls = self._cache.get(key)
+            if urls is not None:
+                self.hits += 1
+                return urls
+            self.misses += 1
+        if callable(content):
+            content = content()
+        if not utils._is_unicode(content):
+            content = content.decode('utf-8', 'replace')
+        if mimetype == 'text/css':
+            urls = css_references(content)
+        else:
+            urls = html_references(content)
+        with self._lock:
+            self._cache[key] = urls
+        return urls
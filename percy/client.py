@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import itertools
+
 from percy.connection import Connection
 from percy.environment import Environment
 from percy.config import Config
+from percy import errors
 from percy import utils
+from percy.pool import imap
+from percy.resource_table import ResourceTable
+from percy import streaming
+from percy.streaming import ResourceUploadBody
+from percy.upload_tracker import UploadTracker
 
 __all__ = ['Client']
 
@@ -14,6 +22,7 @@ class Client(object):
         self._environment = environment if environment else Environment()
         self._config = config if config else Config()
         self._connection = connection if connection else Connection(self._config, self._environment)
+        self._upload_tracker = UploadTracker()
 
     @property
     def connection(self):
@@ -27,6 +36,10 @@ class Client(object):
     def environment(self):
         return self._environment
 
+    @property
+    def upload_tracker(self):
+        return self._upload_tracker
+
     def create_build(self, **kwargs):
         branch = kwargs.get('branch') or self.environment.branch
         pull_request_number = kwargs.get('pull_request_number') \
@@ -64,16 +77,27 @@ class Client(object):
             }
         }
 
-        if resources:
+        # Resources may be a ResourceTable or any iterable of Resources, including a generator
+        # streamed from a ResourceLoader. They are encoded into the request body one at a time,
+        # so neither the serialized manifest nor its JSON text is ever held in memory at once.
+        if isinstance(resources, ResourceTable):
+            serialized_resources = resources.serialize()
+        else:
+            serialized_resources = (r.serialize() for r in resources or [])
+        first_resource = next(serialized_resources, None)
+        if first_resource is not None:
             data['data']['relationships'] = {
                 'resources': {
-                    'data': [r.serialize() for r in resources],
+                    'data': streaming.STREAM_PLACEHOLDER,
                 }
             }
+            serialized_resources = itertools.chain([first_resource], serialized_resources)
 
         path = "{base_url}/builds/".format(base_url=self.config.api_url)
 
-        return self._connection.post(path=path, data=data)
+        chunks = streaming.iterencode(
+            data, serialized_resources, encode=self._connection.json_codec.encode)
+        return self._connection.post_json_stream(path=path, chunks=chunks)
 
     def finalize_build(self, build_id):
         path = "{base_url}/builds/{build_id}/finalize".format(
@@ -109,6 +133,44 @@ class Client(object):
         )
         return self._connection.post(path=path, data=data)
 
+    def create_snapshots(self, build_id, snapshots, return_errors=False):
+        """Create many snapshots at once.
+
+        Each item of snapshots is a dict of create_snapshot arguments, with the snapshot's
+        resources under 'resources'. The API takes one snapshot per request, so the requests are
+        sent concurrently over the shared connection pool. Results come back in input order; if
+        any snapshot fails, a SnapshotError listing all failures is raised once all are done.
+        With return_errors, nothing is raised and a (result, error) pair is returned per
+        snapshot instead, so the ones that were created can still be finished.
+        """
+        def create(snapshot):
+            snapshot = dict(snapshot)
+            resources = snapshot.pop('resources', None)
+            return self.create_snapshot(build_id, resources, **snapshot)
+
+        labels = [s.get('name') or s['resources'][0].resource_url for s in snapshots]
+        return self._fan_out(create, snapshots, labels, return_errors)
+
+    def finalize_snapshots(self, snapshot_ids, return_errors=False):
+        return self._fan_out(self.finalize_snapshot, snapshot_ids, snapshot_ids, return_errors)
+
+    def _fan_out(self, func, items, labels, return_errors=False):
+        def call(item):
+            try:
+                return func(item), None
+            except Exception as e:
+                return None, e
+
+        workers = min(len(items), self.config.pool_maxsize)
+        outcomes = list(imap(call, items, workers=workers))
+        if return_errors:
+            return outcomes
+        failures = [
+            (label, error) for label, (_, error) in zip(labels, outcomes) if error is not None]
+        if failures:
+            raise errors.SnapshotError(failures)
+        return [result for result, _ in outcomes]
+
     def finalize_snapshot(self, snapshot_id):
         path = "{base_url}/snapshots/{snapshot_id}/finalize".format(
             base_url=self.config.api_url,
@@ -117,7 +179,12 @@ class Client(object):
         return self._connection.post(path=path, data={})
 
     def upload_resource(self, build_id, content):
+        # Returns None without a request if this build already has (or is receiving) the content.
         sha = utils.sha256hash(content)
+        return self._upload_tracker.upload(
+            build_id, sha, lambda: self._upload_resource(build_id, sha, content))
+
+    def _upload_resource(self, build_id, sha, content):
         data = {
             'data': {
                 'type': 'resources',
@@ -133,3 +200,17 @@ class Client(object):
             build_id=build_id
         )
         return self._connection.post(path=path, data=data)
+
+    def upload_resource_from_path(self, build_id, local_path, sha=None):
+        # Streams the file from disk, so memory use doesn't grow with the size of the file.
+        sha = sha or utils.sha256hash_file(local_path)
+        return self._upload_tracker.upload(
+            build_id, sha, lambda: self._upload_resource_from_path(build_id, sha, local_path))
+
+    def _upload_resource_from_path(self, build_id, sha, local_path):
+        path = "{base_url}/builds/{build_id}/resources/".format(
+            base_url=self.config.api_url,
+            build_id=build_id
+        )
+        with ResourceUploadBody(sha, local_path) as body:
+            return self._connection.post_stream(path=path, body=body)
@@ -6,10 +6,59 @@ __all__ = ['Config']
 
 class Config(object):
 
-    def __init__(self, api_url=None, default_widths=None, access_token=None):
+    def __init__(self, api_url=None, default_widths=None, access_token=None, upload_workers=None,
+                 pool_connections=None, pool_maxsize=None, hash_cache_path=None,
+                 snapshot_workers=None, snapshot_queue_size=None, snapshot_batch_size=None,
+                 snapshot_flush_interval=None, compression=None, compression_level=None,
+                 compression_threshold=None, json_codec=None, report_path=None,
+                 max_concurrency=None, max_retries=None, shard_cache_path=None,
+                 git_index_path=None):
         self._api_url = os.getenv('PERCY_API', api_url or 'https://percy.io/api/v1')
         self._default_widths = default_widths or []
         self._access_token = os.getenv('PERCY_TOKEN', access_token)
+        # Number of concurrent build resource uploads. This also bounds how many resource
+        # bodies are in flight at once.
+        self._upload_workers = int(os.getenv('PERCY_UPLOAD_WORKERS', upload_workers or 4))
+        # Connection pool sizing for the shared HTTP session: the number of hosts to keep pools
+        # for, and the number of keep-alive connections to keep per host.
+        self._pool_connections = pool_connections or 10
+        self._pool_maxsize = pool_maxsize or max(10, self._upload_workers)
+        # Location of a persistent file digest cache used when scanning build resources.
+        self._hash_cache_path = os.getenv('PERCY_HASH_CACHE', hash_cache_path)
+        # Location of an index of file digests by git blob ID, which stays valid across clones
+        # and can be committed or cached between CI runs.
+        self._git_index_path = os.getenv('PERCY_GIT_INDEX', git_index_path)
+        # When above zero, Runner.snapshot only captures the DOM and queues the network work for
+        # this many background threads. At most snapshot_queue_size snapshots wait in the queue.
+        self._snapshot_workers = int(os.getenv('PERCY_SNAPSHOT_WORKERS', snapshot_workers or 0))
+        self._snapshot_queue_size = snapshot_queue_size or 4 * max(1, self._snapshot_workers)
+        # When above one, Runner collects snapshots and sends them in batches of this size, or
+        # sooner once the oldest pending snapshot has waited snapshot_flush_interval seconds.
+        self._snapshot_batch_size = int(
+            os.getenv('PERCY_SNAPSHOT_BATCH_SIZE', snapshot_batch_size or 1))
+        self._snapshot_flush_interval = 5.0 if snapshot_flush_interval is None \
+            else snapshot_flush_interval
+        # Request body compression: 'gzip', 'zstd' (needs the zstandard package, otherwise gzip
+        # is used) or None. Bodies smaller than compression_threshold bytes are sent as-is.
+        self._compression = os.getenv('PERCY_COMPRESSION', compression)
+        self._compression_level = int(
+            os.getenv('PERCY_COMPRESSION_LEVEL', compression_level or 6))
+        self._compression_threshold = 8192 if compression_threshold is None \
+            else compression_threshold
+        # JSON library for request and response bodies: 'auto' uses the fastest one installed
+        # (orjson, ujson, then rapidjson) and otherwise the standard library's json.
+        self._json_codec = os.getenv('PERCY_JSON_CODEC', json_codec or 'auto')
+        # Where Runner.finalize_build writes a JSON summary of request and phase timings.
+        self._report_path = os.getenv('PERCY_REPORT_PATH', report_path)
+        # Upper bound for the adaptive limit on concurrent requests, and how many times a 429 or
+        # 5xx response is retried.
+        self._max_concurrency = int(
+            os.getenv('PERCY_MAX_CONCURRENCY', max_concurrency or self._pool_maxsize))
+        self._max_retries = int(os.getenv(
+            'PERCY_MAX_RETRIES', 3 if max_retries is None else max_retries))
+        # Location of a machine-local SQLite file through which the workers of a parallel build
+        # on the same machine share which build resources are already being uploaded.
+        self._shard_cache_path = os.getenv('PERCY_SHARD_CACHE', shard_cache_path)
 
     @property
     def api_url(self):
@@ -27,6 +76,142 @@ class Config(object):
     def default_widths(self, value):
         self._default_widths = value
 
+    @property
+    def upload_workers(self):
+        return self._upload_workers
+
+    @upload_workers.setter
+    def upload_workers(self, value):
+        self._upload_workers = value
+
+    @property
+    def pool_connections(self):
+        return self._pool_connections
+
+    @pool_connections.setter
+    def pool_connections(self, value):
+        self._pool_connections = value
+
+    @property
+    def pool_maxsize(self):
+        return self._pool_maxsize
+
+    @pool_maxsize.setter
+    def pool_maxsize(self, value):
+        self._pool_maxsize = value
+
+    @property
+    def hash_cache_path(self):
+        return self._hash_cache_path
+
+    @hash_cache_path.setter
+    def hash_cache_path(self, value):
+        self._hash_cache_path = value
+
+    @property
+    def git_index_path(self):
+        return self._git_index_path
+
+    @git_index_path.setter
+    def git_index_path(self, value):
+        self._git_index_path = value
+
+    @property
+    def snapshot_workers(self):
+        return self._snapshot_workers
+
+    @snapshot_workers.setter
+    def snapshot_workers(self, value):
+        self._snapshot_workers = value
+
+    @property
+    def snapshot_queue_size(self):
+        return self._snapshot_queue_size
+
+    @snapshot_queue_size.setter
+    def snapshot_queue_size(self, value):
+        self._snapshot_queue_size = value
+
+    @property
+    def snapshot_batch_size(self):
+        return self._snapshot_batch_size
+
+    @snapshot_batch_size.setter
+    def snapshot_batch_size(self, value):
+        self._snapshot_batch_size = value
+
+    @property
+    def snapshot_flush_interval(self):
+        return self._snapshot_flush_interval
+
+    @snapshot_flush_interval.setter
+    def snapshot_flush_interval(self, value):
+        self._snapshot_flush_interval = value
+
+    @property
+    def compression(self):
+        return self._compression
+
+    @compression.setter
+    def compression(self, value):
+        self._compression = value
+
+    @property
+    def compression_level(self):
+        return self._compression_level
+
+    @compression_level.setter
+    def compression_level(self, value):
+        self._compression_level = value
+
+    @property
+    def compression_threshold(self):
+        return self._compression_threshold
+
+    @compression_threshold.setter
+    def compression_threshold(self, value):
+        self._compression_threshold = value
+
+    @property
+    def json_codec(self):
+        return self._json_codec
+
+    @json_codec.setter
+    def json_codec(self, value):
+        self._json_codec = value
+
+    @property
+    def report_path(self):
+        return self._report_path
+
+    @report_path.setter
+    def report_path(self, value):
+        self._report_path = value
+
+    @property
+    def max_concurrency(self):
+        return self._max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, value):
+        self._max_concurrency = value
+
+    @property
+    def max_retries(self):
+        return self._max_retries
+
+    @max_retries.setter
+    def max_retries(self, value):
+        self._max_retries = value
+
+    @property
+    def shard_cache_path(self):
+        return self._shard_cache_path
+
+    @shard_cache_path.setter
+    def shard_cache_path(self, value):
+        self._shard_cache_path = value
+
     @property
     def access_token(self):
         if not self._access_token:
@@ -1,20 +1,77 @@
+import os
+import threading
+import zlib
+
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
+from percy.instrumentation import Instrumentation, endpoint_name
+from percy.json_codec import get_codec
+from percy.streaming import SpooledBody, UPLOAD_CHUNK_BYTES
+from percy.throttle import AdaptiveThrottle, RETRY_STATUSES
 from percy.user_agent import UserAgent
 from percy import utils
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 class Connection(object):
-    def __init__(self, config, environment):
+    def __init__(self, config, environment, instrumentation=None):
         self.config = config
         self.user_agent = str(UserAgent(config, environment))
+        self.json_codec = get_codec(config.json_codec)
+        # Every request is recorded here; see Instrumentation for subscribing to events.
+        self.instrumentation = instrumentation or Instrumentation()
+        # Shared by every request on this connection, and so by everything a Runner sends.
+        self.throttle = AdaptiveThrottle(
+            max_limit=config.max_concurrency,
+            max_retries=config.max_retries,
+            instrumentation=self.instrumentation,
+        )
+        self.instrumentation.add_source('throttle', self.throttle.metrics)
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # In a forked child, locks may be held by threads that don't exist here, and the
+        # throttle still counts the parent's requests. Reset them before anything uses them.
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._session_lock = threading.Lock()
+            self.throttle.after_fork()
+
+    @property
+    def session(self):
+        # One long-lived session per Connection, so keep-alive connections are reused across
+        # requests and threads. Pooled sockets must never be shared with a forked child, so the
+        # session is rebuilt whenever we find ourselves in a new process.
+        self._check_fork()
+        pid = os.getpid()
+        if self._session_pid != pid:
+            with self._session_lock:
+                if self._session_pid != pid:
+                    self._session = self._requests_retry_session()
+                    self._session_pid = pid
+        return self._session
+
+    def close(self):
+        if self._session is not None and self._session_pid == os.getpid():
+            self._session.close()
+        self._session = None
+        self._session_pid = None
 
     def _requests_retry_session(
         self,
         retries=3,
         backoff_factor=0.3,
         method_whitelist=['HEAD', 'GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'],
-        status_forcelist=(500, 502, 503, 504, 520, 524),
+        # Error statuses are retried by _request instead, through the adaptive throttle.
+        status_forcelist=(),
         session=None,
     ):
         session = session or requests.Session()
@@ -27,7 +84,11 @@ class Connection(object):
             backoff_factor=backoff_factor,
             status_forcelist=status_forcelist,
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = HTTPAdapter(
+            pool_connections=self.config.pool_connections,
+            pool_maxsize=self.config.pool_maxsize,
+            max_retries=retry,
+        )
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         return session
@@ -40,26 +101,113 @@ class Connection(object):
             'Authorization': self._token_header(),
             'User-Agent': self.user_agent,
         }
-        response = self._requests_retry_session().get(path, headers=headers)
+        response = self._request('GET', path, headers=headers)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             utils.print_error('Received a {} error requesting: {}'.format(response.status_code, path))
             utils.print_error(response.content)
             raise e
-        return response.json()
+        return self.json_codec.decode(response.content)
 
     def post(self, path, data, options={}):
-        headers = {
+        return self._post_encoded(path, self.json_codec.encode(data))
+
+    def post_json_stream(self, path, chunks, options={}):
+        # Like post, but the JSON body is given as an iterable of encoded chunks (see
+        # streaming.iterencode) that are spooled as they come rather than built up in memory.
+        # Bodies small enough to stay in memory are sent exactly as post would send them.
+        with SpooledBody() as body:
+            for chunk in chunks:
+                body.write(chunk)
+            if body.in_memory:
+                return self._post_encoded(path, body.getvalue())
+            return self.post_stream(path, body)
+
+    def _post_encoded(self, path, body):
+        headers = {}
+        if self._should_compress(body):
+            encoding, body = self._compress(body)
+            headers['Content-Encoding'] = encoding
+        return self._post(path, data=body, headers=headers)
+
+    def _should_compress(self, body):
+        return self.config.compression and len(body) >= self.config.compression_threshold
+
+    def _compressor(self):
+        level = self.config.compression_level
+        if self.config.compression == 'zstd' and zstandard:
+            return 'zstd', zstandard.ZstdCompressor(level=level).compressobj()
+        # wbits=31 writes a gzip header and trailer rather than a bare zlib stream.
+        return 'gzip', zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def _compress(self, body):
+        encoding, compressor = self._compressor()
+        return encoding, compressor.compress(body) + compressor.flush()
+
+    def _compress_spooled(self, body):
+        encoding, compressor = self._compressor()
+        compressed = SpooledBody()
+        body.seek(0)
+        for chunk in iter(lambda: body.read(UPLOAD_CHUNK_BYTES), b''):
+            compressed.write(compressor.compress(chunk))
+        compressed.write(compressor.flush())
+        return encoding, compressed
+
+    def post_stream(self, path, body, options={}):
+        # Like post, but body is an already-encoded file-like object that is streamed as it is
+        # sent instead of being serialized in memory. When it should be compressed, it is first
+        # compressed chunk by chunk into a spooled body, which is then streamed instead.
+        if self._should_compress(body):
+            encoding, compressed = self._compress_spooled(body)
+            with compressed:
+                compressed.seek(0)
+                return self._post(path, data=compressed, headers={'Content-Encoding': encoding})
+        body.seek(0)
+        return self._post(path, data=body)
+
+    def _request(self, method, path, **kwargs):
+        # Connection errors are retried by urllib3. Overload responses (429 and 5xx) are retried
+        # here, so they can honor Retry-After and feed the throttle's concurrency limit.
+        self._check_fork()
+        key = endpoint_name(path)
+        body = kwargs.get('data')
+        size = len(body) if hasattr(body, '__len__') else None
+        attempt = 0
+        while True:
+            started_at = self.throttle.acquire()
+            response = None
+            error = None
+            try:
+                response = self.session.request(method, path, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                status = response.status_code if response is not None else None
+                self.throttle.release(started_at, status, key=key, size=size)
+                self.instrumentation.record_response(
+                    method, path, started_at, body, response, error=error)
+
+            if response.status_code not in RETRY_STATUSES or attempt >= self.throttle.max_retries:
+                return response
+            attempt += 1
+            self.throttle.backoff(attempt, response.headers.get('Retry-After'))
+            if hasattr(body, 'seek'):
+                body.seek(0)
+
+    def _post(self, path, headers=None, **kwargs):
+        headers = dict(headers or {})
+        headers.update({
             'Content-Type': 'application/vnd.api+json',
             'Authorization': self._token_header(),
             'User-Agent': self.user_agent,
-        }
-        response = self._requests_retry_session().post(path, json=data, headers=headers)
+        })
+        response = self._request('POST', path, headers=headers, **kwargs)
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             utils.print_error('Received a {} error posting to: {}.'.format(response.status_code, path))
             utils.print_error(response.content)
             raise e
-        return response.json()
+        return self.json_codec.decode(response.content)
@@ -1,26 +1,63 @@
+import functools
+import json
 import os
-import re
 import subprocess
+import zlib
 
 from percy import errors
 from percy import utils
+from percy import git_reader
 
 __all__ = ['Environment']
 
-GIT_COMMIT_FORMAT = '%n'.join([
-  'COMMIT_SHA:%H',
-  'AUTHOR_NAME:%an',
-  'AUTHOR_EMAIL:%ae',
-  'COMMITTER_NAME:%cn',
-  'COMMITTER_EMAIL:%ce',
-  'COMMITTED_DATE:%ai',
-  # Note: order is important, this must come last because the regex is a multiline match.
-  'COMMIT_MESSAGE:%B',
-]); # git show format uses %n for newlines.
+# Fields read from `git show`, in the order they appear in GIT_COMMIT_FORMAT.
+GIT_COMMIT_FIELDS = [
+    'sha',
+    'author_name',
+    'author_email',
+    'committer_name',
+    'committer_email',
+    'committed_at',
+    # Ref decorations such as "HEAD -> master, origin/master", used to find the branch.
+    'refs',
+    'message',
+]
+# One NUL-separated record (git show format uses %x00 for NUL), so a single git call gives us
+# everything and no field can be confused with the contents of another.
+GIT_COMMIT_FORMAT = '%x00'.join(['%H', '%an', '%ae', '%cn', '%ce', '%ai', '%D', '%B'])
+
+# Holds a resolved Environment as JSON, or the path of a file containing it. Child processes
+# (test workers, CI shards) started with it set load it instead of detecting everything again.
+SNAPSHOT_ENV_VAR = 'PERCY_ENVIRONMENT_SNAPSHOT'
+SNAPSHOT_PROPERTIES = [
+    'current_ci',
+    'pull_request_number',
+    'branch',
+    'target_branch',
+    'commit_data',
+    'commit_sha',
+    'target_commit_sha',
+    'parallel_nonce',
+    'parallel_total_shards',
+]
+
+
+def _snapshotted(func):
+    # Return the value from a loaded snapshot, if there is one, instead of detecting it.
+    @functools.wraps(func)
+    def wrapper(self):
+        if self._snapshot is not None:
+            return self._snapshot.get(func.__name__)
+        return func(self)
+    return wrapper
 
 
 class Environment(object):
     def __init__(self):
+        # Parsed `git show` output by commit, so git runs at most once per commit for the
+        # lifetime of this object.
+        self._git_commits = {}
+        self._snapshot = self._load_snapshot()
         self._real_env = None
         if os.getenv('TRAVIS_BUILD_ID'):
             self._real_env = TravisEnvironment()
@@ -40,11 +77,13 @@ class Environment(object):
             self._real_env = GitlabEnvironment()
 
     @property
+    @_snapshotted
     def current_ci(self):
         if self._real_env:
             return self._real_env.current_ci
 
     @property
+    @_snapshotted
     def pull_request_number(self):
         if os.getenv('PERCY_PULL_REQUEST'):
             return os.getenv('PERCY_PULL_REQUEST')
@@ -52,6 +91,7 @@ class Environment(object):
             return self._real_env.pull_request_number
 
     @property
+    @_snapshotted
     def branch(self):
         # First, percy env var.
         if os.getenv('PERCY_BRANCH'):
@@ -68,47 +108,39 @@ class Environment(object):
         return None
 
     @property
+    @_snapshotted
     def target_branch(self):
         if os.getenv('PERCY_TARGET_BRANCH'):
             return os.getenv('PERCY_TARGET_BRANCH')
         return None
 
     @property
+    @_snapshotted
     def commit_data(self):
-
-        # Try getting data from git
-        # If this has a result, it means git is present in the system.
-        raw_git_output = self._git_commit_output()
-
+        # Try getting data from git.
         # If not running in a git repo, allow undefined for certain commit attributes.
-        def parse(regex):
-            if not raw_git_output:
-                return None
-            match = regex.search(raw_git_output)
-            if match:
-                return match.group(1)
-            else:
-                return None
+        git_commit = self._git_commit()
 
         return {
             # The only required attribute:
             'branch': self.branch,
             # An optional but important attribute:
-            'sha': self.commit_sha or parse(re.compile("COMMIT_SHA:(.*)")),
+            'sha': self.commit_sha or git_commit.get('sha'),
 
             # Optional attributes:
             # If we have the git information, read from those rather than env vars.
             # The GIT_ environment vars are from the Jenkins Git Plugin, but could be
             # used generically. This behavior may change in the future.
-            'message': parse(re.compile("COMMIT_MESSAGE:(.*)", flags=re.MULTILINE)),
-            'committed_at': parse(re.compile("COMMITTED_DATE:(.*)")),
-            'author_name': parse(re.compile("AUTHOR_NAME:(.*)")) or os.getenv('GIT_AUTHOR_NAME'),
-            'author_email': parse(re.compile("AUTHOR_EMAIL:(.*)")) or os.getenv('GIT_AUTHOR_EMAIL'),
-            'committer_name': parse(re.compile("COMMITTER_NAME:(.*)")) or os.getenv('GIT_COMMITTER_NAME'),
-            'committer_email': parse(re.compile("COMMITTER_EMAIL:(.*)")) or os.getenv('GIT_COMMITTER_EMAIL'),
+            'message': git_commit.get('message'),
+            'committed_at': git_commit.get('committed_at'),
+            'author_name': git_commit.get('author_name') or os.getenv('GIT_AUTHOR_NAME'),
+            'author_email': git_commit.get('author_email') or os.getenv('GIT_AUTHOR_EMAIL'),
+            'committer_name': git_commit.get('committer_name') or os.getenv('GIT_COMMITTER_NAME'),
+            'committer_email': git_commit.get('committer_email') or os.getenv('GIT_COMMITTER_EMAIL'),
         }
 
     @property
+    @_snapshotted
     def commit_sha(self):
         # First, percy env var.
         if os.getenv('PERCY_COMMIT'):
@@ -118,12 +150,14 @@ class Environment(object):
             return self._real_env.commit_sha
 
     @property
+    @_snapshotted
     def target_commit_sha(self):
         if os.getenv('PERCY_TARGET_COMMIT'):
             return os.getenv('PERCY_TARGET_COMMIT')
         return None
 
     @property
+    @_snapshotted
     def parallel_nonce(self):
         if os.getenv('PERCY_PARALLEL_NONCE'):
           return os.getenv('PERCY_PARALLEL_NONCE')
@@ -131,43 +165,100 @@ class Environment(object):
             return self._real_env.parallel_nonce
 
     @property
+    @_snapshotted
     def parallel_total_shards(self):
         if os.getenv('PERCY_PARALLEL_TOTAL'):
             return int(os.getenv('PERCY_PARALLEL_TOTAL'))
         if self._real_env and hasattr(self._real_env, 'parallel_total_shards'):
             return self._real_env.parallel_total_shards
 
+    def export_snapshot(self, path=None):
+        """Resolve everything once and return it as JSON, also writing it to path if given.
+
+        Set the result (or the path) as PERCY_ENVIRONMENT_SNAPSHOT for child processes, or call
+        export_to_environ, and every Environment they create reuses it.
+        """
+        snapshot = json.dumps(dict((name, getattr(self, name)) for name in SNAPSHOT_PROPERTIES))
+        if path:
+            with open(path, 'w') as f:
+                f.write(snapshot)
+        return snapshot
+
+    def export_to_environ(self, path=None):
+        snapshot = self.export_snapshot(path)
+        os.environ[SNAPSHOT_ENV_VAR] = path or snapshot
+
+    def _load_snapshot(self):
+        value = os.getenv(SNAPSHOT_ENV_VAR)
+        if not value:
+            return None
+        try:
+            if value.lstrip().startswith('{'):
+                return json.loads(value)
+            with open(value) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            utils.print_error(
+                '[percy] Warning: ignoring unreadable {}: {}'.format(SNAPSHOT_ENV_VAR, e))
+            return None
+
     def _raw_git_output(self, args):
-        process = subprocess.Popen(
-            ['git'] + args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False
-        )
-        return process.stdout.read().strip().decode('utf-8')
+        output = utils.git_output(args)
+        return output.strip().decode('utf-8') if output else ''
 
     def _raw_commit_output(self, commit_sha):
         # Make sure commit_sha is only alphanumeric characters to prevent command injection.
         if not commit_sha or len(commit_sha) > 100 or not commit_sha.isalnum():
             return ''
 
-        args = ['show', commit_sha, '--quiet', '--format="' + GIT_COMMIT_FORMAT + '"'];
+        args = ['show', commit_sha, '--quiet', '--format=' + GIT_COMMIT_FORMAT]
         return self._raw_git_output(args)
 
-    def _git_commit_output(self):
-        raw_git_output = ''
+    def _native_commit(self, commit_sha):
+        # Opt-in, in-process reading of the .git directory, for images where spawning git is
+        # slow or git is missing. Returns {} for anything it can't handle, so git is used instead.
+        if os.getenv('PERCY_GIT_READER') != 'native':
+            return {}
+        if not commit_sha or len(commit_sha) > 100 or not commit_sha.isalnum():
+            return {}
+        try:
+            return git_reader.GitReader().commit(commit_sha)
+        except (git_reader.UnsupportedGitRepoError, IOError, OSError, ValueError, zlib.error):
+            return {}
+
+    def _parsed_commit(self, commit_sha):
+        if commit_sha not in self._git_commits:
+            git_commit = self._native_commit(commit_sha)
+            if not git_commit:
+                fields = self._raw_commit_output(commit_sha).split('\x00')
+                if len(fields) == len(GIT_COMMIT_FIELDS):
+                    git_commit = dict(zip(GIT_COMMIT_FIELDS, fields))
+            self._git_commits[commit_sha] = git_commit
+        return self._git_commits[commit_sha]
+
+    def _git_commit(self):
+        git_commit = {}
         # Try getting commit data from commit_sha set by environment variables
         if self.commit_sha:
-          raw_git_output = self._raw_commit_output(self.commit_sha)
+          git_commit = self._parsed_commit(self.commit_sha)
 
-        # If there's no raw_git_output, it probably means there's not a sha, so try `HEAD`
-        if not raw_git_output:
-          raw_git_output = self._raw_commit_output('HEAD')
+        # If there's no git_commit, it probably means there's not a sha, so try `HEAD`
+        if not git_commit:
+          git_commit = self._parsed_commit('HEAD')
 
-        return raw_git_output
+        return git_commit
 
     def _raw_branch_output(self):
-        return self._raw_git_output(['rev-parse', '--abbrev-ref', 'HEAD'])
+        # Taken from the decorations of the HEAD commit, which we usually need for commit data
+        # anyway, rather than from a separate `git rev-parse --abbrev-ref HEAD`.
+        head_commit = self._parsed_commit('HEAD')
+        if not head_commit:
+            return ''
+        for ref in head_commit['refs'].split(', '):
+            if ref.startswith('HEAD -> '):
+                return ref[len('HEAD -> '):]
+        # Detached HEAD, reported the same way rev-parse does.
+        return 'HEAD'
 
     def _get_origin_url(self):
         process = subprocess.Popen(
@@ -9,3 +9,21 @@ class RepoNotFoundError(Error):
 
 class UninitializedBuildError(Error):
     pass
+
+class BatchError(Error):
+    # Raised once for a group of operations, with every (item, exception) that failed.
+    description = 'operation(s)'
+
+    def __init__(self, failures):
+        self.failures = failures
+        super(BatchError, self).__init__(
+            '{} {} failed: {}'.format(
+                len(failures),
+                self.description,
+                '; '.join('{!r}: {}'.format(item, e) for item, e in failures)))
+
+class ResourceUploadError(BatchError):
+    description = 'resource upload(s)'
+
+class SnapshotError(BatchError):
+    description = 'snapshot(s)'
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+
+from percy import utils
+
+__all__ = ['GitHashIndex']
+
+# Bump when the file layout or the meaning of a stored digest changes; older indexes are ignored.
+INDEX_VERSION = 1
+
+# Index entries for regular files. Symlinks (120000) and submodules (160000) are never hashed
+# through their blob.
+_FILE_MODES = ('100644', '100755')
+
+
+def _decode_path(path):
+    # Paths come out of git as bytes; match what os.walk yields.
+    fsdecode = getattr(os, 'fsdecode', None)
+    return fsdecode(path) if fsdecode else path
+
+
+def clean_tracked_blobs(root_dir):
+    """Map the absolute path of every tracked file under root_dir to its git blob ID.
+
+    Files that differ from the index are left out, as is everything when root_dir isn't inside
+    a git work tree or git isn't available.
+    """
+    # Paths are kept relative to root_dir and joined onto it as given, rather than onto the
+    # work tree's top level, which git reports with symlinks resolved and so wouldn't match
+    # the walked paths when root_dir is reached through a symlink.
+    listing = utils.git_output(['ls-files', '-s', '-z', '--', '.'], root_dir)
+    dirty = utils.git_output(['diff-files', '--name-only', '--relative', '-z', '--', '.'], root_dir)
+    if listing is None or dirty is None:
+        return {}
+    root_dir = os.path.abspath(root_dir)
+    dirty = set(dirty.split(b'\x00'))
+
+    blobs = {}
+    for line in listing.split(b'\x00'):
+        # "<mode> <blob id> <stage>\t<path>"
+        info, _, path = line.partition(b'\t')
+        fields = info.split()
+        if len(fields) != 3 or path in dirty:
+            continue
+        mode, blob_id, stage = [f.decode('ascii') for f in fields]
+        # Nonzero stages are unmerged entries, which have no single blob.
+        if mode not in _FILE_MODES or stage != '0':
+            continue
+        path = os.path.join(root_dir, *_decode_path(path).split('/'))
+        blobs[os.path.normcase(path)] = blob_id
+    return blobs
+
+
+class GitHashIndex(object):
+    """A JSON file mapping git blob IDs to the SHA-256 digests of their contents.
+
+    Unlike HashCache, which trusts a file while its stat info is unchanged, this is keyed by what
+    git knows a file contains, so it stays valid on a fresh clone where every mtime is new, and
+    can be committed or kept as a CI cache artifact. Each digest is stored with the file size it
+    was computed from and only trusted for a file of that size, which guards against checkouts
+    that rewrite contents differently (line ending conversion, clean/smudge filters).
+
+    `save` only keeps entries for blobs seen since the index was loaded, so the file tracks the
+    current tree instead of growing forever. Use one index per root_dir.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._seen = {}
+        self._changed = False
+        self._blobs = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            data = None
+        if isinstance(data, dict) and data.get('version') == INDEX_VERSION:
+            self._digests = data.get('digests') or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.save()
+
+    def scan(self, root_dir):
+        """Ask git for the clean tracked files under root_dir. Returns how many were found."""
+        blobs = clean_tracked_blobs(root_dir)
+        with self._lock:
+            self._blobs = blobs
+        return len(blobs)
+
+    def blob_id(self, path):
+        """The blob ID of path if it was a clean tracked file at the last scan, otherwise None."""
+        return self._blobs.get(os.path.normcase(os.path.abspath(path)))
+
+    def lookup(self, path, stat):
+        """Return the known digest for path, or None if it is untracked, dirty or unknown."""
+        blob_id = self.blob_id(path)
+        with self._lock:
+            entry = self._digests.get(blob_id) if blob_id else None
+            if entry is None or entry[0] != stat.st_size:
+                self.misses += 1
+                return None
+            self._seen[blob_id] = entry
+            self.hits += 1
+            return entry[1]
+
+    def store(self, path, stat, sha):
+        blob_id = self.blob_id(path)
+        if not blob_id:
+            return
+        with self._lock:
+            entry = [stat.st_size, sha]
+            self._changed = self._changed or self._digests.get(blob_id) != entry
+            self._digests[blob_id] = entry
+            self._seen[blob_id] = entry
+
+    def save(self):
+        """Write the index if any digest was added, or any entry is no longer in the tree."""
+        with self._lock:
+            if not self._seen or not (self._changed or len(self._seen) != len(self._digests)):
+                return
+            digests = dict(self._seen)
+            index_dir = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            # Write to a temporary file and rename it, so readers never see a partial index.
+            tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(
+                    {'version': INDEX_VERSION, 'digests': digests}, f,
+                    indent=0, separators=(',', ':'), sort_keys=True)
+            if hasattr(os, 'replace'):
+                os.replace(tmp_path, self.path)
+            else:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                os.rename(tmp_path, self.path)
+            self._digests = digests
+            self._changed = False
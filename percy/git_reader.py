@@ -0,0 +1,161 @@
+import datetime
+import os
+import re
+import zlib
+
+from percy import errors
+
+__all__ = ['GitReader']
+
+_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+class UnsupportedGitRepoError(errors.Error):
+    """Raised for anything the in-process reader can't handle, so callers can fall back to git."""
+    pass
+
+
+def find_git_dir(start_dir=None):
+    if os.getenv('GIT_DIR'):
+        return os.getenv('GIT_DIR')
+    current = os.path.abspath(start_dir or os.getcwd())
+    while True:
+        candidate = os.path.join(current, '.git')
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            # A "gitdir: ..." pointer file, used by worktrees and submodules.
+            raise UnsupportedGitRepoError('.git is a file: {}'.format(candidate))
+        parent = os.path.dirname(current)
+        if parent == current:
+            raise UnsupportedGitRepoError('Not in a git repository.')
+        current = parent
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8').strip()
+
+
+def _format_date(timestamp, offset):
+    # Matches git's %ai format, e.g. "2018-03-10 14:41:02 -0800".
+    sign = -1 if offset.startswith('-') else 1
+    offset_seconds = sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    local = datetime.datetime(1970, 1, 1) + datetime.timedelta(
+        seconds=int(timestamp) + offset_seconds)
+    return '{} {}'.format(local.strftime('%Y-%m-%d %H:%M:%S'), offset)
+
+
+def _parse_person(value):
+    # "Name <email> 1520721662 -0800"
+    email_start = value.rfind('<')
+    email_end = value.rfind('>')
+    if email_start < 0 or email_end < email_start:
+        raise UnsupportedGitRepoError('Malformed identity: {}'.format(value))
+    timestamp, offset = value[email_end + 1:].split()
+    return (
+        value[:email_start].strip(),
+        value[email_start + 1:email_end],
+        _format_date(timestamp, offset),
+    )
+
+
+class GitReader(object):
+    """Reads HEAD and commit metadata straight from a .git directory, without spawning git.
+
+    Only the simple layouts are handled: a regular .git directory, loose or packed refs, and
+    loose commit objects. Anything else (packed objects, worktrees, abbreviated SHAs) raises
+    UnsupportedGitRepoError.
+    """
+
+    def __init__(self, git_dir=None):
+        self.git_dir = git_dir or find_git_dir()
+        if os.path.exists(os.path.join(self.git_dir, 'commondir')):
+            raise UnsupportedGitRepoError('Linked worktrees are not supported.')
+
+    def _head(self):
+        head = _read_file(os.path.join(self.git_dir, 'HEAD'))
+        if head.startswith('ref: '):
+            return head[len('ref: '):], None
+        return None, head
+
+    def _resolve_ref(self, ref):
+        loose_path = os.path.join(self.git_dir, *ref.split('/'))
+        if os.path.isfile(loose_path):
+            return _read_file(loose_path)
+        packed_refs_path = os.path.join(self.git_dir, 'packed-refs')
+        if os.path.isfile(packed_refs_path):
+            with open(packed_refs_path, 'rb') as f:
+                for line in f.read().decode('utf-8').splitlines():
+                    if line.startswith('#') or line.startswith('^'):
+                        continue
+                    parts = line.split(' ', 1)
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0]
+        raise UnsupportedGitRepoError('Cannot resolve ref: {}'.format(ref))
+
+    def resolve(self, rev):
+        if rev == 'HEAD':
+            ref, sha = self._head()
+            sha = sha or self._resolve_ref(ref)
+        else:
+            sha = rev.lower()
+        if not _SHA_RE.match(sha):
+            raise UnsupportedGitRepoError('Cannot resolve revision: {}'.format(rev))
+        return sha
+
+    @property
+    def branch(self):
+        ref, _ = self._head()
+        if ref is None:
+            return 'HEAD'
+        return ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+
+    def _read_object(self, sha):
+        path = os.path.join(self.git_dir, 'objects', sha[:2], sha[2:])
+        if not os.path.isfile(path):
+            raise UnsupportedGitRepoError('Object is not loose: {}'.format(sha))
+        with open(path, 'rb') as f:
+            data = zlib.decompress(f.read())
+        header, _, body = data.partition(b'\x00')
+        return header.split(b' ')[0].decode('ascii'), body
+
+    def commit(self, rev):
+        """Return commit metadata for rev in the same shape Environment parses from git show."""
+        sha = self.resolve(rev)
+        object_type, body = self._read_object(sha)
+        if object_type != 'commit':
+            raise UnsupportedGitRepoError('Not a commit: {}'.format(sha))
+
+        headers, _, message = body.partition(b'\n\n')
+        fields = {}
+        for line in headers.split(b'\n'):
+            # Continuation lines (e.g. of gpgsig) start with a space.
+            if line.startswith(b' ') or b' ' not in line:
+                continue
+            key, value = line.split(b' ', 1)
+            fields.setdefault(key.decode('ascii'), value.decode('utf-8', 'replace'))
+        if 'author' not in fields or 'committer' not in fields:
+            raise UnsupportedGitRepoError('Malformed commit: {}'.format(sha))
+        if fields.get('encoding', 'utf-8').lower() not in ('utf-8', 'utf8'):
+            raise UnsupportedGitRepoError('Unsupported commit encoding: {}'.format(sha))
+
+        author_name, author_email, authored_at = _parse_person(fields['author'])
+        committer_name, committer_email, _ = _parse_person(fields['committer'])
+
+        refs = ''
+        if sha == self.resolve('HEAD'):
+            branch = self.branch
+            refs = 'HEAD' if branch == 'HEAD' else 'HEAD -> {}'.format(branch)
+
+        return {
+            'sha': sha,
+            'author_name': author_name,
+            'author_email': author_email,
+            'committer_name': committer_name,
+            'committer_email': committer_email,
+            # Like %ai, this is the author date.
+            'committed_at': authored_at,
+            'refs': refs,
+            'message': message.decode('utf-8', 'replace').rstrip(),
+        }
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+
+from percy import utils
+
+__all__ = ['HashCache']
+
+# Bump when the table layout or the meaning of a stored digest changes; older caches are dropped.
+SCHEMA_VERSION = 1
+
+DEFAULT_MAX_ENTRIES = 250000
+
+# Files modified this recently are hashed but not cached: a second write within the filesystem's
+# timestamp granularity would leave size and mtime unchanged, and the stale digest would stick.
+RACY_WINDOW_SECONDS = 2
+
+# Hits and new digests are written in transactions of at most this many rows.
+WRITE_BATCH_SIZE = 500
+
+
+def _mtime_ns(stat):
+    # Python 2 has no st_mtime_ns.
+    return getattr(stat, 'st_mtime_ns', None) or int(stat.st_mtime * 1e9)
+
+
+class HashCache(object):
+    """A persistent SQLite cache of file SHA-256 digests.
+
+    Entries are keyed by absolute path and are only trusted while the file's size, mtime_ns and
+    inode all still match what was recorded, so unchanged files can be skipped with a single
+    stat. Every entry hit or stored during a run is stamped with that run's time; `close` trims
+    the least recently seen entries to keep the cache under `max_entries`.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._run_stamp = int(time.time())
+        self._lock = threading.Lock()
+        # Writes are buffered and committed in short batches, so the database is never locked
+        # for a whole walk while other processes share it.
+        self._seen_paths = []
+        self._stored_rows = {}
+        self._failed = False
+
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Autocommit mode: transactions are opened explicitly, and only around batched writes.
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False)
+        try:
+            # WAL lets readers in other processes go on while a batch is written. Some
+            # filesystems don't support it, and then the default journal still works.
+            self._db.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.Error:
+            pass
+        try:
+            self._db.execute('BEGIN IMMEDIATE')
+            version = self._db.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._db.execute('DROP TABLE IF EXISTS hashes')
+                self._db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS hashes ('
+                '  path TEXT PRIMARY KEY,'
+                '  size INTEGER NOT NULL,'
+                '  mtime_ns INTEGER NOT NULL,'
+                '  inode INTEGER NOT NULL,'
+                '  sha TEXT NOT NULL,'
+                '  last_seen INTEGER NOT NULL'
+                ')'
+            )
+            self._db.execute('COMMIT')
+        except sqlite3.Error as e:
+            self._fail(e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _fail(self, error):
+        # The cache only saves work, so when it can't be used, files are simply hashed.
+        if not self._failed:
+            utils.print_error('[percy] Hash cache {} unavailable: {}'.format(self.path, error))
+        self._failed = True
+        if getattr(self._db, 'in_transaction', True):
+            try:
+                self._db.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+    def lookup(self, path, stat):
+        """Return the cached digest for path, or None if it is unknown or the file changed."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if self._failed:
+                self.misses += 1
+                return None
+            stored = self._stored_rows.get(path)
+            if stored:
+                row = stored[1:5]
+            else:
+                try:
+                    row = self._db.execute(
+                        'SELECT size, mtime_ns, inode, sha FROM hashes WHERE path = ?', (path,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    self._fail(e)
+                    row = None
+            if row is None or tuple(row[:3]) != (stat.st_size, _mtime_ns(stat), stat.st_ino):
+                self.misses += 1
+                return None
+            if not stored:
+                self._seen_paths.append(path)
+                if len(self._seen_paths) >= WRITE_BATCH_SIZE:
+                    self._write()
+            self.hits += 1
+            return row[3]
+
+    def store(self, path, stat, sha):
+        if _mtime_ns(stat) / 1e9 > time.time() - RACY_WINDOW_SECONDS:
+            return
+        with self._lock:
+            if self._failed:
+                return
+            path = os.path.abspath(path)
+            self._stored_rows[path] = (
+                path, stat.st_size, _mtime_ns(stat), stat.st_ino, sha, self._run_stamp)
+            if len(self._stored_rows) >= WRITE_BATCH_SIZE:
+                self._write()
+
+    def _write(self, trim=False):
+        # Call with the lock held.
+        seen_paths, self._seen_paths = self._seen_paths, []
+        stored_rows, self._stored_rows = self._stored_rows, {}
+        if self._failed or not (seen_paths or stored_rows or trim):
+            return
+        try:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.executemany(
+                'UPDATE hashes SET last_seen = ? WHERE path = ?',
+                [(self._run_stamp, path) for path in seen_paths])
+            self._db.executemany(
+                'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, sha, last_seen) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                list(stored_rows.values()))
+            if trim:
+                self._db.execute(
+                    'DELETE FROM hashes WHERE path IN ('
+                    '  SELECT path FROM hashes ORDER BY last_seen DESC LIMIT -1 OFFSET ?'
+                    ')',
+                    (self.max_entries,),
+                )
+            self._db.execute('COMMIT')
+        except sqlite3.Error as e:
+            self._fail(e)
+
+    def flush(self):
+        with self._lock:
+            self._write(trim=True)
+
+    def close(self):
+        self.flush()
+        self._db.close()
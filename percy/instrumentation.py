@@ -0,0 +1,170 @@
+import array
+import contextlib
+import json
+import re
+import threading
+import time
+
+from percy import utils
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+__all__ = ['Instrumentation']
+
+_ID_SEGMENT_RE = re.compile(r'^\d+$')
+
+
+def endpoint_name(url):
+    # e.g. "https://percy.io/api/v1/builds/12/resources/" -> "builds/:id/resources".
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    if len(segments) >= 2 and segments[0] == 'api':
+        segments = segments[2:]
+    return '/'.join(':id' if _ID_SEGMENT_RE.match(s) else s for s in segments)
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    try:
+        return len(body)
+    except TypeError:
+        return None
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class _Timings(object):
+    def __init__(self):
+        self.samples = array.array('d')
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        return {
+            'count': len(self.samples),
+            'seconds': sum(self.samples),
+            'max_seconds': max(self.samples) if self.samples else None,
+            'p50_seconds': _percentile(self.samples, 0.5),
+            'p95_seconds': _percentile(self.samples, 0.95),
+        }
+
+
+class Instrumentation(object):
+    """Collects request and phase events, and passes each one on to subscribed hooks.
+
+    A hook is any callable taking `(event, data)`. Events are 'request', with the method,
+    endpoint, status, seconds, bytes sent and received, retries and any error, and 'phase', with
+    a phase name and seconds. Subsystems add their own events through `emit`. Phases may
+    overlap: while the manifest streams into create_build, files are still being scanned and
+    hashed. `summary` aggregates everything seen so far, and `write_report` saves it as JSON.
+    """
+
+    def __init__(self):
+        self._hooks = []
+        self._sources = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._started_at = time.time()
+            self._requests = {}
+            self._statuses = {}
+            self._phases = {}
+            self._events = {}
+            self._totals = {'bytes_sent': 0, 'bytes_received': 0, 'retries': 0, 'errors': 0}
+
+    def subscribe(self, hook):
+        self._hooks.append(hook)
+        return hook
+
+    def unsubscribe(self, hook):
+        self._hooks.remove(hook)
+
+    def add_source(self, name, metrics):
+        """Include the dict returned by calling `metrics` in every summary, under `name`."""
+        self._sources[name] = metrics
+
+    def emit(self, event, **data):
+        with self._lock:
+            self._events[event] = self._events.get(event, 0) + 1
+        for hook in list(self._hooks):
+            try:
+                hook(event, data)
+            except Exception as e:
+                # Metrics must never break a build.
+                utils.print_error('[percy] Instrumentation hook failed: {!r}'.format(e))
+
+    def record_request(self, method, url, status, seconds, bytes_sent=None, bytes_received=None,
+                       retries=0, error=None):
+        endpoint = endpoint_name(url)
+        with self._lock:
+            self._requests.setdefault(endpoint, _Timings()).add(seconds)
+            status_key = str(status) if status is not None else 'error'
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+            self._totals['bytes_sent'] += bytes_sent or 0
+            self._totals['bytes_received'] += bytes_received or 0
+            self._totals['retries'] += retries or 0
+            if error is not None or status is None or status >= 400:
+                self._totals['errors'] += 1
+        self.emit(
+            'request', method=method, endpoint=endpoint, url=url, status=status, seconds=seconds,
+            bytes_sent=bytes_sent, bytes_received=bytes_received, retries=retries, error=error)
+
+    def record_response(self, method, url, started_at, body, response, error=None):
+        """record_request for a requests call that returned response, or raised error."""
+        retries = 0
+        history = getattr(getattr(getattr(response, 'raw', None), 'retries', None), 'history', None)
+        if history:
+            retries = len(history)
+        self.record_request(
+            method,
+            url,
+            status=response.status_code if response is not None else None,
+            seconds=time.time() - started_at,
+            bytes_sent=_body_size(body),
+            bytes_received=len(response.content) if response is not None else None,
+            retries=retries,
+            error=repr(error) if error is not None else None,
+        )
+
+    def record_phase(self, name, seconds):
+        with self._lock:
+            self._phases.setdefault(name, _Timings()).add(seconds)
+        self.emit('phase', name=name, seconds=seconds)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.time() - start)
+
+    def summary(self):
+        sources = dict((name, metrics()) for name, metrics in self._sources.items())
+        with self._lock:
+            return dict(sources, **{
+                'elapsed_seconds': time.time() - self._started_at,
+                'requests': dict(
+                    self._totals,
+                    count=sum(len(t.samples) for t in self._requests.values()),
+                    by_status=dict(self._statuses),
+                    by_endpoint=dict((k, t.summary()) for k, t in self._requests.items()),
+                ),
+                'phases': dict((k, t.summary()) for k, t in self._phases.items()),
+                'events': dict(self._events),
+            })
+
+    def write_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
@@ -0,0 +1,77 @@
+import json
+
+__all__ = ['JSONCodec', 'get_codec']
+
+# Tried in order when the codec is 'auto'.
+PREFERRED_CODECS = ('orjson', 'ujson', 'rapidjson', 'json')
+
+
+class JSONCodec(object):
+    """Encodes request bodies to UTF-8 JSON bytes and decodes response bodies.
+
+    Wraps whichever JSON library `name` refers to; every library is used with its defaults, all
+    of which produce standard JSON.
+    """
+
+    def __init__(self, name, encode, decode):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+    def __repr__(self):
+        return '<JSONCodec {}>'.format(self.name)
+
+
+def _stdlib_codec():
+    return JSONCodec('json', lambda obj: json.dumps(obj).encode('utf-8'), _stdlib_decode)
+
+
+def _stdlib_decode(data):
+    # Python 3.5 and older only accept text.
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def _orjson_codec():
+    import orjson
+    return JSONCodec('orjson', orjson.dumps, orjson.loads)
+
+
+def _ujson_codec():
+    import ujson
+    return JSONCodec('ujson', lambda obj: ujson.dumps(obj).encode('utf-8'), ujson.loads)
+
+
+def _rapidjson_codec():
+    import rapidjson
+    return JSONCodec(
+        'rapidjson', lambda obj: rapidjson.dumps(obj).encode('utf-8'), rapidjson.loads)
+
+
+_CODEC_FACTORIES = {
+    'json': _stdlib_codec,
+    'orjson': _orjson_codec,
+    'ujson': _ujson_codec,
+    'rapidjson': _rapidjson_codec,
+}
+
+
+def get_codec(name=None):
+    """Return the JSONCodec for `name`: 'auto' (or None), 'orjson', 'ujson', 'rapidjson' or 'json'.
+
+    'auto' picks the first of PREFERRED_CODECS that is installed. A named library that isn't
+    installed falls back to the standard library.
+    """
+    name = name or 'auto'
+    if name == 'auto':
+        names = PREFERRED_CODECS
+    elif name in _CODEC_FACTORIES:
+        names = (name, 'json')
+    else:
+        raise ValueError('Unknown JSON codec: {}'.format(name))
+    for codec_name in names:
+        try:
+            return _CODEC_FACTORIES[codec_name]()
+        except ImportError:
+            continue
@@ -0,0 +1,126 @@
+import re
+
+__all__ = ['PathFilter']
+
+
+def _translate_class(body):
+    # The inside of a [...] bracket expression. "!" negates, like "^" in a regex.
+    body = body.replace('\\', '\\\\')
+    if body.startswith('!'):
+        body = '^' + body[1:]
+    elif body.startswith('^'):
+        body = '\\' + body
+    return '[' + body + ']'
+
+
+def _translate(pattern):
+    """Translate a gitignore-style glob into a regex for /-separated relative paths."""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            # Zero or more leading directories.
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and pattern.find(']', i + 2) > 0:
+            end = pattern.find(']', i + 2)
+            parts.append(_translate_class(pattern[i + 1:end]))
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+class _Rule(object):
+    __slots__ = ('pattern', 'negated', 'dir_only', 'regex')
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # A pattern with a slash before its end is relative to the root, otherwise it matches
+        # at any depth.
+        anchored = '/' in pattern
+        prefix = '^' if anchored else '^(?:.*/)?'
+        self.regex = re.compile(prefix + _translate(pattern.lstrip('/')) + '$')
+
+    def matches(self, path, is_dir):
+        return (is_dir or not self.dir_only) and self.regex.match(path) is not None
+
+
+def _compile(patterns):
+    # Also accepts the text of an ignore file.
+    if hasattr(patterns, 'splitlines'):
+        patterns = patterns.splitlines()
+    rules = []
+    for pattern in patterns or ():
+        pattern = pattern.strip()
+        if pattern and not pattern.startswith('#'):
+            rules.append(_Rule(pattern))
+    return rules
+
+
+def _last_match(rules, path, is_dir):
+    # Like gitignore, the last matching rule wins, and "!" rules undo earlier matches.
+    for rule in reversed(rules):
+        if rule.matches(path, is_dir):
+            return not rule.negated
+    return False
+
+
+class PathFilter(object):
+    """Decides which files under a root directory are build resources, using gitignore rules.
+
+    Paths are relative to the root and /-separated. A file is kept when no `exclude` pattern
+    matches it or any directory above it, and, if `include` patterns are given, when one of them
+    matches it or a directory above it. Excluded directories can be pruned from a walk, so
+    nothing inside them is ever listed or stat'ed; as in git, a file inside an excluded
+    directory can't be re-included.
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = _compile(include)
+        self.exclude = _compile(exclude)
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+    __nonzero__ = __bool__
+
+    def allows_dir(self, path):
+        """Whether a walk should descend into directory path."""
+        return not _last_match(self.exclude, path, True)
+
+    def allows_file(self, path):
+        """Whether file path is kept, assuming the directories above it were allowed."""
+        if _last_match(self.exclude, path, False):
+            return False
+        if not self.include:
+            return True
+        if _last_match(self.include, path, False):
+            return True
+        parts = path.split('/')[:-1]
+        return any(
+            _last_match(self.include, '/'.join(parts[:i]), True)
+            for i in range(1, len(parts) + 1))
+
+    def allows(self, path):
+        """Whether file path is kept, also checking every directory above it."""
+        parts = path.split('/')[:-1]
+        return all(self.allows_dir('/'.join(parts[:i])) for i in range(1, len(parts) + 1)) \
+            and self.allows_file(path)
@@ -0,0 +1,125 @@
+import collections
+import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+__all__ = ['WorkerPool', 'imap']
+
+
+class WorkerPool(object):
+    """A small bounded pool of daemon threads.
+
+    Tasks are handed to workers through a queue that holds at most `max_pending` items, so a
+    producer calling `submit` blocks instead of racing ahead of the workers. Exceptions raised by
+    tasks are collected rather than propagated, and returned together from `join`.
+    """
+
+    def __init__(self, workers=1, max_pending=None):
+        self.workers = max(1, int(workers))
+        self._queue = queue.Queue(maxsize=max_pending or self.workers)
+        self._threads = []
+        self._failures = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                self._queue.task_done()
+                return
+            func, args, kwargs = task
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._failures.append((args, sys.exc_info()[1]))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        self._start()
+        self._queue.put((func, args, kwargs))
+
+    def join(self):
+        """Wait for every submitted task to finish and return the (args, exception) failures.
+
+        The failure list is reset, so the pool can keep being used after a join.
+        """
+        self._queue.join()
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    def close(self):
+        """Wait for submitted tasks, then stop the worker threads."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+
+class _Result(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def imap(func, items, workers=1, lookahead=None):
+    """Like the builtin map, but calls func across worker threads.
+
+    Results are yielded in input order. Items are pulled lazily, at most `lookahead` ahead of
+    the consumer, so this can sit between a slow producer and consumer. An exception raised by
+    func is re-raised when its result is reached.
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    lookahead = lookahead or workers * 4
+    pool = WorkerPool(workers=workers, max_pending=lookahead)
+    pending = collections.deque()
+
+    def run(item, result):
+        try:
+            result.value = func(item)
+        except Exception:
+            result.error = sys.exc_info()[1]
+        finally:
+            result.done.set()
+
+    def pop():
+        result = pending.popleft()
+        result.done.wait()
+        if result.error is not None:
+            raise result.error
+        return result.value
+
+    try:
+        for item in items:
+            result = _Result()
+            pending.append(result)
+            pool.submit(run, item, result)
+            if len(pending) >= lookahead:
+                yield pop()
+        while pending:
+            yield pop()
+    finally:
+        pool.close()
@@ -5,6 +5,8 @@ __all__ = ['Resource']
 
 
 class Resource(object):
+    # No per-instance __dict__, which adds up for builds with many thousands of resources.
+    __slots__ = ('resource_url', 'content', 'sha', 'is_root', 'mimetype', 'local_path')
 
     def __init__(self, resource_url, is_root=False, **kwargs):
         self.resource_url = resource_url
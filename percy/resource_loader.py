@@ -1,79 +1,271 @@
+import functools
+import multiprocessing
 import os
+import time
 import percy
 try:
     # Python 3's pathname2url
-    from urllib.request import pathname2url
+    from urllib.request import pathname2url, url2pathname
 except ImportError:
     # Python 2's pathname2url
-    from urllib import pathname2url
+    from urllib import pathname2url, url2pathname
 
 from percy import utils
+from percy.asset_parser import AssetParser
+from percy.git_index import GitHashIndex
+from percy.hash_cache import HashCache
+from percy.path_filter import PathFilter
+from percy.pool import imap
+from percy.resource_table import ResourceTable
+from percy.walker import walk_files
 
 try:
-    from urllib.parse import urlparse
+    from urllib.parse import urljoin, urlparse
 except ImportError:
-    from urlparse import urlparse
+    from urlparse import urljoin, urlparse
 
 __all__ = ['ResourceLoader']
 
 MAX_FILESIZE_BYTES = 15 * 1024**2  # 15 MiB.
 
+# Passed in place of a digest for a file whose inode was already seen earlier in the walk. The
+# digest is filled in from that earlier file once it comes back from hashing.
+SAME_INODE = 'same-inode'
+
+
+def _hash_entry(entry):
+    # Module level so it can be sent to a process pool. Also returns how long hashing took, or
+    # None if the digest was already known.
+    path, stat, sha = entry
+    if sha:
+        return path, stat, sha, None
+    started = time.time()
+    sha = utils.sha256hash_file(path)
+    return path, stat, sha, time.time() - started
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
 
 class BaseResourceLoader(object):
     @property
     def build_resources(self):
         raise NotImplementedError('subclass must implement abstract method')
 
+    def iter_build_resources(self):
+        return iter(self.build_resources)
+
+    def build_resource_table(self):
+        return ResourceTable(self.iter_build_resources())
+
     @property
     def snapshot_resources(self):
         raise NotImplementedError('subclass must implement abstract method')
 
 
 class ResourceLoader(BaseResourceLoader):
-    def __init__(self, root_dir=None, base_url=None, webdriver=None):
+    def __init__(self, root_dir=None, base_url=None, webdriver=None, hash_cache=None,
+                 workers=1, use_processes=False, referenced_only=False, git_index=None,
+                 include=None, exclude=None):
         self.root_dir = root_dir
         self.base_url = base_url
         if self.base_url and self.base_url.endswith(os.path.sep):
             self.base_url = self.base_url[:-1]
         # TODO: more separate loader subclasses and pull out Selenium-specific logic?
         self.webdriver = webdriver
+        # Optional persistent cache of file digests, given as a HashCache or a path to one.
+        if hash_cache and not isinstance(hash_cache, HashCache):
+            hash_cache = HashCache(hash_cache)
+        self.hash_cache = hash_cache
+        # Optional index of digests by git blob ID, given as a GitHashIndex or a path to one.
+        # Tracked, unmodified files are then never read, even on a fresh clone.
+        if git_index and not isinstance(git_index, GitHashIndex):
+            git_index = GitHashIndex(git_index)
+        self.git_index = git_index
+        # Number of files hashed in parallel while the tree is walked. Threads are used by
+        # default since hashlib releases the GIL; use_processes switches to a process pool.
+        self.workers = workers
+        self.use_processes = use_processes
+        # Opt-in: instead of submitting every file under root_dir with the build, attach just the
+        # files each snapshot's HTML (and the CSS it pulls in) references to that snapshot.
+        self.referenced_only = referenced_only
+        # Gitignore-style patterns for the files under root_dir to use. Excluded directories
+        # are never descended into.
+        self.path_filter = PathFilter(include=include, exclude=exclude)
+        self.asset_parser = AssetParser()
+        self._local_shas = {}
+        # Optional Instrumentation that receives 'scan' and 'hash' phase timings.
+        self.instrumentation = None
+        # Counts from the last walk of root_dir, showing how much the filters saved.
+        self.scan_stats = {}
+
+    def _record_phase(self, name, seconds):
+        if self.instrumentation:
+            self.instrumentation.record_phase(name, seconds)
+
+    def _walk_files(self):
+        # Walk in sorted order so resources come out in the same order on every run. Only time
+        # spent walking counts towards the scan phase, not time waiting on the consumer.
+        scan_seconds = 0.0
+        started = time.time()
+        stats = self.scan_stats = {}
+        if self.git_index:
+            self.git_index.scan(self.root_dir)
+        try:
+            files = walk_files(
+                self.root_dir, path_filter=self.path_filter, max_size=MAX_FILESIZE_BYTES,
+                stats=stats)
+            for path, stat, first_seen in files:
+                if not first_seen:
+                    cached_sha = SAME_INODE
+                else:
+                    cached_sha = self.git_index.lookup(path, stat) if self.git_index else None
+                    if not cached_sha and self.hash_cache:
+                        cached_sha = self.hash_cache.lookup(path, stat)
+                scan_seconds += time.time() - started
+                yield path, stat, cached_sha
+                started = time.time()
+            scan_seconds += time.time() - started
+        finally:
+            self._record_phase('scan', scan_seconds)
+
+    def _hashed_files(self):
+        # Hashing overlaps with the walk: files are handed to workers as they are found, and
+        # results come back in walk order.
+        if self.workers > 1 and self.use_processes:
+            pool = multiprocessing.Pool(self.workers)
+            try:
+                for entry in pool.imap(_hash_entry, self._walk_files(), chunksize=16):
+                    yield entry
+            finally:
+                pool.terminate()
+        else:
+            for entry in imap(_hash_entry, self._walk_files(), workers=self.workers):
+                yield entry
 
     @property
     def build_resources(self):
-        resources = []
-        if not self.root_dir:
-            return resources
-        for root, dirs, files in os.walk(self.root_dir, followlinks=True):
-            for file_name in files:
-                path = os.path.join(root, file_name)
-                if os.path.getsize(path) > MAX_FILESIZE_BYTES:
-                    continue
-                with open(path, 'rb') as f:
-                    content = f.read()
+        return list(self.iter_build_resources())
 
-                    path_for_url = pathname2url(path.replace(self.root_dir, '', 1))
-                    if self.base_url[-1] == '/' and path_for_url[0] == '/':
-                        path_for_url = path_for_url.replace('/', '' , 1)
+    def iter_build_resources(self):
+        # Yields resources as files are hashed. File contents are only ever read in fixed-size
+        # chunks to compute digests, so memory stays flat however large the tree is.
+        for resource_url, sha, local_path in self._iter_build_rows():
+            yield percy.Resource(resource_url=resource_url, sha=sha, local_path=local_path)
 
+    def build_resource_table(self):
+        # Fills the table straight from the walk, without a Resource object per file.
+        table = ResourceTable()
+        for resource_url, sha, local_path in self._iter_build_rows():
+            table.append(resource_url, sha, local_path=local_path)
+        return table
 
-                    resource_url = "{0}{1}".format(self.base_url, path_for_url)
-                    resource = percy.Resource(
-                        resource_url=resource_url,
-                        sha=utils.sha256hash(content),
-                        local_path=os.path.abspath(path),
-                    )
-                    resources.append(resource)
-        return resources
+    def _iter_build_rows(self):
+        if not self.root_dir or self.referenced_only:
+            return
+        # Summed over files, so with several workers this exceeds the wall-clock time.
+        hash_seconds = 0.0
+        # Digests by inode, for files reached again through symlinks or hard links.
+        inode_shas = {}
+        try:
+            for path, stat, sha, seconds in self._hashed_files():
+                inode = (stat.st_dev, stat.st_ino)
+                if sha == SAME_INODE:
+                    sha = inode_shas[inode]
+                elif stat.st_ino:
+                    inode_shas[inode] = sha
+                if seconds is not None:
+                    hash_seconds += seconds
+                    if self.hash_cache:
+                        self.hash_cache.store(path, stat, sha)
+                if self.git_index:
+                    # Also for digests found in hash_cache, so the index learns about them.
+                    self.git_index.store(path, stat, sha)
+
+                path_for_url = pathname2url(path.replace(self.root_dir, '', 1))
+                if self.base_url[-1] == '/' and path_for_url[0] == '/':
+                    path_for_url = path_for_url.replace('/', '' , 1)
+
+
+                resource_url = "{0}{1}".format(self.base_url, path_for_url)
+                yield resource_url, sha, os.path.abspath(path)
+            # Only after a complete walk, since saving drops the entries that weren't seen.
+            if self.git_index:
+                self.git_index.save()
+        finally:
+            self._record_phase('hash', hash_seconds)
+            if self.hash_cache:
+                self.hash_cache.flush()
 
     @property
     def snapshot_resources(self):
-        # Only one snapshot resource, the root page HTML.
-        return [
-            percy.Resource(
-                # Assumes a Selenium webdriver interface.
-                resource_url=urlparse(self.webdriver.current_url).path,
-                is_root=True,
-                mimetype='text/html',
-                content=self.webdriver.page_source,
-            )
-        ]
+        # The root page HTML, plus the local files it references in referenced_only mode.
+        root_resource = percy.Resource(
+            # Assumes a Selenium webdriver interface.
+            resource_url=urlparse(self.webdriver.current_url).path,
+            is_root=True,
+            mimetype='text/html',
+            content=self.webdriver.page_source,
+        )
+        if not (self.referenced_only and self.root_dir):
+            return [root_resource]
+        return [root_resource] + self._referenced_resources(root_resource)
+
+    def _referenced_resources(self, root_resource):
+        page_url = self.webdriver.current_url
+        page_netloc = urlparse(page_url).netloc
+        resources = []
+        seen_paths = set()
+        documents = [(page_url, root_resource.content, 'text/html', root_resource.sha)]
+        while documents:
+            document_url, content, mimetype, sha = documents.pop(0)
+            for reference in self.asset_parser.references(content, mimetype, sha=sha):
+                url = urlparse(urljoin(document_url, reference))
+                # Only same-origin assets can come from the local tree.
+                if url.scheme not in ('', 'http', 'https') or url.netloc != page_netloc:
+                    continue
+                if url.path in seen_paths:
+                    continue
+                seen_paths.add(url.path)
+
+                resource = self._local_resource(url.path)
+                if not resource:
+                    continue
+                resources.append(resource)
+                if url.path.lower().endswith('.css'):
+                    # Stylesheets can pull in more assets through url() and @import.
+                    read = functools.partial(_read_bytes, resource.local_path)
+                    documents.append((urljoin(page_url, url.path), read, 'text/css', resource.sha))
+        return resources
+
+    def _local_resource(self, url_path):
+        # Maps a URL path under base_url to a file under root_dir, or None if there isn't one.
+        base_path = urlparse(self.base_url or '').path.rstrip('/')
+        if not url_path.startswith(base_path + '/'):
+            return None
+        root_dir = os.path.abspath(self.root_dir)
+        path = os.path.abspath(
+            os.path.join(root_dir, url2pathname(url_path[len(base_path) + 1:])))
+        if not path.startswith(root_dir + os.path.sep) or not os.path.isfile(path):
+            return None
+        rel_path = path[len(root_dir) + 1:].replace(os.path.sep, '/')
+        if self.path_filter and not self.path_filter.allows(rel_path):
+            return None
+        stat = os.stat(path)
+        if stat.st_size > MAX_FILESIZE_BYTES:
+            return None
+
+        key = (stat.st_size, stat.st_mtime, stat.st_ino)
+        known = self._local_shas.get(path)
+        if known and known[0] == key:
+            sha = known[1]
+        else:
+            sha = self.hash_cache.lookup(path, stat) if self.hash_cache else None
+            if not sha:
+                sha = utils.sha256hash_file(path)
+                if self.hash_cache:
+                    self.hash_cache.store(path, stat, sha)
+            self._local_shas[path] = (key, sha)
+        return percy.Resource(resource_url=url_path, sha=sha, local_path=path)
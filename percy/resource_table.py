@@ -0,0 +1,138 @@
+import array
+import binascii
+
+from percy.resource import Resource
+
+__all__ = ['ResourceTable']
+
+SHA_BYTES = 32
+
+
+def _sha_key(sha):
+    try:
+        key = binascii.unhexlify(sha)
+    except (TypeError, ValueError):
+        return None
+    return key if len(key) == SHA_BYTES else None
+
+
+class ResourceTable(object):
+    """A compact, column-oriented collection of resources, for build manifests of any size.
+
+    Rows are stored in parallel arrays instead of one Resource object each: URLs and local paths
+    in plain lists, SHA-256 digests as 32 raw bytes in a single bytearray, and is-root flags in a
+    byte array. Mimetypes and in-memory content, which build resources rarely have, are kept
+    sparsely. Resource objects are only created on demand, e.g. when iterating.
+
+    A SHA that isn't a hex SHA-256 digest, which a custom loader may produce, is kept as given in
+    a dict instead, so the table accepts whatever a BaseResourceLoader yields.
+    """
+
+    def __init__(self, resources=None):
+        self._urls = []
+        self._shas = bytearray()
+        self._local_paths = []
+        self._is_root = array.array('B')
+        self._mimetypes = {}
+        self._contents = {}
+        self._index = {}
+        # Rows whose SHA isn't a hex SHA-256 digest, and the index of those SHAs.
+        self._other_shas = {}
+        self._other_index = {}
+        if resources:
+            self.extend(resources)
+
+    def __len__(self):
+        return len(self._urls)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('ResourceTable row out of range: {}'.format(row))
+        kwargs = {'mimetype': self._mimetypes.get(row)}
+        if row in self._contents:
+            kwargs['content'] = self._contents[row]
+        else:
+            kwargs['sha'] = self.sha(row)
+            kwargs['local_path'] = self._local_paths[row]
+        return Resource(resource_url=self._urls[row], is_root=bool(self._is_root[row]), **kwargs)
+
+    def __contains__(self, sha):
+        return self.find(sha) is not None
+
+    def append(self, resource_url, sha, local_path=None, mimetype=None, is_root=False,
+               content=None):
+        key = _sha_key(sha)
+        row = len(self._urls)
+        self._urls.append(resource_url)
+        if key is None:
+            self._shas.extend(bytearray(SHA_BYTES))
+            self._other_shas[row] = sha
+            self._other_index.setdefault(sha, row)
+        else:
+            self._shas.extend(key)
+            # The first row wins when several resources share a digest.
+            self._index.setdefault(key, row)
+        self._local_paths.append(local_path)
+        self._is_root.append(1 if is_root else 0)
+        if mimetype is not None:
+            self._mimetypes[row] = mimetype
+        if content is not None:
+            self._contents[row] = content
+        return row
+
+    def add(self, resource):
+        return self.append(
+            resource.resource_url,
+            resource.sha,
+            local_path=resource.local_path,
+            mimetype=resource.mimetype,
+            is_root=resource.is_root,
+            content=None if resource.local_path else resource.content,
+        )
+
+    def extend(self, resources):
+        for resource in resources:
+            self.add(resource)
+
+    def track(self, resources):
+        """Add each resource as it passes through, for building the table from a stream."""
+        for resource in resources:
+            self.add(resource)
+            yield resource
+
+    def sha(self, row):
+        if row in self._other_shas:
+            return self._other_shas[row]
+        start = row * SHA_BYTES
+        return binascii.hexlify(bytes(self._shas[start:start + SHA_BYTES])).decode('ascii')
+
+    def find(self, sha):
+        """Return the row of the first resource with the given digest, or None."""
+        key = _sha_key(sha)
+        return self._other_index.get(sha) if key is None else self._index.get(key)
+
+    def get(self, sha):
+        row = self.find(sha)
+        return None if row is None else self[row]
+
+    def serialize_row(self, row):
+        return {
+            'type': 'resources',
+            'id': self.sha(row),
+            'attributes': {
+                'resource-url': self._urls[row],
+                'mimetype': self._mimetypes.get(row),
+                'is-root': bool(self._is_root[row]),
+            }
+        }
+
+    def serialize(self):
+        """Yield each row in the manifest format of Resource.serialize, without a Resource."""
+        for row in range(len(self)):
+            yield self.serialize_row(row)
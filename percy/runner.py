@@ -1,9 +1,17 @@
 from __future__ import print_function
 
 import os
+import threading
+import time
+
 import percy
 from percy import errors
 from percy import utils
+from percy.git_index import GitHashIndex
+from percy.hash_cache import HashCache
+from percy.pool import WorkerPool
+from percy.resource_table import ResourceTable
+from percy.shard_cache import BUSY, CLAIMED, UPLOADED, ShardUploadCache
 
 __all__ = ['Runner']
 
@@ -15,6 +23,25 @@ class Runner(object):
         self.config = config or percy.Config()
         self.client = client or percy.Client(config=self.config)
         self._current_build = None
+        self._snapshot_pool = None
+        self._pending_snapshots = []
+        self._pending_since = None
+        # Failed snapshots of batches, raised from finalize_build.
+        self._snapshot_failures = []
+        self._lock = threading.Lock()
+
+        # Request metrics come from the connection; phase timings are added to the same place.
+        self.instrumentation = self.client.connection.instrumentation
+
+        # Loaders that support a digest cache but weren't given one use the configured cache.
+        if self.config.hash_cache_path and getattr(self.loader, 'hash_cache', False) is None:
+            self.loader.hash_cache = HashCache(self.config.hash_cache_path)
+        if self.config.git_index_path and getattr(self.loader, 'git_index', False) is None:
+            self.loader.git_index = GitHashIndex(self.config.git_index_path)
+        if getattr(self.loader, 'instrumentation', False) is None:
+            self.loader.instrumentation = self.instrumentation
+        if getattr(self.loader, 'scan_stats', None) is not None:
+            self.instrumentation.add_source('scan', lambda: dict(self.loader.scan_stats))
 
         self._is_enabled = os.getenv('PERCY_ENABLE', '1') == '1'
 
@@ -32,33 +59,95 @@ class Runner(object):
         if not self._is_enabled:
             return
 
-        build_resources = []
-        build_resources = self.loader.build_resources if self.loader else []
-        sha_to_build_resource = {}
-        for build_resource in build_resources:
-            sha_to_build_resource[build_resource.sha] = build_resource
+        build_resources = self.loader.iter_build_resources() if self.loader else []
+        # Resources are recorded in a compact table as the client consumes the stream, so they
+        # can be found by SHA for upload without a second pass over the loader.
+        resource_table = ResourceTable()
 
-        self._current_build = self.client.create_build(resources=build_resources, **kwargs)
+        with self.instrumentation.phase('create_build'):
+            self._current_build = self.client.create_build(
+                resources=resource_table.track(build_resources), **kwargs)
 
         missing_resources = self._current_build['data']['relationships']['missing-resources']
         missing_resources = missing_resources.get('data', [])
 
+        build_id = self._current_build['data']['id']
+        resources = []
         for missing_resource in missing_resources:
-            sha = missing_resource['id']
-            resource = sha_to_build_resource.get(sha)
-            # This resource should always exist, but if by chance it doesn't we make it safe here.
-            # A nicer error will be raised by the finalize API when the resource is still missing.
+            resource = resource_table.get(missing_resource['id'])
+            # This resource should always exist, but if by chance it doesn't we make it safe
+            # here. A nicer error will be raised by the finalize API when it is still missing.
             if resource:
-                print('Uploading new build resource: {}'.format(resource.resource_url))
+                resources.append(resource)
 
-                # Optimization: we don't hold all build resources in memory. Instead we store a
-                # "local_path" variable that be used to read the file again if it is needed.
-                if resource.local_path:
-                    with open(resource.local_path, 'rb') as f:
-                        content = f.read()
-                else:
-                    content = resource.content
-                self.client.upload_resource(self._current_build['data']['id'], content)
+        shard_cache = self._open_shard_cache(**kwargs)
+        busy_resources = []
+        if shard_cache:
+            # Other workers of this parallel build on the same machine were asked for the same
+            # resources. Only upload the ones no other worker has claimed yet.
+            states = shard_cache.claim_many([r.sha for r in resources])
+            busy_resources = [r for r in resources if states[r.sha] == BUSY]
+            resources = [r for r in resources if states[r.sha] == CLAIMED]
+
+        try:
+            with self.instrumentation.phase('upload'):
+                pool = WorkerPool(workers=self.config.upload_workers)
+                for resource in resources:
+                    pool.submit(self._upload_build_resource, build_id, resource, shard_cache)
+                failures = pool.join()
+                # Wait for the resources other workers are uploading, and take over any that
+                # they fail or abandon, so this worker's snapshots never miss one.
+                for resource in busy_resources:
+                    pool.submit(self._await_shared_upload, build_id, resource, shard_cache)
+                failures += pool.join()
+                pool.close()
+        finally:
+            if shard_cache:
+                shard_cache.close()
+        if failures:
+            raise errors.ResourceUploadError([(args[1], e) for args, e in failures])
+
+    def _open_shard_cache(self, **kwargs):
+        if not self.config.shard_cache_path:
+            return None
+        environment = self.client.environment
+        nonce = kwargs.get('parallel_nonce') or environment.parallel_nonce
+        total_shards = kwargs.get('parallel_total_shards') or environment.parallel_total_shards
+        # Like create_build, only treat this as a parallel build when both are known.
+        if not nonce or not total_shards:
+            return None
+        return ShardUploadCache(self.config.shard_cache_path, nonce)
+
+    def _upload_build_resource(self, build_id, resource, shard_cache=None):
+        print('Uploading new build resource: {}'.format(resource.resource_url))
+
+        try:
+            self._upload_resource(build_id, resource)
+        except Exception as e:
+            utils.print_error('[percy] Failed to upload {}: {}'.format(resource.resource_url, e))
+            if shard_cache:
+                shard_cache.release(resource.sha)
+            raise
+        if shard_cache:
+            shard_cache.mark_uploaded(resource.sha)
+
+    def _await_shared_upload(self, build_id, resource, shard_cache):
+        while True:
+            state = shard_cache.claim(resource.sha)
+            if state == UPLOADED:
+                return
+            if state == CLAIMED:
+                self._upload_build_resource(build_id, resource, shard_cache)
+                return
+            time.sleep(shard_cache.poll_interval)
+
+    def _upload_resource(self, build_id, resource):
+        # Optimization: we don't hold all build resources in memory. Instead we store a
+        # "local_path" variable that is used to stream the file from disk when it is needed.
+        if resource.local_path:
+            self.client.upload_resource_from_path(build_id, resource.local_path, sha=resource.sha)
+        else:
+            self.client.upload_resource(build_id, resource.content)
 
     @property
     def build_id(self):
@@ -75,18 +164,102 @@ class Runner(object):
         if not self._current_build:
             raise errors.UninitializedBuildError('Cannot call snapshot before build is initialized')
 
-        root_resource = self.loader.snapshot_resources[0]
+        # The DOM is always captured right away, only the network work may be deferred.
+        resources = self.loader.snapshot_resources
         build_id = self._current_build['data']['id']
-        snapshot_data = self.client.create_snapshot(build_id, [root_resource], **kwargs)
+        if self.config.snapshot_batch_size > 1:
+            batch = None
+            with self._lock:
+                if not self._pending_snapshots:
+                    self._pending_since = time.time()
+                self._pending_snapshots.append((resources, kwargs))
+                if (len(self._pending_snapshots) >= self.config.snapshot_batch_size
+                        or time.time() - self._pending_since >= self.config.snapshot_flush_interval):
+                    batch, self._pending_snapshots = self._pending_snapshots, []
+            if batch:
+                self._dispatch(self._send_snapshots, build_id, batch)
+        else:
+            self._dispatch(self._send_snapshot, build_id, resources, kwargs)
 
-        missing_resources = snapshot_data['data']['relationships']['missing-resources']
-        missing_resources = missing_resources.get('data', [])
+    def _dispatch(self, func, *args):
+        if self.config.snapshot_workers > 0:
+            with self._lock:
+                if not self._snapshot_pool:
+                    self._snapshot_pool = WorkerPool(
+                        workers=self.config.snapshot_workers,
+                        max_pending=self.config.snapshot_queue_size,
+                    )
+                pool = self._snapshot_pool
+            pool.submit(func, *args)
+        else:
+            func(*args)
+
+    def _flush_snapshots(self, build_id):
+        # Send any partial batch, then wait for background snapshots and raise their errors.
+        with self._lock:
+            batch, self._pending_snapshots = self._pending_snapshots, []
+        if batch:
+            self._dispatch(self._send_snapshots, build_id, batch)
+
+        with self._lock:
+            pool, self._snapshot_pool = self._snapshot_pool, None
+        failures = []
+        if pool:
+            for args, e in pool.join():
+                # Either (build_id, resources, kwargs) of one snapshot, or (build_id, batch).
+                batch = [args[1:]] if len(args) == 3 else args[1]
+                for resources, kwargs in batch:
+                    failures.append((kwargs.get('name') or resources[0].resource_url, e))
+            pool.close()
+        with self._lock:
+            failures, self._snapshot_failures = self._snapshot_failures + failures, []
+        if failures:
+            raise errors.SnapshotError(failures)
 
-        if missing_resources:
-            # There can only be one missing resource in this case, the root_resource.
-            self.client.upload_resource(build_id, root_resource.content)
+    def _send_snapshot(self, build_id, resources, kwargs):
+        with self.instrumentation.phase('snapshot'):
+            snapshot_data = self.client.create_snapshot(build_id, resources, **kwargs)
+            self._upload_missing_resources(build_id, resources, snapshot_data)
+            self.client.finalize_snapshot(snapshot_data['data']['id'])
 
-        self.client.finalize_snapshot(snapshot_data['data']['id'])
+    def _send_snapshots(self, build_id, batch):
+        # One failed snapshot mustn't strand the rest of its batch, which were already created:
+        # they are still uploaded and finalized. Failures are only raised from finalize_build,
+        # since the snapshot() call that happened to fill the batch isn't the one to blame.
+        with self.instrumentation.phase('snapshot'):
+            snapshots = [dict(kwargs, resources=resources) for resources, kwargs in batch]
+            outcomes = self.client.create_snapshots(build_id, snapshots, return_errors=True)
+            failures = []
+            created = []
+            for (resources, kwargs), (snapshot_data, error) in zip(batch, outcomes):
+                label = kwargs.get('name') or resources[0].resource_url
+                if error is None:
+                    try:
+                        self._upload_missing_resources(build_id, resources, snapshot_data)
+                    except Exception as e:
+                        error = e
+                if error is not None:
+                    failures.append((label, error))
+                else:
+                    created.append((label, snapshot_data['data']['id']))
+            outcomes = self.client.finalize_snapshots(
+                [snapshot_id for _, snapshot_id in created], return_errors=True)
+            for (label, _), (_, error) in zip(created, outcomes):
+                if error is not None:
+                    failures.append((label, error))
+        if failures:
+            with self._lock:
+                self._snapshot_failures.extend(failures)
+
+    def _upload_missing_resources(self, build_id, resources, snapshot_data):
+        # Pages that render the same DOM or link the same assets share resources; the client's
+        # upload tracker skips any this build already received.
+        sha_to_resource = dict((r.sha, r) for r in resources)
+        missing_resources = snapshot_data['data']['relationships']['missing-resources']
+        for missing_resource in missing_resources.get('data', []):
+            resource = sha_to_resource.get(missing_resource['id'])
+            if resource:
+                self._upload_resource(build_id, resource)
 
     def finalize_build(self):
         # Silently pass if Percy is disabled.
@@ -95,5 +268,28 @@ class Runner(object):
         if not self._current_build:
             raise errors.UninitializedBuildError(
                 'Cannot finalize_build before build is initialized.')
-        self.client.finalize_build(self._current_build['data']['id'])
+        # A build with failed snapshots is left unfinalized, like when snapshot() raises directly.
+        build_id = self._current_build['data']['id']
+        try:
+            with self.instrumentation.phase('finalize'):
+                self._flush_snapshots(build_id)
+                self.client.finalize_build(build_id)
+        finally:
+            # Also written when finalizing fails, since that's when the numbers matter most.
+            self._write_report()
+        self.client.upload_tracker.forget(build_id)
         self._current_build = None
+
+    def _write_report(self):
+        if not self.config.report_path:
+            return
+        try:
+            self.instrumentation.write_report(self.config.report_path)
+        except (IOError, OSError) as e:
+            utils.print_error('[percy] Failed to write report to {}: {}'.format(
+                self.config.report_path, e))
+
+    @property
+    def upload_stats(self):
+        """Counts of resource uploads sent ('misses') and skipped as already uploaded ('hits')."""
+        return self.client.upload_tracker.stats
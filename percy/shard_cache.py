@@ -0,0 +1,145 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+__all__ = ['ShardUploadCache']
+
+SCHEMA_VERSION = 1
+
+# States returned by claim.
+CLAIMED = 'claimed'    # This worker holds the claim and should upload.
+UPLOADED = 'uploaded'  # Some worker already uploaded it.
+BUSY = 'busy'          # Another worker holds a live claim and is uploading it now.
+
+# A claim not finished within this many seconds is assumed abandoned and may be taken over.
+DEFAULT_CLAIM_TIMEOUT = 300
+
+# Rows for parallel builds older than this are deleted when a cache is opened.
+RETENTION_SECONDS = 7 * 24 * 3600
+
+
+class ShardUploadCache(object):
+    """A machine-local SQLite record of build resources claimed or uploaded by parallel workers.
+
+    Workers of the same parallel build (sharing a parallel nonce) on one machine each receive the
+    same missing resources from create_build. Before uploading one, a worker claims its SHA here;
+    workers that find it claimed skip it, or wait for the claim to finish if they must be sure it
+    was uploaded. A worker whose upload fails releases the claim, and a claim older than
+    claim_timeout is taken over, so a crashed worker can't strand a resource.
+    """
+
+    def __init__(self, path, nonce, claim_timeout=DEFAULT_CLAIM_TIMEOUT, poll_interval=0.5):
+        self.path = path
+        self.nonce = str(nonce)
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self.owner = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Autocommit mode, so claims can take the write lock up front with BEGIN IMMEDIATE.
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        with self._transaction():
+            version = self._db.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._db.execute('DROP TABLE IF EXISTS uploads')
+                self._db.execute('PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS uploads ('
+                '  nonce TEXT NOT NULL,'
+                '  sha TEXT NOT NULL,'
+                '  state TEXT NOT NULL,'
+                '  owner TEXT NOT NULL,'
+                '  updated_at REAL NOT NULL,'
+                '  PRIMARY KEY (nonce, sha)'
+                ')'
+            )
+            self._db.execute(
+                'DELETE FROM uploads WHERE updated_at < ?', (time.time() - RETENTION_SECONDS,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _transaction(self):
+        return _Transaction(self._db, self._lock)
+
+    def _claim(self, sha, now):
+        row = self._db.execute(
+            'SELECT state, owner, updated_at FROM uploads WHERE nonce = ? AND sha = ?',
+            (self.nonce, sha),
+        ).fetchone()
+        if row is not None:
+            state, owner, updated_at = row
+            if state == UPLOADED:
+                return UPLOADED
+            if owner == self.owner:
+                return CLAIMED
+            if updated_at > now - self.claim_timeout:
+                return BUSY
+        self._db.execute(
+            'INSERT OR REPLACE INTO uploads (nonce, sha, state, owner, updated_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (self.nonce, sha, CLAIMED, self.owner, now),
+        )
+        return CLAIMED
+
+    def claim(self, sha):
+        """Try to claim sha for upload. Returns CLAIMED, UPLOADED or BUSY."""
+        with self._transaction():
+            return self._claim(sha, time.time())
+
+    def claim_many(self, shas):
+        """Like claim for each of shas, in one transaction. Returns a dict of sha to state."""
+        now = time.time()
+        with self._transaction():
+            return dict((sha, self._claim(sha, now)) for sha in shas)
+
+    def mark_uploaded(self, sha):
+        with self._transaction():
+            self._db.execute(
+                'INSERT OR REPLACE INTO uploads (nonce, sha, state, owner, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (self.nonce, sha, UPLOADED, self.owner, time.time()),
+            )
+
+    def release(self, sha):
+        """Give up a claim, e.g. after a failed upload, so another worker can take it over."""
+        with self._transaction():
+            self._db.execute(
+                'DELETE FROM uploads WHERE nonce = ? AND sha = ? AND state = ? AND owner = ?',
+                (self.nonce, sha, CLAIMED, self.owner),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class _Transaction(object):
+    def __init__(self, db, lock):
+        self._db = db
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._db.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self._lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self._lock.release()
@@ -0,0 +1,167 @@
+import base64
+import json
+import os
+import tempfile
+
+__all__ = ['ResourceUploadBody', 'SpooledBody', 'iterencode']
+
+# Must be a multiple of 3 so each chunk base64-encodes without padding.
+UPLOAD_CHUNK_BYTES = 3 * 64 * 1024
+
+# Spooled request bodies larger than this are moved from memory to a temporary file.
+SPOOL_MAX_MEMORY_BYTES = 1024 * 1024
+
+# Marks where iterencode writes its streamed items. Plain ASCII, so every JSON library encodes
+# it the same way.
+STREAM_PLACEHOLDER = '__percy_stream_placeholder__'
+
+
+def _encode(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+def iterencode(data, items, encode=None):
+    """Encode data as chunks of UTF-8 JSON bytes, streaming items into it.
+
+    Wherever data holds STREAM_PLACEHOLDER as a value, a JSON array of items is written instead,
+    encoding one item at a time. items may be any iterable, so a list of millions of entries
+    never has to exist in memory, either as objects or as one encoded string. `encode` turns an
+    object into JSON bytes and defaults to the standard library.
+    """
+    encode = encode or _encode
+    head, placeholder, tail = encode(data).partition(encode(STREAM_PLACEHOLDER))
+    yield head
+    if placeholder:
+        yield b'['
+        separator = b''
+        for item in items:
+            yield separator + encode(item)
+            separator = b','
+        yield b']'
+    yield tail
+
+
+class ResourceUploadBody(object):
+    """A file-like JSON resource upload body that base64-encodes a local file as it is read.
+
+    Only one chunk of the file is in memory at a time, no matter how large the file is. The total
+    length is known up front, so requests sends a regular Content-Length body rather than a
+    chunked one, and `seek(0)` lets urllib3 rewind the body when it retries a request.
+    """
+
+    def __init__(self, sha, local_path, chunk_size=UPLOAD_CHUNK_BYTES):
+        self.local_path = local_path
+        self._chunk_size = chunk_size
+        self._prefix = (
+            '{"data": {"type": "resources", "id": %s, "attributes": {"base64-content": "'
+            % json.dumps(sha)
+        ).encode('utf-8')
+        self._suffix = b'"}}}'
+        file_size = os.path.getsize(local_path)
+        self._length = len(self._prefix) + 4 * ((file_size + 2) // 3) + len(self._suffix)
+        self._generator = None
+        self.seek(0)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self._chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _chunks(self):
+        yield self._prefix
+        with open(self.local_path, 'rb') as f:
+            while True:
+                chunk = f.read(self._chunk_size)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk)
+        yield self._suffix
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._generator, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = bytes(self._buffer), bytearray()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise IOError('ResourceUploadBody can only be rewound to the start.')
+        self.close()
+        self._generator = self._chunks()
+        self._buffer = bytearray()
+        self._position = 0
+        return 0
+
+    def close(self):
+        # Closing the generator closes the file it may have open.
+        if self._generator is not None:
+            self._generator.close()
+
+
+class SpooledBody(object):
+    """A request body that is written incrementally and then sent like a file.
+
+    The body stays in memory until it grows past `max_memory` bytes, then moves to a temporary
+    file. Like ResourceUploadBody it has a known length and can be rewound, so it is sent with a
+    Content-Length and can be resent on retries.
+    """
+
+    def __init__(self, max_memory=None):
+        self.max_memory = max_memory or SPOOL_MAX_MEMORY_BYTES
+        self._file = tempfile.SpooledTemporaryFile(max_size=self.max_memory)
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def in_memory(self):
+        return self._length <= self.max_memory
+
+    def write(self, data):
+        self._file.write(data)
+        self._length += len(data)
+
+    def getvalue(self):
+        self.seek(0)
+        return self._file.read()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,160 @@
+import email.utils
+import random
+import threading
+import time
+
+__all__ = ['AdaptiveThrottle']
+
+# Responses that mean the server is overloaded or briefly unavailable. They are retried, and
+# they shrink the concurrency limit.
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504, 520, 524])
+
+# A request this many times slower than the fastest recent one to the same endpoint counts as a
+# congestion signal too, but only once it takes at least SLOW_REQUEST_SECONDS.
+LATENCY_TOLERANCE = 4.0
+SLOW_REQUEST_SECONDS = 1.0
+
+# Requests with bodies larger than this are left out of the latency signal: their time is
+# mostly transfer, so a large upload after small ones isn't a sign of congestion.
+LATENCY_MAX_BODY_BYTES = 64 * 1024
+
+# Longest Retry-After or backoff delay honored, in seconds.
+MAX_BACKOFF_SECONDS = 60.0
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds given by a Retry-After header value, or None if invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class AdaptiveThrottle(object):
+    """Limits how many requests are in flight at once, adapting the limit to server load.
+
+    The limit follows AIMD, like TCP congestion control. Each healthy response raises it by
+    1/limit, so it grows by about one per round trip. A 429 or 5xx, a connection error, or an
+    unusually slow response halves it, at most once per round trip. It stays between min_limit
+    and max_limit.
+
+    Retried requests wait with full-jitter exponential backoff. When the server sends
+    Retry-After, every request pauses until then, not just the one retried.
+    """
+
+    def __init__(self, max_limit=10, min_limit=1, initial_limit=None, max_retries=3,
+                 backoff_factor=0.3, instrumentation=None):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(initial_limit or self.max_limit)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.instrumentation = instrumentation
+        self.stats = {
+            'increases': 0, 'decreases': 0, 'retries': 0, 'pauses': 0, 'throttled_waits': 0,
+        }
+        self._reset_state()
+
+    def _reset_state(self):
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency_floors = {}
+
+    def after_fork(self):
+        # The parent's in-flight requests and lock don't exist in a forked child.
+        self._reset_state()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def metrics(self):
+        with self._condition:
+            return dict(self.stats, limit=self.limit, in_flight=self._in_flight)
+
+    def _emit(self, kind, **data):
+        if self.instrumentation:
+            self.instrumentation.emit('throttle', kind=kind, limit=self.limit, **data)
+
+    def acquire(self):
+        """Wait for a free slot, and return the time the request started."""
+        with self._condition:
+            waited = False
+            while True:
+                pause = self._paused_until - time.time()
+                if pause > 0:
+                    self._condition.wait(pause)
+                elif self._in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    break
+                waited = True
+            if waited:
+                self.stats['throttled_waits'] += 1
+            self._in_flight += 1
+        return time.time()
+
+    def release(self, started_at, status=None, key=None, size=None):
+        """Free a slot. status is the response status or None if the request failed; size is
+        the number of bytes sent, if known."""
+        latency = time.time() - started_at
+        with self._condition:
+            self._in_flight -= 1
+            if status is None or status in RETRY_STATUSES:
+                self._decrease(started_at, status=status)
+            elif self._is_slow(key, latency, size):
+                self._decrease(started_at, status=status, latency=latency)
+            elif self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.stats['increases'] += 1
+            self._condition.notify_all()
+
+    def _is_slow(self, key, latency, size=None):
+        if size is not None and size > LATENCY_MAX_BODY_BYTES:
+            return False
+        floor = self._latency_floors.get(key)
+        if floor is None or latency < floor:
+            self._latency_floors[key] = latency
+            return False
+        # Let the floor drift up slowly, so one lucky fast request doesn't set the bar forever.
+        self._latency_floors[key] = floor * 0.99 + latency * 0.01
+        return latency >= SLOW_REQUEST_SECONDS and latency > floor * LATENCY_TOLERANCE
+
+    def _decrease(self, started_at, **data):
+        # Requests that started before the last decrease were sent under the old limit, so
+        # their failures are the same congestion event and don't shrink it again.
+        if started_at < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit / 2)
+        self._last_decrease = time.time()
+        self.stats['decreases'] += 1
+        self._emit('decrease', **data)
+
+    def backoff(self, attempt, retry_after=None):
+        """Wait before retry number `attempt` (starting at 1) and return the delay.
+
+        With a Retry-After value, all requests are paused until then and the caller doesn't
+        sleep here, since acquire waits out the pause.
+        """
+        delay = parse_retry_after(retry_after)
+        with self._condition:
+            self.stats['retries'] += 1
+            if delay is not None:
+                delay = min(delay, MAX_BACKOFF_SECONDS)
+                self._paused_until = max(self._paused_until, time.time() + delay)
+                self.stats['pauses'] += 1
+        if delay is not None:
+            self._emit('pause', attempt=attempt, delay=delay)
+            return delay
+        delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, self.backoff_factor * 2 ** attempt))
+        self._emit('retry', attempt=attempt, delay=delay)
+        time.sleep(delay)
+        return delay
@@ -0,0 +1,57 @@
+import threading
+
+__all__ = ['UploadTracker']
+
+
+class UploadTracker(object):
+    """Remembers which resource SHAs have been uploaded, or are being uploaded, for each build.
+
+    A repeated upload of a SHA that already succeeded is skipped. An upload of a SHA that another
+    thread is currently sending waits for that upload instead of sending the same body again,
+    and only takes over if it fails. `hits` counts skipped uploads and `misses` real ones.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._builds = {}
+        self._lock = threading.Lock()
+
+    def upload(self, build_id, sha, upload_func):
+        """Call upload_func unless sha was already uploaded for build_id.
+
+        Returns upload_func's result, or None if the upload was skipped.
+        """
+        while True:
+            with self._lock:
+                uploads = self._builds.setdefault(build_id, {})
+                in_flight = uploads.get(sha)
+                if in_flight is None:
+                    done = uploads[sha] = threading.Event()
+                    self.misses += 1
+            if in_flight is None:
+                break
+            in_flight.wait()
+            with self._lock:
+                # A failed upload is forgotten, so loop around and try it ourselves.
+                if self._builds.get(build_id, {}).get(sha) is in_flight:
+                    self.hits += 1
+                    return None
+
+        try:
+            return upload_func()
+        except Exception:
+            with self._lock:
+                del uploads[sha]
+            raise
+        finally:
+            done.set()
+
+    def forget(self, build_id):
+        with self._lock:
+            self._builds.pop(build_id, None)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -2,12 +2,31 @@ from __future__ import print_function
 import sys
 import hashlib
 import base64
+import subprocess
 
 # TODO: considering using the 'six' library here, but for now just do something simple.
 
 def print_error(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
+def git_output(args, cwd=None):
+    """Run git with args and return its stdout as bytes, or None if git failed or isn't installed."""
+    try:
+        process = subprocess.Popen(
+            ['git'] + args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            shell=False
+        )
+    except OSError:
+        # git isn't installed.
+        return None
+    stdout, _ = process.communicate()
+    if process.returncode != 0:
+        return None
+    return stdout
+
 def sha256hash(content):
     if _is_unicode(content):
         content = content.encode('utf-8')
@@ -23,3 +42,10 @@ def _is_unicode(content):
         or sys.version_info < (3,0) and isinstance(content, unicode)):
         return True
     return False
+
+def sha256hash_file(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
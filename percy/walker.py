@@ -0,0 +1,134 @@
+import os
+import stat as stat_module
+
+try:
+    scandir = os.scandir
+except AttributeError:
+    # Python 2: use the scandir backport if it's installed, otherwise listdir and stat.
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+__all__ = ['walk_files']
+
+STAT_KEYS = (
+    'files', 'files_excluded', 'files_too_large', 'dirs_pruned', 'duplicate_inodes',
+    'symlink_cycles', 'errors',
+)
+
+
+class _ListdirEntry(object):
+    # The parts of os.DirEntry that walk_files uses, for when scandir isn't available.
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, dir_path, name):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+        self._stat = None
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+
+def _list_dir(path):
+    if scandir is None:
+        return [_ListdirEntry(path, name) for name in os.listdir(path)]
+    return list(scandir(path))
+
+
+def _inode_key(stat):
+    # Some platforms (e.g. Windows before Python 3.12, through scandir) report no inode, and
+    # then nothing can be told apart.
+    if not stat.st_ino:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def walk_files(root_dir, path_filter=None, max_size=None, stats=None):
+    """Yield (path, stat, first_seen) for each regular file under root_dir, following symlinks.
+
+    Files come in the same order as a sorted os.walk: each directory's files by name, then its
+    subdirectories, depth first. Each file is stat'ed once through scandir, and directories
+    pruned by path_filter are never listed. A symlink to a directory that is already being
+    walked above it is skipped rather than followed forever. A file reached again, through a
+    symlink or a hard link, is still yielded for its new path, but with first_seen False so
+    its contents needn't be read twice.
+
+    Counts of what was yielded and skipped are added to the `stats` dict.
+    """
+    if stats is None:
+        stats = {}
+    for key in STAT_KEYS:
+        stats.setdefault(key, 0)
+    seen_files = set()
+
+    try:
+        root_key = _inode_key(os.stat(root_dir))
+    except OSError:
+        stats['errors'] += 1
+        return
+    # Directories still to walk, with their path relative to root_dir and the inodes of the
+    # directories above them. Popped from the end, so pushed in reverse order.
+    pending = [(root_dir, '', (root_key,))]
+    while pending:
+        dir_path, rel_dir, ancestors = pending.pop()
+        try:
+            entries = sorted(_list_dir(dir_path), key=lambda e: e.name)
+        except OSError:
+            # Like os.walk, skip directories that can't be listed.
+            stats['errors'] += 1
+            continue
+
+        subdirs = []
+        for entry in entries:
+            rel_path = rel_dir + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if path_filter and not path_filter.allows_dir(rel_path):
+                    stats['dirs_pruned'] += 1
+                    continue
+                try:
+                    dir_key = _inode_key(entry.stat())
+                except OSError:
+                    stats['errors'] += 1
+                    continue
+                if dir_key is not None and dir_key in ancestors:
+                    stats['symlink_cycles'] += 1
+                    continue
+                subdirs.append((entry.path, rel_path + '/', ancestors + (dir_key,)))
+                continue
+
+            if path_filter and not path_filter.allows_file(rel_path):
+                stats['files_excluded'] += 1
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # A broken symlink, or a file removed since the listing.
+                stats['errors'] += 1
+                continue
+            if not stat_module.S_ISREG(stat.st_mode):
+                continue
+            if max_size is not None and stat.st_size > max_size:
+                stats['files_too_large'] += 1
+                continue
+
+            file_key = _inode_key(stat)
+            first_seen = file_key not in seen_files
+            if not first_seen:
+                stats['duplicate_inodes'] += 1
+            elif file_key is not None:
+                seen_files.add(file_key)
+            stats['files'] += 1
+            yield entry.path, stat, first_seen
+
+        pending.extend(reversed(subdirs))
@@ -0,0 +1,199 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+import percy
+import requests_mock
+from percy import errors
+from percy import utils
+
+aio = importlib.import_module('percy.aio') if sys.version_info >= (3, 5) else None
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+
+class FakeWebdriver(object):
+    page_source = 'page source'
+    current_url = '/'
+
+
+def build_fixture(missing_shas=()):
+    return {
+        'data': {
+            'id': '123',
+            'type': 'builds',
+            'relationships': {
+                'self': '/api/v1/builds/123',
+                'missing-resources': {
+                    'data': [{'type': 'resources', 'id': sha} for sha in missing_shas],
+                },
+            },
+        },
+    }
+
+
+@unittest.skipIf(aio is None, 'asyncio support requires Python 3.5+')
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        config = percy.Config(access_token='abcd1234', default_widths=[1280, 375])
+        self.client = aio.AsyncClient(config=config)
+
+    def tearDown(self):
+        self.client.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    @requests_mock.Mocker()
+    def test_requests_fan_out(self, mock):
+        mock.post('https://percy.io/api/v1/snapshots/1/finalize', text='{"success": 1}')
+        mock.post('https://percy.io/api/v1/snapshots/2/finalize', text='{"success": 2}')
+        mock.post('https://percy.io/api/v1/snapshots/3/finalize', text='{"success": 3}')
+
+        results = self.loop.run_until_complete(asyncio.gather(
+            *[self.client.finalize_snapshot(i) for i in (1, 2, 3)]))
+        assert [r['success'] for r in results] == [1, 2, 3]
+        assert len(mock.request_history) == 3
+
+    @requests_mock.Mocker()
+    def test_upload_resource(self, mock):
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": "true"}')
+        result = self.loop.run_until_complete(self.client.upload_resource(123, 'foo'))
+        assert result == {'success': 'true'}
+        assert mock.request_history[0].json()['data']['attributes'] == {
+            'base64-content': utils.base64encode('foo'),
+        }
+
+
+@unittest.skipIf(aio is None, 'asyncio support requires Python 3.5+')
+class TestAsyncRunner(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        self.loader = percy.ResourceLoader(
+            root_dir=root_dir, base_url='/assets/', webdriver=FakeWebdriver())
+        config = percy.Config(access_token='foo', upload_workers=2)
+        self.runner = aio.AsyncRunner(config=config, loader=self.loader)
+
+    def tearDown(self):
+        self.runner.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    @requests_mock.Mocker()
+    def test_build_lifecycle(self, mock):
+        shas = sorted(set(r.sha for r in self.loader.build_resources))
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(build_fixture(shas)))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": true}')
+        self.loop.run_until_complete(self.runner.initialize_build())
+        assert self.runner.build_id == '123'
+
+        uploads = mock.request_history[1:]
+        uploaded_shas = []
+        for request in uploads:
+            request.body.seek(0)
+            uploaded_shas.append(json.loads(request.body.read().decode('utf-8'))['data']['id'])
+        assert sorted(uploaded_shas) == shas
+
+        snapshot_fixture = {
+            'data': {
+                'id': '256',
+                'type': 'snapshots',
+                'relationships': {
+                    'self': '/api/v1/snapshots/256',
+                    'missing-resources': {
+                        'data': [{'type': 'resources', 'id': utils.sha256hash('page source')}],
+                    },
+                },
+            },
+        }
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', text=json.dumps(snapshot_fixture))
+        mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+        self.loop.run_until_complete(self.runner.snapshot(name='foo'))
+        assert mock.request_history[-2].json()['data']['attributes']['base64-content'] == \
+            utils.base64encode('page source')
+        assert mock.request_history[-1].url == 'https://percy.io/api/v1/snapshots/256/finalize'
+
+        mock.post('https://percy.io/api/v1/builds/123/finalize', text='{"success": true}')
+        self.loop.run_until_complete(self.runner.finalize_build())
+        assert self.runner._current_build is None
+
+    @requests_mock.Mocker()
+    def test_initialize_build_reports_all_upload_failures(self, mock):
+        shas = sorted(set(r.sha for r in self.loader.build_resources))
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(build_fixture(shas)))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', status_code=400, text='{}')
+
+        with self.assertRaises(errors.ResourceUploadError) as context:
+            self.loop.run_until_complete(self.runner.initialize_build())
+        assert sorted(r.sha for r, _ in context.exception.failures) == shas
+
+    def test_snapshot_before_initialize(self):
+        with self.assertRaises(errors.UninitializedBuildError):
+            self.loop.run_until_complete(self.runner.snapshot())
+
+    @requests_mock.Mocker()
+    def test_snapshot_uploads_missing_resources_concurrently(self, mock):
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(build_fixture()))
+        self.loop.run_until_complete(self.runner.initialize_build())
+
+        resources = [
+            percy.Resource(resource_url='/{}'.format(i), content='resource {}'.format(i))
+            for i in range(4)
+        ]
+
+        # An awaitable built without async syntax, so this module still parses on Python 2.
+        def snapshot_resources(_):
+            future = self.loop.create_future()
+            future.set_result(resources)
+            return future
+        self.runner.loader = type('Loader', (object,), {
+            'snapshot_resources': property(snapshot_resources)})()
+
+        snapshot_fixture = {
+            'data': {
+                'id': '256',
+                'type': 'snapshots',
+                'relationships': {
+                    'missing-resources': {
+                        'data': [{'type': 'resources', 'id': r.sha} for r in resources],
+                    },
+                },
+            },
+        }
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def upload_resource(build_id, content):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+        self.runner.client._client.upload_resource = upload_resource
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', text=json.dumps(snapshot_fixture))
+        mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+        self.loop.run_until_complete(self.runner.snapshot(name='foo'))
+
+        # At most upload_workers at a time, but not one by one.
+        assert in_flight[1] == 2
+        assert mock.request_history[-1].url == 'https://percy.io/api/v1/snapshots/256/finalize'
+
+    def test_close_shuts_down_executor(self):
+        self.runner.close()
+        with self.assertRaises(RuntimeError):
+            self.runner.client.run_in_executor(lambda: None)
+
+        # A client passed in belongs to the caller and is left open.
+        client = aio.AsyncClient(config=percy.Config(access_token='foo'))
+        aio.AsyncRunner(config=client.config, client=client).close()
+        self.loop.run_until_complete(client.run_in_executor(lambda: None))
+        client.close()
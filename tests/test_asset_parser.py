@@ -0,0 +1,64 @@
+import unittest
+
+from percy.asset_parser import AssetParser, css_references, html_references
+
+
+class TestAssetParser(unittest.TestCase):
+    def test_html_references(self):
+        html = '''
+            <html>
+            <head>
+              <link rel="stylesheet" href="/assets/app.css">
+              <script src="app.js"></script>
+              <style>
+                @import "theme.css";
+                .hero { background: url('/assets/hero.png'); }
+              </style>
+            </head>
+            <body style="background-image: url(bg.jpg)">
+              <a href="/other-page">Not an asset</a>
+              <img src="logo.png" srcset="logo-1x.png 1x, logo-2x.png 2x">
+              <video poster="poster.jpg"><source src="movie.mp4"></video>
+            </body>
+            </html>
+        '''
+        assert html_references(html) == [
+            '/assets/app.css',
+            'app.js',
+            'theme.css',
+            '/assets/hero.png',
+            'bg.jpg',
+            'logo.png',
+            'logo-1x.png',
+            'logo-2x.png',
+            'poster.jpg',
+            'movie.mp4',
+        ]
+
+    def test_css_references(self):
+        css = '''
+            @import url("base.css");
+            @import 'print.css' print;
+            /* url(commented-out.png) */
+            .a { background: url( "a.png" ) }
+            .b { background: url(b.png) }
+            @font-face { src: url('font.woff2') format('woff2'); }
+        '''
+        assert css_references(css) == [
+            'print.css', 'base.css', 'a.png', 'b.png', 'font.woff2',
+        ]
+
+    def test_caches_by_sha(self):
+        parser = AssetParser()
+        reads = []
+
+        def read():
+            reads.append(1)
+            return b'.a { background: url(a.png) }'
+
+        assert parser.references(read, 'text/css', sha='abc') == ['a.png']
+        assert parser.references(read, 'text/css', sha='abc') == ['a.png']
+        assert len(reads) == 1
+        assert (parser.hits, parser.misses) == (1, 1)
+
+        assert parser.references('<img src="a.png">', 'text/html') == ['a.png']
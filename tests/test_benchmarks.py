@@ -0,0 +1,33 @@
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.run import run_scenario
+from benchmarks.trees import generate_tree
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_generate_tree_is_deterministic(self):
+        first = generate_tree(self.tmp_dir + '/a', 30, files_per_dir=10)
+        second = generate_tree(self.tmp_dir + '/b', 30, files_per_dir=10)
+        assert first == second
+
+    def test_run_scenario(self):
+        result = run_scenario(
+            self.tmp_dir, 30, snapshots=3, server_options={'error_rate': 0.1},
+            config_options={'upload_workers': 2})
+        assert result['files'] == 30
+        assert result['snapshots'] == 3
+        server = result['server']
+        assert server['by_endpoint']['builds'] == 1
+        assert server['by_endpoint']['builds/:id/snapshots'] >= 3
+        assert server['by_endpoint']['builds/:id/finalize'] >= 1
+        # Every unique file and every snapshot root is uploaded.
+        assert server['by_endpoint']['builds/:id/resources'] > 3
+        assert result['peak_rss_bytes'] > 0
@@ -6,6 +6,7 @@ import unittest
 
 import requests_mock
 import percy
+from percy import errors
 from percy import utils
 
 FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
@@ -76,6 +77,24 @@ class TestPercyClient(unittest.TestCase):
         }
         assert build_data == json.loads(build_fixture)
 
+    @requests_mock.Mocker()
+    def test_create_build_from_resource_stream(self, mock):
+        fixture_path = os.path.join(FIXTURES_DIR, 'build_response.json')
+        build_fixture = open(fixture_path).read()
+        mock.post('https://percy.io/api/v1/builds/', text=build_fixture)
+        resources = [
+            percy.Resource(resource_url='/main.css', content='foo'),
+            percy.Resource(resource_url='/app.js', content='bar'),
+        ]
+
+        self.percy_client.create_build(resources=(r for r in resources))
+        sent_resources = mock.request_history[0].json()['data']['relationships']['resources']
+        assert sent_resources['data'] == [r.serialize() for r in resources]
+
+        # An empty stream sends no relationships at all.
+        self.percy_client.create_build(resources=iter([]))
+        assert 'relationships' not in mock.request_history[1].json()['data']
+
     @requests_mock.Mocker()
     def test_finalize_build(self, mock):
         fixture_path = os.path.join(FIXTURES_DIR, 'build_response.json')
@@ -165,3 +184,81 @@ class TestPercyClient(unittest.TestCase):
             }
         }
         assert result == {'success': 'true'}
+
+    @requests_mock.Mocker()
+    def test_upload_resource_from_path(self, mock):
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": "true"}')
+
+        path = os.path.join(os.path.dirname(__file__), 'testdata', 'static', 'app.js')
+        result = self.percy_client.upload_resource_from_path(build_id=123, local_path=path)
+
+        with open(path, 'rb') as f:
+            content = f.read()
+        body = mock.request_history[0].body
+        body.seek(0)
+        assert json.loads(body.read().decode('utf-8')) == {
+            'data': {
+                'type': 'resources',
+                'id': utils.sha256hash(content),
+                'attributes': {
+                    'base64-content': utils.base64encode(content)
+                }
+            }
+        }
+        assert mock.request_history[0].headers['Content-Length'] == str(len(body))
+        assert result == {'success': 'true'}
+
+    @requests_mock.Mocker()
+    def test_upload_resource_skips_repeats_within_build(self, mock):
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": "true"}')
+        mock.post('https://percy.io/api/v1/builds/456/resources/', text='{"success": "true"}')
+
+        assert self.percy_client.upload_resource(build_id=123, content='foo')
+        assert self.percy_client.upload_resource(build_id=123, content='foo') is None
+        assert self.percy_client.upload_resource(build_id=456, content='foo')
+        assert len(mock.request_history) == 2
+        assert self.percy_client.upload_tracker.stats == {'hits': 1, 'misses': 2}
+
+    @requests_mock.Mocker()
+    def test_create_snapshots(self, mock):
+        def snapshot_response(request, context):
+            name = request.json()['data']['attributes']['name']
+            return {'data': {'id': name, 'type': 'snapshots'}}
+
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', json=snapshot_response)
+        snapshots = [
+            {'name': str(i), 'widths': [1280], 'resources': [
+                percy.Resource(resource_url='/', is_root=True, content='page {}'.format(i)),
+            ]}
+            for i in range(5)
+        ]
+        results = self.percy_client.create_snapshots(123, snapshots)
+        assert [r['data']['id'] for r in results] == ['0', '1', '2', '3', '4']
+        assert len(mock.request_history) == 5
+
+    @requests_mock.Mocker()
+    def test_create_snapshots_reports_all_failures(self, mock):
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', status_code=400, text='{}')
+        snapshots = [
+            {'name': name, 'resources': [percy.Resource(resource_url='/', content=name)]}
+            for name in ['foo', 'bar']
+        ]
+        with self.assertRaises(errors.SnapshotError) as context:
+            self.percy_client.create_snapshots(123, snapshots)
+        assert [name for name, _ in context.exception.failures] == ['foo', 'bar']
+
+    @requests_mock.Mocker()
+    def test_finalize_snapshots_return_errors(self, mock):
+        mock.post('https://percy.io/api/v1/snapshots/1/finalize', text='{"success": 1}')
+        mock.post('https://percy.io/api/v1/snapshots/2/finalize', status_code=400, text='{}')
+        outcomes = self.percy_client.finalize_snapshots([1, 2], return_errors=True)
+        assert outcomes[0] == ({'success': 1}, None)
+        assert outcomes[1][0] is None
+        assert isinstance(outcomes[1][1], Exception)
+
+    @requests_mock.Mocker()
+    def test_finalize_snapshots(self, mock):
+        mock.post('https://percy.io/api/v1/snapshots/1/finalize', text='{"success": 1}')
+        mock.post('https://percy.io/api/v1/snapshots/2/finalize', text='{"success": 2}')
+        results = self.percy_client.finalize_snapshots([1, 2])
+        assert results == [{'success': 1}, {'success': 2}]
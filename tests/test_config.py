@@ -17,6 +17,23 @@ class TestPercyConfig(unittest.TestCase):
         self.assertEqual(self.config.api_url, 'https://percy.io/api/v1')
         self.assertEqual(self.config.default_widths, [])
         self.assertEqual(self.config.access_token, 'abcd1234')
+        self.assertEqual(self.config.upload_workers, 4)
+        self.assertEqual(self.config.pool_connections, 10)
+        self.assertEqual(self.config.pool_maxsize, 10)
+        self.assertEqual(self.config.hash_cache_path, None)
+        self.assertEqual(self.config.git_index_path, None)
+        self.assertEqual(self.config.snapshot_workers, 0)
+        self.assertEqual(self.config.snapshot_queue_size, 4)
+        self.assertEqual(self.config.snapshot_batch_size, 1)
+        self.assertEqual(self.config.snapshot_flush_interval, 5.0)
+        self.assertEqual(self.config.compression, None)
+        self.assertEqual(self.config.compression_level, 6)
+        self.assertEqual(self.config.compression_threshold, 8192)
+        self.assertEqual(self.config.json_codec, 'auto')
+        self.assertEqual(self.config.report_path, None)
+        self.assertEqual(self.config.max_concurrency, 10)
+        self.assertEqual(self.config.max_retries, 3)
+        self.assertEqual(self.config.shard_cache_path, None)
 
     def test_setters(self):
         self.config.api_url = 'https://microsoft.com/'
@@ -1,9 +1,15 @@
+import gzip
+import io
+import json
 import os
 import requests
 import requests_mock
+import shutil
+import tempfile
 import unittest
 import percy
 from percy import connection
+from percy import streaming
 
 
 class TestPercyConnection(unittest.TestCase):
@@ -22,14 +28,50 @@ class TestPercyConnection(unittest.TestCase):
         auth_header = mock.request_history[0].headers['Authorization']
         assert auth_header == 'Token token=foo'
 
-    # TODO: This test fails, because requests_mock replaces the adapter where the
-    # retry configuration is injected. Can we find a different way to supply mock responses?
-    # @requests_mock.Mocker()
-    # def test_get_error_is_retried(self, mock):
-    #     mock.get('http://api.percy.io', [{'text':'{"error":"foo"}', 'status_code':503},
-    #         {'text':'{"data":"GET Percy"}', 'status_code':200}])
-    #     data = self.percy_connection.get('http://api.percy.io')
-    #     self.assertEqual(data['data'], 'GET Percy')
+    @requests_mock.Mocker()
+    def test_get_error_is_retried(self, mock):
+        mock.get('http://api.percy.io', [
+            {'text': '{"error":"foo"}', 'status_code': 503},
+            {'text': '{"error":"foo"}', 'status_code': 429, 'headers': {'Retry-After': '0'}},
+            {'text': '{"data":"GET Percy"}', 'status_code': 200},
+        ])
+        data = self.percy_connection.get('http://api.percy.io')
+        self.assertEqual(data['data'], 'GET Percy')
+        assert len(mock.request_history) == 3
+
+        metrics = self.percy_connection.throttle.metrics()
+        assert metrics['retries'] == 2
+        assert metrics['pauses'] == 1
+        assert metrics['decreases'] == 2
+        summary = self.percy_connection.instrumentation.summary()
+        assert summary['requests']['by_status'] == {'503': 1, '429': 1, '200': 1}
+        assert summary['throttle']['retries'] == 2
+
+    @requests_mock.Mocker()
+    def test_post_stream_is_rewound_for_retries(self, mock):
+        bodies = []
+
+        def respond(request, context):
+            bodies.append(request.body.read())
+            context.status_code = 503 if len(bodies) == 1 else 200
+            return '{}'
+
+        mock.post('http://api.percy.io', text=respond)
+        with streaming.SpooledBody() as body:
+            body.write(b'{"data": "data"}')
+            body.seek(0)
+            self.percy_connection.post_stream('http://api.percy.io', body)
+        assert bodies == [b'{"data": "data"}', b'{"data": "data"}']
+
+    @requests_mock.Mocker()
+    def test_retries_are_limited(self, mock):
+        config = percy.Config(access_token='foo', max_retries=1)
+        percy_connection = connection.Connection(config, percy.Environment())
+        mock.get('http://api.percy.io', text='{}', status_code=429, headers={'Retry-After': '0'})
+        self.assertRaises(requests.exceptions.HTTPError, lambda: percy_connection.get(
+            'http://api.percy.io'
+        ))
+        assert len(mock.request_history) == 2
 
     @requests_mock.Mocker()
     def test_get_error(self, mock):
@@ -57,3 +99,151 @@ class TestPercyConnection(unittest.TestCase):
             'http://api.percy.io',
             data='{"data": "data"}'
         ))
+
+    @requests_mock.Mocker()
+    def test_session_is_reused(self, mock):
+        mock.get('http://api.percy.io', text='{"data":"GET Percy"}')
+        mock.post('http://api.percy.io', text='{"data":"POST Percy"}')
+        session = self.percy_connection.session
+        self.percy_connection.get('http://api.percy.io')
+        self.percy_connection.post('http://api.percy.io', data={})
+        assert self.percy_connection.session is session
+
+        adapter = session.get_adapter('https://percy.io')
+        assert adapter._pool_connections == 10
+        assert adapter._pool_maxsize == 10
+
+    def test_session_pool_size_from_config(self):
+        config = percy.Config(access_token='foo', pool_connections=2, pool_maxsize=32)
+        percy_connection = connection.Connection(config, percy.Environment())
+        adapter = percy_connection.session.get_adapter('https://percy.io')
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 32
+
+    def test_session_is_rebuilt_after_fork(self):
+        session = self.percy_connection.session
+        # Simulate running in a forked child process.
+        self.percy_connection._session_pid = -1
+        assert self.percy_connection.session is not session
+        assert self.percy_connection.session is self.percy_connection.session
+
+    @requests_mock.Mocker()
+    def test_throttle_is_reset_before_first_request_after_fork(self, mock):
+        mock.get('http://api.percy.io', text='{}')
+        throttle = self.percy_connection.throttle
+        # Simulate a fork while a parent thread had a request in flight.
+        throttle.acquire()
+        self.percy_connection._pid = -1
+        self.percy_connection.get('http://api.percy.io')
+        assert throttle.in_flight == 0
+
+    def test_close(self):
+        session = self.percy_connection.session
+        self.percy_connection.close()
+        assert self.percy_connection.session is not session
+
+    @requests_mock.Mocker()
+    def test_post_stream_compression(self, mock):
+        received = []
+
+        def callback(request, context):
+            received.append((request.headers.get('Content-Encoding'), request.body.read()))
+            return {'success': True}
+        mock.post('http://api.percy.io', json=callback)
+        config = percy.Config(access_token='foo', compression='gzip', compression_threshold=100)
+        percy_connection = connection.Connection(config, percy.Environment())
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            local_path = os.path.join(tmp_dir, 'app.js')
+            with open(local_path, 'wb') as f:
+                f.write(b'console.log("hello");\n' * 1000)
+            with streaming.ResourceUploadBody('abc', local_path) as body:
+                percy_connection.post_stream('http://api.percy.io', body)
+                body.seek(0)
+                expected = body.read()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        encoding, sent = received[0]
+        assert encoding == 'gzip'
+        assert len(sent) < len(expected)
+        assert gzip.GzipFile(fileobj=io.BytesIO(sent)).read() == expected
+
+    @requests_mock.Mocker()
+    def test_post_compression(self, mock):
+        mock.post('http://api.percy.io', text='{"data":"POST Percy"}')
+        config = percy.Config(access_token='foo', compression='gzip', compression_threshold=100)
+        percy_connection = connection.Connection(config, percy.Environment())
+
+        # Small bodies are sent as-is.
+        percy_connection.post('http://api.percy.io', data={'data': 'small'})
+        assert 'Content-Encoding' not in mock.request_history[0].headers
+        assert mock.request_history[0].json() == {'data': 'small'}
+
+        large = {'data': ['resource'] * 100}
+        percy_connection.post('http://api.percy.io', data=large)
+        request = mock.request_history[1]
+        assert request.headers['Content-Encoding'] == 'gzip'
+        assert len(request.body) < len(json.dumps(large))
+        decompressed = gzip.GzipFile(fileobj=io.BytesIO(request.body)).read()
+        assert json.loads(decompressed.decode('utf-8')) == large
+
+    @requests_mock.Mocker()
+    def test_post_zstd_falls_back_to_gzip(self, mock):
+        mock.post('http://api.percy.io', text='{"data":"POST Percy"}')
+        config = percy.Config(access_token='foo', compression='zstd', compression_threshold=0)
+        percy_connection = connection.Connection(config, percy.Environment())
+        original_zstandard = connection.zstandard
+        connection.zstandard = None
+        try:
+            percy_connection.post('http://api.percy.io', data={'data': 'data'})
+        finally:
+            connection.zstandard = original_zstandard
+        assert mock.request_history[0].headers['Content-Encoding'] == 'gzip'
+
+    @requests_mock.Mocker()
+    def test_post_json_stream(self, mock):
+        received = []
+
+        def record(request, context):
+            body = request.body
+            if hasattr(body, 'read'):
+                body.seek(0)
+                body = body.read()
+            received.append((request.headers.get('Content-Encoding'), body))
+            return '{"success": true}'
+
+        mock.post('http://api.percy.io', text=record)
+        data = {'data': {'items': streaming.STREAM_PLACEHOLDER}}
+        items = [{'id': i} for i in range(1000)]
+
+        # Small bodies are sent like post would send them.
+        self.percy_connection.post_json_stream(
+            'http://api.percy.io', streaming.iterencode(data, items[:3]))
+        assert json.loads(received[0][1].decode('utf-8')) == {'data': {'items': items[:3]}}
+        assert not hasattr(mock.request_history[0].body, 'read')
+
+        # Larger bodies are spooled to disk and streamed, compressed if configured.
+        original_max_memory = streaming.SPOOL_MAX_MEMORY_BYTES
+        streaming.SPOOL_MAX_MEMORY_BYTES = 1024
+        try:
+            self.percy_connection.post_json_stream(
+                'http://api.percy.io', streaming.iterencode(data, items))
+            config = percy.Config(access_token='foo', compression='gzip', compression_threshold=0)
+            percy_connection = connection.Connection(config, percy.Environment())
+            percy_connection.post_json_stream(
+                'http://api.percy.io', streaming.iterencode(data, items))
+        finally:
+            streaming.SPOOL_MAX_MEMORY_BYTES = original_max_memory
+
+        encoding, body = received[1]
+        assert encoding is None
+        assert hasattr(mock.request_history[1].body, 'read')
+        assert mock.request_history[1].headers['Content-Length'] == str(len(body))
+        assert json.loads(body.decode('utf-8')) == {'data': {'items': items}}
+
+        encoding, body = received[2]
+        assert encoding == 'gzip'
+        decompressed = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+        assert json.loads(decompressed.decode('utf-8')) == {'data': {'items': items}}
@@ -1,7 +1,11 @@
+import json
 import os
 import percy
 import pytest
+import shutil
+import subprocess
 import sys
+import tempfile
 
 class BaseTestPercyEnvironment(object):
     def setup_method(self, method):
@@ -31,6 +35,7 @@ class BaseTestPercyEnvironment(object):
             'PERCY_PULL_REQUEST',
             'PERCY_PARALLEL_NONCE',
             'PERCY_PARALLEL_TOTAL',
+            'PERCY_ENVIRONMENT_SNAPSHOT',
 
             # Unset Travis vars.
             'TRAVIS_BUILD_ID',
@@ -174,13 +179,16 @@ class TestNoEnvironment(BaseTestPercyEnvironment):
         # gets formatted correctly
         os.environ['PERCY_BRANCH'] = 'the-coolest-branch'
         def fake_raw_commit(commit_sha):
-            return """COMMIT_SHA:2fcd1b107aa25e62a06de7782d0c17544c669d139
-                      AUTHOR_NAME:Tim Haines
-                      AUTHOR_EMAIL:timhaines@example.com
-                      COMMITTER_NAME:Other Tim Haines
-                      COMMITTER_EMAIL:othertimhaines@example.com
-                      COMMITTED_DATE:2018-03-10 14:41:02 -0800
-                      COMMIT_MESSAGE:This is a great commit"""
+            return '\x00'.join([
+                '2fcd1b107aa25e62a06de7782d0c17544c669d139',
+                'Tim Haines',
+                'timhaines@example.com',
+                'Other Tim Haines',
+                'othertimhaines@example.com',
+                '2018-03-10 14:41:02 -0800',
+                'HEAD -> the-coolest-branch',
+                'This is a great commit',
+            ])
 
         monkeypatch.setattr(self.environment, '_raw_commit_output', fake_raw_commit)
         assert self.environment.commit_data == {
@@ -195,6 +203,49 @@ class TestNoEnvironment(BaseTestPercyEnvironment):
         }
 
 
+    def test_commit_data_runs_git_once(self, monkeypatch):
+        calls = []
+
+        def fake_raw_git_output(args):
+            calls.append(args)
+            return '\x00'.join([
+                'abc123',
+                'Tim Haines',
+                'timhaines@example.com',
+                'Other Tim Haines',
+                'othertimhaines@example.com',
+                '2018-03-10 14:41:02 -0800',
+                'HEAD -> the-coolest-branch, origin/the-coolest-branch',
+                'Subject line\n\nA body with COMMIT_SHA:fake and\nseveral lines.',
+            ])
+
+        monkeypatch.setattr(self.environment, '_raw_git_output', fake_raw_git_output)
+        expected = {
+            'branch': 'the-coolest-branch',
+            'sha': 'abc123',
+            'committed_at': '2018-03-10 14:41:02 -0800',
+            'message': 'Subject line\n\nA body with COMMIT_SHA:fake and\nseveral lines.',
+            'author_name': 'Tim Haines',
+            'author_email': 'timhaines@example.com',
+            'committer_name': 'Other Tim Haines',
+            'committer_email': 'othertimhaines@example.com',
+        }
+        assert self.environment.commit_data == expected
+        assert self.environment.commit_data == expected
+        assert self.environment.branch == 'the-coolest-branch'
+        assert len(calls) == 1
+
+    def test_branch_detached_head(self, monkeypatch):
+        monkeypatch.setattr(
+            self.environment, '_raw_commit_output',
+            lambda commit_sha: '\x00'.join(['abc123', '', '', '', '', '', 'HEAD, origin/foo', '']))
+        assert self.environment.branch == 'HEAD'
+
+    def test_branch_without_git(self, monkeypatch):
+        monkeypatch.setattr(self.environment, '_raw_git_output', lambda args: '')
+        assert self.environment.branch == None
+        assert self.environment.commit_data['sha'] == None
+
     @pytest.fixture()
     def test_branch(self, monkeypatch):
         # Default calls _raw_branch_output and call git underneath, so allow any non-empty string.
@@ -223,6 +274,66 @@ class TestNoEnvironment(BaseTestPercyEnvironment):
         assert self.environment.parallel_total_shards == 2
 
 
+class TestEnvironmentSnapshot(BaseTestPercyEnvironment):
+    def setup_method(self, method):
+        super(TestEnvironmentSnapshot, self).setup_method(self)
+        os.environ['TRAVIS_BUILD_ID'] = '1234'
+        os.environ['TRAVIS_BUILD_NUMBER'] = 'travis-build-number'
+        os.environ['TRAVIS_PULL_REQUEST'] = '256'
+        os.environ['TRAVIS_COMMIT'] = 'travis-commit-sha'
+        os.environ['TRAVIS_BRANCH'] = 'travis-branch'
+        os.environ['CI_NODE_TOTAL'] = '3'
+        self.environment = percy.Environment()
+        self.environment._parsed_commit = lambda commit_sha: {'sha': commit_sha}
+        self.commit_data = self.environment.commit_data
+
+    def assert_matches_travis(self, environment):
+        assert environment.current_ci == 'travis'
+        assert environment.pull_request_number == '256'
+        assert environment.branch == 'travis-branch'
+        assert environment.commit_sha == 'travis-commit-sha'
+        assert environment.parallel_nonce == 'travis-build-number'
+        assert environment.parallel_total_shards == 3
+        assert environment.commit_data == self.commit_data
+
+    def test_export_to_environ(self):
+        self.environment.export_to_environ()
+        self.clear_env_vars_except_snapshot()
+
+        environment = percy.Environment()
+        environment._raw_git_output = lambda args: pytest.fail('git should not be run')
+        self.assert_matches_travis(environment)
+
+    def test_export_to_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'environment.json')
+            self.environment.export_to_environ(path)
+            assert os.environ['PERCY_ENVIRONMENT_SNAPSHOT'] == path
+            assert json.load(open(path))['branch'] == 'travis-branch'
+            self.clear_env_vars_except_snapshot()
+            self.assert_matches_travis(percy.Environment())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_child_process_loads_snapshot(self):
+        env = {'PERCY_ENVIRONMENT_SNAPSHOT': self.environment.export_snapshot()}
+        env['PATH'] = os.environ.get('PATH', '')
+        env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import percy; print(percy.Environment().branch)'], env=env)
+        assert output.decode('utf-8').strip() == 'travis-branch'
+
+    def test_unreadable_snapshot_is_ignored(self):
+        os.environ['PERCY_ENVIRONMENT_SNAPSHOT'] = '/does/not/exist.json'
+        assert percy.Environment().branch == 'travis-branch'
+
+    def clear_env_vars_except_snapshot(self):
+        snapshot = os.environ['PERCY_ENVIRONMENT_SNAPSHOT']
+        self.clear_env_vars()
+        os.environ['PERCY_ENVIRONMENT_SNAPSHOT'] = snapshot
+
+
 class TestTravisEnvironment(BaseTestPercyEnvironment):
     def setup_method(self, method):
         super(TestTravisEnvironment, self).setup_method(self)
@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from percy import utils
+from percy.git_index import GitHashIndex, clean_tracked_blobs
+from percy.resource_loader import ResourceLoader
+
+
+def git(repo_dir, *args):
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME='Tim Haines',
+        GIT_AUTHOR_EMAIL='timhaines@example.com',
+        GIT_COMMITTER_NAME='Tim Haines',
+        GIT_COMMITTER_EMAIL='timhaines@example.com',
+    )
+    return subprocess.check_output(['git'] + list(args), cwd=repo_dir, env=env).decode('utf-8')
+
+
+def write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class TestGitHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.repo_dir = os.path.join(self.tmp_dir, 'repo')
+        self.root_dir = os.path.join(self.repo_dir, 'static')
+        self.index_path = os.path.join(self.tmp_dir, 'index', 'digests.json')
+        os.makedirs(self.root_dir)
+        git(self.repo_dir, 'init', '-q')
+        write(os.path.join(self.root_dir, 'app.js'), 'console.log(1);')
+        write(os.path.join(self.root_dir, 'css', 'app.css'), 'body {}')
+        write(os.path.join(self.repo_dir, 'outside.txt'), 'not under root_dir')
+        git(self.repo_dir, 'add', '.')
+        git(self.repo_dir, 'commit', '-q', '-m', 'Initial commit')
+
+        self.hashed = []
+        original = utils.sha256hash_file
+
+        def counting_hash(path):
+            self.hashed.append(os.path.relpath(path, self.root_dir))
+            return original(path)
+        utils.sha256hash_file = counting_hash
+        self.addCleanup(setattr, utils, 'sha256hash_file', original)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def build_resources(self):
+        loader = ResourceLoader(
+            root_dir=self.root_dir, base_url='/assets/', git_index=self.index_path)
+        return sorted((r.resource_url, r.sha) for r in loader.build_resources), loader.git_index
+
+    def test_clean_tracked_blobs(self):
+        write(os.path.join(self.root_dir, 'app.js'), 'console.log(2);')
+        write(os.path.join(self.root_dir, 'untracked.js'), '')
+        blobs = clean_tracked_blobs(self.root_dir)
+        css_path = os.path.normcase(os.path.join(self.root_dir, 'css', 'app.css'))
+        assert list(blobs) == [css_path]
+        assert blobs[css_path] == git(self.repo_dir, 'hash-object', css_path).strip()
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'needs symlinks')
+    def test_clean_tracked_blobs_through_symlink(self):
+        link_dir = os.path.join(self.tmp_dir, 'link')
+        os.symlink(self.repo_dir, link_dir)
+        linked_root = os.path.join(link_dir, 'static')
+        index = GitHashIndex(self.index_path)
+        assert index.scan(linked_root) == 2
+        assert index.blob_id(os.path.join(linked_root, 'app.js'))
+
+    def test_clean_tracked_blobs_outside_git(self):
+        assert clean_tracked_blobs(self.tmp_dir) == {}
+
+    def test_skips_hashing_clean_tracked_files(self):
+        first, index = self.build_resources()
+        assert sorted(self.hashed) == ['app.js', os.path.join('css', 'app.css')]
+        assert (index.hits, index.misses) == (0, 2)
+
+        # A fresh clone has new mtimes and inodes, but the same blobs.
+        clone_dir = os.path.join(self.tmp_dir, 'clone')
+        git(self.tmp_dir, 'clone', '-q', self.repo_dir, clone_dir)
+        shutil.rmtree(self.repo_dir)
+        os.rename(clone_dir, self.repo_dir)
+        write(os.path.join(self.root_dir, 'app.js'), 'console.log(2);')
+        write(os.path.join(self.root_dir, 'new.js'), 'new')
+
+        self.hashed = []
+        second, index = self.build_resources()
+        assert sorted(self.hashed) == ['app.js', 'new.js']
+        assert index.hits == 1
+        assert dict(second)['/assets/css/app.css'] == dict(first)['/assets/css/app.css']
+        for url, sha in second:
+            path = os.path.join(self.root_dir, *url[len('/assets/'):].split('/'))
+            with open(path, 'rb') as f:
+                assert sha == utils.sha256hash(f.read())
+
+    def test_save_keeps_only_current_blobs(self):
+        self.build_resources()
+        os.remove(os.path.join(self.root_dir, 'app.js'))
+        git(self.repo_dir, 'commit', '-q', '-am', 'Remove app.js')
+        self.build_resources()
+        with open(self.index_path) as f:
+            digests = json.load(f)['digests']
+        css_blob = git(self.repo_dir, 'rev-parse', 'HEAD:static/css/app.css').strip()
+        assert list(digests) == [css_blob]
+
+    def test_ignores_digest_for_different_size(self):
+        self.build_resources()
+        index = GitHashIndex(self.index_path)
+        index.scan(self.root_dir)
+        path = os.path.join(self.root_dir, 'app.js')
+        stat = os.stat(path)
+        assert index.lookup(path, stat) is not None
+
+        class Resized(object):
+            st_size = stat.st_size + 1
+        assert index.lookup(path, Resized()) is None
+
+    def test_ignores_unreadable_index(self):
+        write(self.index_path, 'not json')
+        resources, index = self.build_resources()
+        assert len(resources) == 2
+        assert index.misses == 2
@@ -0,0 +1,108 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import percy
+from percy.git_reader import GitReader, UnsupportedGitRepoError
+
+
+def git(repo_dir, *args):
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME='Tim Haines',
+        GIT_AUTHOR_EMAIL='timhaines@example.com',
+        GIT_AUTHOR_DATE='2018-03-10T14:41:02-0800',
+        GIT_COMMITTER_NAME='Other Tim Haines',
+        GIT_COMMITTER_EMAIL='othertimhaines@example.com',
+        GIT_COMMITTER_DATE='2018-03-11T10:00:00+0100',
+    )
+    return subprocess.check_output(['git'] + list(args), cwd=repo_dir, env=env).decode('utf-8')
+
+
+class TestGitReader(unittest.TestCase):
+    def setUp(self):
+        self.repo_dir = tempfile.mkdtemp()
+        git(self.repo_dir, 'init', '-q')
+        git(self.repo_dir, 'checkout', '-q', '-b', 'the-coolest-branch')
+        with open(os.path.join(self.repo_dir, 'file.txt'), 'w') as f:
+            f.write('foo')
+        git(self.repo_dir, 'add', 'file.txt')
+        git(self.repo_dir, 'commit', '-q', '-m', 'This is a great commit\n\nWith a body.')
+        self.sha = git(self.repo_dir, 'rev-parse', 'HEAD').strip()
+        self.git_dir = os.path.join(self.repo_dir, '.git')
+        self.original_cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.repo_dir)
+
+    def subprocess_commit(self):
+        os.chdir(self.repo_dir)
+        return percy.Environment()._parsed_commit('HEAD')
+
+    def test_matches_git_show(self):
+        commit = GitReader(self.git_dir).commit('HEAD')
+        assert commit == self.subprocess_commit()
+        assert commit == {
+            'sha': self.sha,
+            'author_name': 'Tim Haines',
+            'author_email': 'timhaines@example.com',
+            'committer_name': 'Other Tim Haines',
+            'committer_email': 'othertimhaines@example.com',
+            'committed_at': '2018-03-10 14:41:02 -0800',
+            'refs': 'HEAD -> the-coolest-branch',
+            'message': 'This is a great commit\n\nWith a body.',
+        }
+        assert GitReader(self.git_dir).commit(self.sha) == commit
+
+    def test_packed_refs(self):
+        git(self.repo_dir, 'pack-refs', '--all')
+        assert not os.path.exists(os.path.join(self.git_dir, 'refs', 'heads', 'the-coolest-branch'))
+        assert GitReader(self.git_dir).resolve('HEAD') == self.sha
+
+    def test_detached_head(self):
+        git(self.repo_dir, 'checkout', '-q', self.sha)
+        reader = GitReader(self.git_dir)
+        assert reader.branch == 'HEAD'
+        assert reader.commit('HEAD')['refs'] == 'HEAD'
+
+    def test_packed_objects_are_unsupported(self):
+        git(self.repo_dir, 'gc', '-q')
+        self.assertRaises(UnsupportedGitRepoError, lambda: GitReader(self.git_dir).commit('HEAD'))
+
+    def test_abbreviated_sha_is_unsupported(self):
+        self.assertRaises(
+            UnsupportedGitRepoError, lambda: GitReader(self.git_dir).commit(self.sha[:7]))
+
+    def test_worktree_is_unsupported(self):
+        worktree_dir = os.path.join(tempfile.mkdtemp(), 'worktree')
+        try:
+            git(self.repo_dir, 'worktree', 'add', '-q', worktree_dir)
+            os.chdir(worktree_dir)
+            self.assertRaises(UnsupportedGitRepoError, GitReader)
+        finally:
+            shutil.rmtree(os.path.dirname(worktree_dir))
+
+    def test_environment_uses_native_reader(self):
+        os.chdir(self.repo_dir)
+        os.environ['PERCY_GIT_READER'] = 'native'
+        try:
+            environment = percy.Environment()
+            environment._raw_git_output = lambda args: self.fail('git should not be spawned')
+            assert environment.commit_data['sha'] == self.sha
+            assert environment.branch == 'the-coolest-branch'
+        finally:
+            del os.environ['PERCY_GIT_READER']
+
+    def test_environment_falls_back_to_git(self):
+        git(self.repo_dir, 'gc', '-q')
+        os.chdir(self.repo_dir)
+        os.environ['PERCY_GIT_READER'] = 'native'
+        try:
+            environment = percy.Environment()
+            assert environment.commit_data['sha'] == self.sha
+            assert environment.commit_data['author_name'] == 'Tim Haines'
+        finally:
+            del os.environ['PERCY_GIT_READER']
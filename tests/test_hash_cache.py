@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from percy.hash_cache import HashCache
+
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'cache', 'hashes.sqlite')
+        self.file_path = os.path.join(self.tmp_dir, 'file.txt')
+        with open(self.file_path, 'w') as f:
+            f.write('foo')
+        # Move the mtime outside of the racy window so the entry can be cached.
+        old = time.time() - 60
+        os.utime(self.file_path, (old, old))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_store_and_lookup(self):
+        cache = HashCache(self.cache_path)
+        stat = os.stat(self.file_path)
+        assert cache.lookup(self.file_path, stat) is None
+        cache.store(self.file_path, stat, 'abc')
+        assert cache.lookup(self.file_path, stat) == 'abc'
+        assert (cache.hits, cache.misses) == (1, 1)
+        cache.close()
+
+        # Entries persist across instances.
+        with HashCache(self.cache_path) as cache:
+            assert cache.lookup(self.file_path, stat) == 'abc'
+
+    def test_invalidated_when_file_changes(self):
+        with HashCache(self.cache_path) as cache:
+            cache.store(self.file_path, os.stat(self.file_path), 'abc')
+
+            with open(self.file_path, 'w') as f:
+                f.write('foobar')
+            old = time.time() - 30
+            os.utime(self.file_path, (old, old))
+            assert cache.lookup(self.file_path, os.stat(self.file_path)) is None
+
+    def test_recently_modified_files_are_not_stored(self):
+        with HashCache(self.cache_path) as cache:
+            os.utime(self.file_path, None)
+            stat = os.stat(self.file_path)
+            cache.store(self.file_path, stat, 'abc')
+            assert cache.lookup(self.file_path, stat) is None
+
+    def test_size_bound(self):
+        stat = os.stat(self.file_path)
+        with HashCache(self.cache_path, max_entries=2) as cache:
+            for name in ['a', 'b', 'c']:
+                cache.store(os.path.join(self.tmp_dir, name), stat, name)
+        with HashCache(self.cache_path) as cache:
+            count = cache._db.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+            assert count == 2
+
+    def test_schema_version_change_drops_entries(self):
+        stat = os.stat(self.file_path)
+        with HashCache(self.cache_path) as cache:
+            cache.store(self.file_path, stat, 'abc')
+            cache._db.execute('PRAGMA user_version = 0')
+            cache._db.commit()
+        with HashCache(self.cache_path) as cache:
+            assert cache.lookup(self.file_path, stat) is None
+
+    def test_shared_between_processes(self):
+        stat = os.stat(self.file_path)
+        with HashCache(self.cache_path) as cache:
+            cache.store(self.file_path, stat, 'abc')
+        first = HashCache(self.cache_path)
+        second = HashCache(self.cache_path)
+        try:
+            # A hit doesn't hold a write lock open until the end of the walk.
+            assert first.lookup(self.file_path, stat) == 'abc'
+            assert not first._db.in_transaction
+            second.store(self.file_path, stat, 'abc')
+            second.flush()
+            assert second.lookup(self.file_path, stat) == 'abc'
+        finally:
+            first.close()
+            second.close()
+
+    def test_database_errors_fall_back_to_hashing(self):
+        stat = os.stat(self.file_path)
+        cache = HashCache(self.cache_path)
+        cache.store(self.file_path, stat, 'abc')
+        cache._db.execute('DROP TABLE hashes')
+        try:
+            cache.flush()
+            assert cache.lookup(self.file_path, stat) is None
+            assert cache.misses == 1
+        finally:
+            cache.close()
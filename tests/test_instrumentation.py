@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from percy.instrumentation import Instrumentation, endpoint_name
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_endpoint_name(self):
+        assert endpoint_name('https://percy.io/api/v1/builds/') == 'builds'
+        assert endpoint_name('https://percy.io/api/v1/builds/12/resources/') == \
+            'builds/:id/resources'
+        assert endpoint_name('http://localhost:1234/snapshots/56/finalize') == \
+            'snapshots/:id/finalize'
+
+    def test_summary(self):
+        instrumentation = Instrumentation()
+        instrumentation.record_request(
+            'POST', 'https://percy.io/api/v1/builds/1/resources/', 201, 0.5, bytes_sent=100,
+            bytes_received=10, retries=2)
+        instrumentation.record_request(
+            'POST', 'https://percy.io/api/v1/builds/1/resources/', 500, 1.5, bytes_sent=100)
+        instrumentation.record_request(
+            'POST', 'https://percy.io/api/v1/builds/', None, 3.0, error='ConnectionError()')
+        with instrumentation.phase('upload'):
+            pass
+        instrumentation.record_phase('upload', 2.0)
+
+        summary = instrumentation.summary()
+        requests = summary['requests']
+        assert requests['count'] == 3
+        assert requests['errors'] == 2
+        assert requests['retries'] == 2
+        assert requests['bytes_sent'] == 200
+        assert requests['bytes_received'] == 10
+        assert requests['by_status'] == {'201': 1, '500': 1, 'error': 1}
+        resources = requests['by_endpoint']['builds/:id/resources']
+        assert resources['count'] == 2
+        assert resources['seconds'] == 2.0
+        assert resources['max_seconds'] == 1.5
+        assert summary['phases']['upload']['count'] == 2
+        assert summary['phases']['upload']['max_seconds'] == 2.0
+        assert summary['events'] == {'request': 3, 'phase': 2}
+
+    def test_hooks(self):
+        instrumentation = Instrumentation()
+        events = []
+        hook = instrumentation.subscribe(lambda event, data: events.append((event, data)))
+
+        def broken_hook(event, data):
+            raise ValueError('broken')
+
+        instrumentation.subscribe(broken_hook)
+        instrumentation.record_phase('scan', 1.0)
+        instrumentation.emit('throttle', limit=4)
+        instrumentation.unsubscribe(hook)
+        instrumentation.record_phase('hash', 1.0)
+        assert events == [('phase', {'name': 'scan', 'seconds': 1.0}), ('throttle', {'limit': 4})]
+
+    def test_write_report(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'report.json')
+            instrumentation = Instrumentation()
+            instrumentation.record_phase('scan', 1.0)
+            instrumentation.write_report(path)
+            with open(path) as f:
+                assert json.load(f)['phases']['scan']['seconds'] == 1.0
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,53 @@
+import json
+import unittest
+
+import pytest
+
+import percy
+from benchmarks.json_codecs import build_payload, installed_codecs
+from percy import json_codec
+from percy import streaming
+from percy.connection import Connection
+
+
+class TestJSONCodec(unittest.TestCase):
+    def test_get_codec(self):
+        assert json_codec.get_codec('json').name == 'json'
+        assert json_codec.get_codec().name == installed_codecs()[0].name
+        with pytest.raises(ValueError):
+            json_codec.get_codec('simplejson')
+
+    def test_missing_library_falls_back_to_stdlib(self):
+        original = json_codec._CODEC_FACTORIES['ujson']
+
+        def missing():
+            raise ImportError('No module named ujson')
+
+        json_codec._CODEC_FACTORIES['ujson'] = missing
+        try:
+            assert json_codec.get_codec('ujson').name == 'json'
+        finally:
+            json_codec._CODEC_FACTORIES['ujson'] = original
+
+    def test_codecs_round_trip(self):
+        payload = build_payload(50)
+        for codec in installed_codecs():
+            encoded = codec.encode(payload)
+            assert isinstance(encoded, bytes)
+            assert json.loads(encoded.decode('utf-8')) == payload
+            assert codec.decode(encoded) == payload
+            assert codec.decode(encoded.decode('utf-8')) == payload
+
+    def test_codecs_stream_manifests(self):
+        payload = build_payload(10)
+        resources = payload['data']['relationships']['resources']['data']
+        data = {'data': {'resources': streaming.STREAM_PLACEHOLDER}}
+        for codec in installed_codecs():
+            chunks = streaming.iterencode(data, iter(resources), encode=codec.encode)
+            assert json.loads(b''.join(chunks).decode('utf-8')) == {
+                'data': {'resources': resources},
+            }
+
+    def test_connection_uses_configured_codec(self):
+        config = percy.Config(access_token='foo', json_codec='json')
+        assert Connection(config, percy.Environment()).json_codec.name == 'json'
@@ -0,0 +1,69 @@
+import unittest
+
+from percy.path_filter import PathFilter
+
+
+class TestPathFilter(unittest.TestCase):
+    def test_empty_filter_allows_everything(self):
+        path_filter = PathFilter()
+        assert not path_filter
+        assert path_filter.allows('a/b/c.js')
+
+    def test_basename_patterns_match_at_any_depth(self):
+        path_filter = PathFilter(exclude=['*.map', 'node_modules/'])
+        assert not path_filter.allows_file('app.js.map')
+        assert not path_filter.allows_file('js/vendor/app.js.map')
+        assert not path_filter.allows_dir('node_modules')
+        assert not path_filter.allows_dir('js/node_modules')
+        # Trailing slash patterns only match directories.
+        assert path_filter.allows_file('node_modules')
+        assert path_filter.allows_file('js/app.js')
+
+    def test_anchored_patterns(self):
+        path_filter = PathFilter(exclude=['/build', 'docs/*.md'])
+        assert not path_filter.allows_dir('build')
+        assert path_filter.allows_dir('src/build')
+        assert not path_filter.allows_file('docs/README.md')
+        assert path_filter.allows_file('docs/api/README.md')
+        assert path_filter.allows_file('other/docs/README.md')
+
+    def test_double_star(self):
+        path_filter = PathFilter(exclude=['**/tmp/**/*.log', 'cache/**'])
+        assert not path_filter.allows_file('tmp/a.log')
+        assert not path_filter.allows_file('x/tmp/y/z/a.log')
+        assert path_filter.allows_file('x/tmp/a.txt')
+        assert path_filter.allows_dir('cache')
+        assert not path_filter.allows_dir('cache/images')
+        assert not path_filter.allows_file('cache/a.png')
+
+    def test_character_classes_and_escapes(self):
+        path_filter = PathFilter(exclude=['file[0-9].txt', 'other[!a].txt', r'\#hash', r'\!bang'])
+        assert not path_filter.allows_file('file1.txt')
+        assert path_filter.allows_file('filex.txt')
+        assert not path_filter.allows_file('otherb.txt')
+        assert path_filter.allows_file('othera.txt')
+        assert not path_filter.allows_file('#hash')
+        assert not path_filter.allows_file('!bang')
+
+    def test_negation_last_match_wins(self):
+        path_filter = PathFilter(exclude='# Source maps\n*.map\n!keep.map\n\nlogs/\n!logs/\n')
+        assert not path_filter.allows_file('app.map')
+        assert path_filter.allows_file('js/keep.map')
+        assert path_filter.allows_dir('logs')
+
+    def test_include(self):
+        path_filter = PathFilter(include=['*.css', 'images/'], exclude=['images/raw/'])
+        assert path_filter.allows_file('css/app.css')
+        assert path_filter.allows_file('images/logo.png')
+        assert path_filter.allows_file('images/icons/logo.png')
+        assert not path_filter.allows_file('app.js')
+        assert path_filter.allows_dir('images')
+        assert not path_filter.allows_dir('images/raw')
+
+    def test_allows_checks_parent_directories(self):
+        path_filter = PathFilter(exclude=['vendor/', '!vendor/keep.js'])
+        # As in git, a file can't be re-included from inside an excluded directory.
+        assert path_filter.allows_file('vendor/keep.js')
+        assert not path_filter.allows('vendor/keep.js')
+        assert not path_filter.allows('a/vendor/b/c.js')
+        assert path_filter.allows('a/b/c.js')
@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+
+from percy.pool import WorkerPool, imap
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_runs_all_tasks(self):
+        results = []
+        lock = threading.Lock()
+
+        def task(value):
+            with lock:
+                results.append(value)
+
+        pool = WorkerPool(workers=4)
+        for i in range(20):
+            pool.submit(task, i)
+        assert pool.join() == []
+        assert sorted(results) == list(range(20))
+
+    def test_collects_failures(self):
+        def task(value):
+            if value % 2:
+                raise ValueError(value)
+
+        pool = WorkerPool(workers=3)
+        for i in range(6):
+            pool.submit(task, i)
+        failures = pool.join()
+        assert sorted(args[0] for args, _ in failures) == [1, 3, 5]
+        assert all(isinstance(e, ValueError) for _, e in failures)
+
+        # Failures are reset after each join.
+        assert pool.join() == []
+
+    def test_bounds_concurrency(self):
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def task():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        pool = WorkerPool(workers=2)
+        for _ in range(10):
+            pool.submit(task)
+        pool.join()
+        assert peak[0] <= 2
+
+    def test_close_stops_workers(self):
+        pool = WorkerPool(workers=2)
+        pool.submit(lambda: None)
+        pool.join()
+        threads = list(pool._threads)
+        pool.close()
+        assert not any(thread.is_alive() for thread in threads)
+
+
+class TestImap(unittest.TestCase):
+    def test_preserves_order(self):
+        def slow_square(value):
+            time.sleep(0.001 * (10 - value))
+            return value * value
+
+        assert list(imap(slow_square, range(10), workers=4)) == [v * v for v in range(10)]
+        assert list(imap(slow_square, range(10), workers=1)) == [v * v for v in range(10)]
+
+    def test_is_lazy(self):
+        pulled = []
+
+        def items():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        results = imap(lambda value: value, items(), workers=2, lookahead=4)
+        assert next(results) == 0
+        assert len(pulled) <= 5
+        assert list(results) == list(range(1, 100))
+
+    def test_reraises_errors(self):
+        def fail_on_three(value):
+            if value == 3:
+                raise ValueError(value)
+            return value
+
+        results = imap(fail_on_three, range(6), workers=2)
+        assert [next(results) for _ in range(3)] == [0, 1, 2]
+        self.assertRaises(ValueError, lambda: next(results))
@@ -1,6 +1,12 @@
 import unittest
 import os
+import shutil
+import tempfile
 
+from percy import utils
+from percy import walker
+from percy.hash_cache import HashCache
+from percy.path_filter import PathFilter
 from percy.resource_loader import ResourceLoader
 
 TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
@@ -10,6 +16,18 @@ class FakeWebdriver(object):
     current_url = '/'
 
 
+class FakeWebdriverReferencingAssets(object):
+    page_source = (
+        '<link rel="stylesheet" href="/assets/styles.css">'
+        '<script src="/assets/app.js"></script>'
+        '<img src="../assets/images/logo.png">'
+        '<img src="/assets/missing.png">'
+        '<img src="/elsewhere/logo.png">'
+        '<img src="https://cdn.example.com/assets/app.js">'
+    )
+    current_url = 'http://testserver/pages/index.html'
+
+
 class FakeWebdriverAbsoluteUrl(object):
     page_source = 'foo'
     current_url = 'http://testserver/'
@@ -34,6 +52,150 @@ class TestPercyResourceLoader(unittest.TestCase):
             '/assets/styles.css',
         ]
 
+    def test_iter_build_resources(self):
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        resource_loader = ResourceLoader(root_dir=root_dir, base_url='/assets/')
+        resources = resource_loader.iter_build_resources()
+        assert not isinstance(resources, list)
+        first = next(resources)
+        assert first.resource_url == '/assets/app.js'
+        assert first.content is None
+        assert len(list(resources)) == 3
+        assert list(ResourceLoader().iter_build_resources()) == []
+
+    def test_build_resource_table(self):
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        resource_loader = ResourceLoader(root_dir=root_dir, base_url='/assets/')
+        table = resource_loader.build_resource_table()
+        assert list(table.serialize()) == [
+            r.serialize() for r in resource_loader.build_resources]
+        assert table.get(table.sha(0)).local_path == os.path.join(root_dir, 'app.js')
+
+    def test_build_resources_parallel(self):
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        serial = ResourceLoader(root_dir=root_dir, base_url='/assets/').build_resources
+        expected = [(r.resource_url, r.sha) for r in serial]
+        # Resources come out in a stable, sorted walk order.
+        assert [url for url, _ in expected] == [
+            '/assets/app.js',
+            '/assets/styles.css',
+            '/assets/images/jellybeans.png',
+            '/assets/images/logo.png',
+        ]
+
+        threaded = ResourceLoader(root_dir=root_dir, base_url='/assets/', workers=3)
+        assert [(r.resource_url, r.sha) for r in threaded.build_resources] == expected
+
+        processes = ResourceLoader(
+            root_dir=root_dir, base_url='/assets/', workers=2, use_processes=True)
+        assert [(r.resource_url, r.sha) for r in processes.build_resources] == expected
+
+    def test_build_resources_with_hash_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            # Copy the tree and backdate it so no file falls within the cache's racy window.
+            root_dir = os.path.join(tmp_dir, 'static')
+            shutil.copytree(os.path.join(TEST_FILES_DIR, 'static'), root_dir)
+            for dir_path, _, file_names in os.walk(root_dir):
+                for file_name in file_names:
+                    os.utime(os.path.join(dir_path, file_name), (1e9, 1e9))
+
+            cache = HashCache(os.path.join(tmp_dir, 'hashes.sqlite'))
+            resource_loader = ResourceLoader(
+                root_dir=root_dir, base_url='/assets/', hash_cache=cache)
+            first = sorted((r.resource_url, r.sha) for r in resource_loader.build_resources)
+            assert cache.misses == 4
+
+            second = sorted((r.resource_url, r.sha) for r in resource_loader.build_resources)
+            assert second == first
+            assert cache.hits == 4
+            for r in resource_loader.build_resources:
+                assert r.sha == utils.sha256hash_file(r.local_path)
+            cache.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_build_resources_with_filters(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            root_dir = os.path.join(tmp_dir, 'static')
+            shutil.copytree(os.path.join(TEST_FILES_DIR, 'static'), root_dir)
+            for name in ('app.js.map', os.path.join('node_modules', 'lib', 'index.js')):
+                path = os.path.join(root_dir, name)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'w') as f:
+                    f.write('junk')
+
+            listed = []
+            original_list_dir = walker._list_dir
+
+            def recording_list_dir(path):
+                listed.append(os.path.relpath(path, root_dir))
+                return original_list_dir(path)
+            walker._list_dir = recording_list_dir
+            try:
+                resource_loader = ResourceLoader(
+                    root_dir=root_dir, base_url='/assets/',
+                    exclude=['*.map', 'node_modules/', 'images/*', '!logo.png'])
+                resources = resource_loader.build_resources
+            finally:
+                walker._list_dir = original_list_dir
+
+            assert sorted(r.resource_url for r in resources) == [
+                '/assets/app.js', '/assets/images/logo.png', '/assets/styles.css']
+            assert sorted(listed) == ['.', 'images']
+            stats = resource_loader.scan_stats
+            assert (stats['files'], stats['files_excluded'], stats['dirs_pruned']) == (3, 2, 1)
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_absolute_snapshot_resources(self):
         resource_loader = ResourceLoader(webdriver=FakeWebdriverAbsoluteUrl())
         assert resource_loader.snapshot_resources[0].resource_url == '/'
+
+    def test_referenced_only(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            root_dir = os.path.join(tmp_dir, 'static')
+            shutil.copytree(os.path.join(TEST_FILES_DIR, 'static'), root_dir)
+            with open(os.path.join(root_dir, 'styles.css'), 'w') as f:
+                f.write('@import "extra.css"; .logo { background: url(images/jellybeans.png) }')
+            with open(os.path.join(root_dir, 'extra.css'), 'w') as f:
+                f.write('.x { background: url("/assets/images/logo.png") }')
+
+            resource_loader = ResourceLoader(
+                root_dir=root_dir,
+                base_url='/assets/',
+                webdriver=FakeWebdriverReferencingAssets(),
+                referenced_only=True,
+            )
+            # The tree isn't walked for the build.
+            assert resource_loader.build_resources == []
+
+            resources = resource_loader.snapshot_resources
+            assert resources[0].is_root
+            assert [r.resource_url for r in resources[1:]] == [
+                '/assets/styles.css',
+                '/assets/app.js',
+                '/assets/images/logo.png',
+                '/assets/extra.css',
+                '/assets/images/jellybeans.png',
+            ]
+            for r in resources[1:]:
+                assert r.sha == utils.sha256hash_file(r.local_path)
+
+            # Parse results are reused for the next snapshot of the same content.
+            misses = resource_loader.asset_parser.misses
+            resource_loader.snapshot_resources
+            assert resource_loader.asset_parser.misses == misses
+
+            # Excluded files aren't attached either.
+            resource_loader.path_filter = PathFilter(exclude=['images/'])
+            assert [r.resource_url for r in resource_loader.snapshot_resources[1:]] == [
+                '/assets/styles.css',
+                '/assets/app.js',
+                '/assets/extra.css',
+            ]
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,55 @@
+import unittest
+
+import pytest
+
+from percy import utils
+from percy.resource import Resource
+from percy.resource_table import ResourceTable
+
+
+class TestResourceTable(unittest.TestCase):
+    def setUp(self):
+        self.resources = [
+            Resource(resource_url='/a.css', sha=utils.sha256hash('a'), local_path='/tmp/a.css'),
+            Resource(resource_url='/', content='<html>', is_root=True, mimetype='text/html'),
+            Resource(resource_url='/copy-of-a.css', sha=utils.sha256hash('a'), local_path='/b'),
+        ]
+        self.table = ResourceTable(self.resources)
+
+    def test_rows(self):
+        assert len(self.table) == 3
+        for resource, row in zip(self.resources, self.table):
+            assert resource.serialize() == row.serialize()
+            assert resource.local_path == row.local_path
+            assert resource.content == row.content
+        assert self.table[-1].resource_url == '/copy-of-a.css'
+        with pytest.raises(IndexError):
+            self.table[3]
+
+    def test_sha_index(self):
+        assert self.table.find(utils.sha256hash('a')) == 0
+        assert utils.sha256hash('<html>') in self.table
+        assert self.table.get(utils.sha256hash('<html>')).content == '<html>'
+        assert self.table.get(utils.sha256hash('missing')) is None
+        assert 'not-a-sha' not in self.table
+
+    def test_other_shas(self):
+        # Custom loaders may use any SHA; those rows are kept as given.
+        row = self.table.append('/x', 'not-a-sha', local_path='/tmp/x')
+        assert self.table.find('not-a-sha') == row
+        assert self.table.sha(row) == 'not-a-sha'
+        assert self.table[row].sha == 'not-a-sha'
+        assert self.table.serialize_row(row)['id'] == 'not-a-sha'
+        assert self.table.find(utils.sha256hash('a')) == 0
+
+    def test_serialize(self):
+        assert list(self.table.serialize()) == [r.serialize() for r in self.resources]
+
+    def test_track(self):
+        table = ResourceTable()
+        assert list(table.track(iter(self.resources))) == self.resources
+        assert len(table) == 3
+
+    def test_resource_has_no_dict(self):
+        with pytest.raises(AttributeError):
+            self.resources[0].extra = True
@@ -1,18 +1,46 @@
 import json
 import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
 
 import percy
 import pytest
 import requests_mock
 from percy import errors
+from percy import shard_cache
 from percy import utils
+from percy.shard_cache import ShardUploadCache
 
 FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
 TEST_FILES_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
 
 
+def request_json(request):
+    # Build resource uploads stream their body from disk, so rewind and read it back.
+    if hasattr(request.body, 'read'):
+        request.body.seek(0)
+        return json.loads(request.body.read().decode('utf-8'))
+    return request.json()
+
+
+def build_fixture(missing_shas=()):
+    return {
+        'data': {
+            'id': '123',
+            'type': 'builds',
+            'relationships': {
+                'self': '/api/v1/builds/123',
+                'missing-resources': {
+                    'data': [{'type': 'resources', 'id': sha} for sha in missing_shas],
+                },
+            },
+        },
+    }
+
+
 class FakeWebdriver(object):
     page_source = 'page source'
     current_url = '/'
@@ -47,6 +75,21 @@ class TestRunner(unittest.TestCase):
         runner = percy.Runner(config=percy.Config(default_widths=[1280, 375]))
         assert runner.client.config.default_widths == [1280, 375]
 
+    def test_init_configures_loader_hash_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache_path = os.path.join(tmp_dir, 'hashes.sqlite')
+            index_path = os.path.join(tmp_dir, 'digests.json')
+            config = percy.Config(
+                access_token='foo', hash_cache_path=cache_path, git_index_path=index_path)
+            loader = percy.ResourceLoader(root_dir=TEST_FILES_DIR, base_url='/assets/')
+            runner = percy.Runner(config=config, loader=loader)
+            assert runner.loader.hash_cache.path == cache_path
+            assert runner.loader.git_index.path == index_path
+            runner.loader.hash_cache.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
     @requests_mock.Mocker()
     def test_safe_initialize_when_disabled(self, mock):
         runner = percy.Runner()
@@ -100,7 +143,7 @@ class TestRunner(unittest.TestCase):
         with open(loader.build_resources[0].local_path, 'r') as f:
             content = f.read()
         assert len(content) > 0
-        assert mock.request_history[1].json() == {
+        assert request_json(mock.request_history[1]) == {
             'data': {
                 'type': 'resources',
                 'id': loader.build_resources[0].sha,
@@ -174,6 +217,243 @@ class TestRunner(unittest.TestCase):
             },
         }
 
+    @requests_mock.Mocker()
+    def test_snapshot_referenced_only(self, mock):
+        class Webdriver(object):
+            page_source = '<script src="/assets/app.js"></script><img src="/assets/images/logo.png">'
+            current_url = 'http://localhost/'
+
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        loader = percy.ResourceLoader(
+            root_dir=root_dir, base_url='/assets/', webdriver=Webdriver(), referenced_only=True)
+        runner = percy.Runner(config=percy.Config(access_token='foo'), loader=loader)
+
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+        runner.initialize_build()
+        assert 'relationships' not in mock.request_history[0].json()['data']
+
+        root_sha = utils.sha256hash(Webdriver.page_source)
+        app_js = os.path.join(root_dir, 'app.js')
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', text=json.dumps({
+            'data': {
+                'id': '256',
+                'type': 'snapshots',
+                'relationships': {
+                    'missing-resources': {
+                        'data': [
+                            {'type': 'resources', 'id': root_sha},
+                            {'type': 'resources', 'id': utils.sha256hash_file(app_js)},
+                        ],
+                    },
+                },
+            },
+        }))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": true}')
+        mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+        runner.snapshot(name='foo')
+
+        snapshot_resources = mock.request_history[1].json()['data']['relationships']['resources']
+        assert [r['attributes']['resource-url'] for r in snapshot_resources['data']] == [
+            '/', '/assets/app.js', '/assets/images/logo.png',
+        ]
+        uploaded = [request_json(r)['data']['id'] for r in mock.request_history[2:4]]
+        assert uploaded == [root_sha, utils.sha256hash_file(app_js)]
+        assert mock.request_history[4].url == 'https://percy.io/api/v1/snapshots/256/finalize'
+
+    @requests_mock.Mocker()
+    def test_finalize_build_writes_report(self, mock):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            report_path = os.path.join(tmp_dir, 'report.json')
+            root_dir = os.path.join(TEST_FILES_DIR, 'static')
+            loader = percy.ResourceLoader(
+                root_dir=root_dir, base_url='/assets/', webdriver=FakeWebdriver())
+            config = percy.Config(access_token='foo', report_path=report_path)
+            runner = percy.Runner(config=config, loader=loader)
+            phases = []
+            runner.instrumentation.subscribe(
+                lambda event, data: event == 'phase' and phases.append(data['name']))
+
+            mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+            mock.post('https://percy.io/api/v1/builds/123/snapshots/',
+                      text=json.dumps(SIMPLE_SNAPSHOT_FIXTURE))
+            mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+            mock.post('https://percy.io/api/v1/builds/123/finalize', text='{"success": true}')
+            runner.initialize_build()
+            runner.snapshot(name='foo')
+            runner.finalize_build()
+
+            assert phases == ['scan', 'hash', 'create_build', 'upload', 'snapshot', 'finalize']
+            with open(report_path) as f:
+                report = json.load(f)
+            assert report['requests']['count'] == 4
+            assert report['requests']['by_status'] == {'200': 4}
+            assert report['requests']['by_endpoint']['builds']['count'] == 1
+            assert report['requests']['bytes_sent'] > 0
+            assert sorted(report['phases']) == sorted(phases)
+            assert report['scan']['files'] == 4
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    @requests_mock.Mocker()
+    def test_background_snapshots(self, mock):
+        webdriver = FakeWebdriver()
+        loader = percy.ResourceLoader(webdriver=webdriver)
+        config = percy.Config(access_token='foo', snapshot_workers=2, snapshot_queue_size=2)
+        runner = percy.Runner(config=config, loader=loader)
+
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+        runner.initialize_build()
+
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/',
+                  text=json.dumps(SIMPLE_SNAPSHOT_FIXTURE))
+        mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+        mock.post('https://percy.io/api/v1/builds/123/finalize', text='{"success": true}')
+
+        # Several test threads snapshotting at the same time.
+        threads = [
+            threading.Thread(target=runner.snapshot, kwargs={'name': 'page {}'.format(i)})
+            for i in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        runner.finalize_build()
+
+        urls = [r.url for r in mock.request_history[1:]]
+        assert urls.count('https://percy.io/api/v1/builds/123/snapshots/') == 6
+        assert urls.count('https://percy.io/api/v1/snapshots/256/finalize') == 6
+        # The build is only finalized once every queued snapshot has been sent.
+        assert urls[-1] == 'https://percy.io/api/v1/builds/123/finalize'
+        names = sorted(
+            r.json()['data']['attributes']['name'] for r in mock.request_history
+            if r.url.endswith('/builds/123/snapshots/'))
+        assert names == ['page {}'.format(i) for i in range(6)]
+
+    @requests_mock.Mocker()
+    def test_background_snapshot_errors_surface_at_finalize(self, mock):
+        loader = percy.ResourceLoader(webdriver=FakeWebdriver())
+        config = percy.Config(access_token='foo', snapshot_workers=2)
+        runner = percy.Runner(config=config, loader=loader)
+
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+        runner.initialize_build()
+
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', status_code=400, text='{}')
+        mock.post('https://percy.io/api/v1/builds/123/finalize', text='{"success": true}')
+        runner.snapshot(name='foo')
+        runner.snapshot(name='bar')
+
+        with pytest.raises(errors.SnapshotError) as excinfo:
+            runner.finalize_build()
+        assert sorted(name for name, _ in excinfo.value.failures) == ['bar', 'foo']
+        assert not any(r.url.endswith('/builds/123/finalize') for r in mock.request_history)
+
+    @requests_mock.Mocker()
+    def test_batched_snapshots(self, mock):
+        loader = percy.ResourceLoader(webdriver=FakeWebdriver())
+        config = percy.Config(access_token='foo', snapshot_batch_size=3)
+        runner = percy.Runner(config=config, loader=loader)
+
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+        runner.initialize_build()
+
+        # Every page has the same DOM, and the server reports it missing each time.
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', text=json.dumps({
+            'data': {
+                'id': '256',
+                'type': 'snapshots',
+                'relationships': {
+                    'missing-resources': {
+                        'data': [{'type': 'resources', 'id': utils.sha256hash('page source')}],
+                    },
+                },
+            },
+        }))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": true}')
+        mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+        mock.post('https://percy.io/api/v1/builds/123/finalize', text='{"success": true}')
+
+        runner.snapshot(name='one')
+        runner.snapshot(name='two')
+        assert len(mock.request_history) == 1
+        runner.snapshot(name='three')
+        urls = [r.url for r in mock.request_history[1:]]
+        assert urls.count('https://percy.io/api/v1/builds/123/snapshots/') == 3
+        # The shared root resource is only uploaded once per batch.
+        assert urls.count('https://percy.io/api/v1/builds/123/resources/') == 1
+        assert urls.count('https://percy.io/api/v1/snapshots/256/finalize') == 3
+
+        # A partial batch is flushed when the build is finalized.
+        runner.snapshot(name='four')
+        assert len(mock.request_history) == 8
+        runner.finalize_build()
+        urls = [r.url for r in mock.request_history[8:]]
+        # The root resource was already uploaded for this build, so it isn't sent again.
+        assert urls == [
+            'https://percy.io/api/v1/builds/123/snapshots/',
+            'https://percy.io/api/v1/snapshots/256/finalize',
+            'https://percy.io/api/v1/builds/123/finalize',
+        ]
+        # Later pages find the root already uploaded for this build.
+        assert runner.upload_stats == {'hits': 3, 'misses': 1}
+
+    @requests_mock.Mocker()
+    def test_batched_snapshot_failure_spares_rest_of_batch(self, mock):
+        loader = percy.ResourceLoader(webdriver=FakeWebdriver())
+        config = percy.Config(access_token='foo', snapshot_batch_size=3)
+        runner = percy.Runner(config=config, loader=loader)
+
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+        runner.initialize_build()
+
+        def create_snapshot(request, context):
+            name = request.json()['data']['attributes']['name']
+            if name == 'bad':
+                context.status_code = 400
+                return {'errors': [{'detail': 'bad snapshot'}]}
+            snapshot = json.loads(json.dumps(SIMPLE_SNAPSHOT_FIXTURE))
+            snapshot['data']['id'] = name
+            return snapshot
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/', json=create_snapshot)
+        mock.post('https://percy.io/api/v1/snapshots/a/finalize', text='{"success": true}')
+        mock.post('https://percy.io/api/v1/snapshots/c/finalize', text='{"success": true}')
+        mock.post('https://percy.io/api/v1/builds/123/finalize', text='{"success": true}')
+
+        runner.snapshot(name='a')
+        runner.snapshot(name='bad')
+        # The snapshot that fills the batch isn't blamed for another one's failure.
+        runner.snapshot(name='c')
+        urls = [r.url for r in mock.request_history]
+        assert 'https://percy.io/api/v1/snapshots/a/finalize' in urls
+        assert 'https://percy.io/api/v1/snapshots/c/finalize' in urls
+
+        with pytest.raises(errors.SnapshotError) as excinfo:
+            runner.finalize_build()
+        assert [name for name, _ in excinfo.value.failures] == ['bad']
+        assert 'https://percy.io/api/v1/builds/123/finalize' not in [
+            r.url for r in mock.request_history]
+
+    @requests_mock.Mocker()
+    def test_batched_snapshots_flush_interval(self, mock):
+        loader = percy.ResourceLoader(webdriver=FakeWebdriver())
+        config = percy.Config(
+            access_token='foo', snapshot_batch_size=10, snapshot_flush_interval=0)
+        runner = percy.Runner(config=config, loader=loader)
+
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(SIMPLE_BUILD_FIXTURE))
+        runner.initialize_build()
+        mock.post('https://percy.io/api/v1/builds/123/snapshots/',
+                  text=json.dumps(SIMPLE_SNAPSHOT_FIXTURE))
+        mock.post('https://percy.io/api/v1/snapshots/256/finalize', text='{"success": true}')
+
+        runner.snapshot(name='one')
+        assert [r.url for r in mock.request_history[1:]] == [
+            'https://percy.io/api/v1/builds/123/snapshots/',
+            'https://percy.io/api/v1/snapshots/256/finalize',
+        ]
+
     @requests_mock.Mocker()
     def test_finalize_build(self, mock):
         config = percy.Config(access_token='foo')
@@ -196,3 +476,64 @@ class TestRunner(unittest.TestCase):
         runner = percy.Runner()
         assert runner._is_enabled == False
         runner.finalize_build()
+
+    @requests_mock.Mocker()
+    def test_initialize_build_uploads_all_missing_resources(self, mock):
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        loader = percy.ResourceLoader(root_dir=root_dir, base_url='/assets/')
+        config = percy.Config(access_token='foo', upload_workers=3)
+        runner = percy.Runner(config=config, loader=loader)
+
+        shas = sorted(set(r.sha for r in loader.build_resources))
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(build_fixture(shas)))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": true}')
+        runner.initialize_build()
+
+        uploaded_shas = sorted(request_json(r)['data']['id'] for r in mock.request_history[1:])
+        assert uploaded_shas == shas
+
+    @requests_mock.Mocker()
+    def test_initialize_build_shares_uploads_between_parallel_workers(self, mock):
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        cache_path = os.path.join(tmp_dir, 'shards.sqlite')
+        loader = percy.ResourceLoader(root_dir=root_dir, base_url='/assets/')
+        config = percy.Config(access_token='foo', upload_workers=2, shard_cache_path=cache_path)
+        runner = percy.Runner(config=config, loader=loader)
+
+        shas = sorted(set(r.sha for r in loader.build_resources))
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(build_fixture(shas)))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', text='{"success": true}')
+
+        # Another worker on this machine already uploaded one resource and is uploading a second.
+        other = ShardUploadCache(cache_path, 'nonce')
+        other.mark_uploaded(shas[0])
+        other.claim(shas[1])
+        finished = threading.Timer(0.2, other.mark_uploaded, args=(shas[1],))
+        finished.start()
+        try:
+            runner.initialize_build(parallel_nonce='nonce', parallel_total_shards=2)
+        finally:
+            finished.join()
+            other.close()
+
+        uploaded_shas = sorted(request_json(r)['data']['id'] for r in mock.request_history[1:])
+        assert uploaded_shas == shas[2:]
+        with ShardUploadCache(cache_path, 'nonce') as cache:
+            assert set(cache.claim_many(shas).values()) == set([shard_cache.UPLOADED])
+
+    @requests_mock.Mocker()
+    def test_initialize_build_reports_all_upload_failures(self, mock):
+        root_dir = os.path.join(TEST_FILES_DIR, 'static')
+        loader = percy.ResourceLoader(root_dir=root_dir, base_url='/assets/')
+        config = percy.Config(access_token='foo', upload_workers=2)
+        runner = percy.Runner(config=config, loader=loader)
+
+        shas = sorted(set(r.sha for r in loader.build_resources))
+        mock.post('https://percy.io/api/v1/builds/', text=json.dumps(build_fixture(shas)))
+        mock.post('https://percy.io/api/v1/builds/123/resources/', status_code=400, text='{}')
+
+        with pytest.raises(errors.ResourceUploadError) as excinfo:
+            runner.initialize_build()
+        assert sorted(r.sha for r, _ in excinfo.value.failures) == shas
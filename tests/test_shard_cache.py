@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from percy import shard_cache
+from percy.shard_cache import ShardUploadCache
+
+
+class TestShardUploadCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_dir, 'cache', 'shards.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_claim_and_upload(self):
+        with ShardUploadCache(self.cache_path, 'nonce') as first, \
+                ShardUploadCache(self.cache_path, 'nonce') as second:
+            assert first.claim('abc') == shard_cache.CLAIMED
+            # Claiming again is harmless for the owner, but others see it as busy.
+            assert first.claim('abc') == shard_cache.CLAIMED
+            assert second.claim('abc') == shard_cache.BUSY
+
+            first.mark_uploaded('abc')
+            assert first.claim('abc') == shard_cache.UPLOADED
+            assert second.claim('abc') == shard_cache.UPLOADED
+
+    def test_claims_are_scoped_to_nonce(self):
+        with ShardUploadCache(self.cache_path, 'one') as first, \
+                ShardUploadCache(self.cache_path, 'two') as second:
+            first.mark_uploaded('abc')
+            assert second.claim('abc') == shard_cache.CLAIMED
+
+    def test_claim_many(self):
+        with ShardUploadCache(self.cache_path, 'nonce') as first, \
+                ShardUploadCache(self.cache_path, 'nonce') as second:
+            first.claim('a')
+            first.mark_uploaded('b')
+            states = second.claim_many(['a', 'b', 'c'])
+            assert states == {
+                'a': shard_cache.BUSY, 'b': shard_cache.UPLOADED, 'c': shard_cache.CLAIMED}
+
+    def test_release_lets_another_worker_take_over(self):
+        with ShardUploadCache(self.cache_path, 'nonce') as first, \
+                ShardUploadCache(self.cache_path, 'nonce') as second:
+            first.claim('abc')
+            # Only the owner's claim is released.
+            second.release('abc')
+            assert second.claim('abc') == shard_cache.BUSY
+            first.release('abc')
+            assert second.claim('abc') == shard_cache.CLAIMED
+
+    def test_stale_claims_are_taken_over(self):
+        with ShardUploadCache(self.cache_path, 'nonce') as first, \
+                ShardUploadCache(self.cache_path, 'nonce', claim_timeout=0.05) as second:
+            first.claim('abc')
+            assert second.claim('abc') == shard_cache.BUSY
+            time.sleep(0.1)
+            assert second.claim('abc') == shard_cache.CLAIMED
+            assert first.claim('abc') == shard_cache.BUSY
+
+    def test_concurrent_claims_have_one_winner(self):
+        caches = [ShardUploadCache(self.cache_path, 'nonce') for _ in range(4)]
+        winners = []
+
+        def claim(cache):
+            states = cache.claim_many(str(i) for i in range(50))
+            winners.extend(sha for sha, state in states.items() if state == shard_cache.CLAIMED)
+
+        threads = [threading.Thread(target=claim, args=(cache,)) for cache in caches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for cache in caches:
+            cache.close()
+        assert sorted(winners) == sorted(str(i) for i in range(50))
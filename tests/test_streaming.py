@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+from percy import utils
+from percy import streaming
+from percy.streaming import ResourceUploadBody, SpooledBody
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+class TestResourceUploadBody(unittest.TestCase):
+    def expected_json(self, path):
+        with open(path, 'rb') as f:
+            content = f.read()
+        return {
+            'data': {
+                'type': 'resources',
+                'id': utils.sha256hash(content),
+                'attributes': {
+                    'base64-content': utils.base64encode(content),
+                },
+            },
+        }
+
+    def test_read(self):
+        path = os.path.join(TEST_FILES_DIR, 'static', 'images', 'logo.png')
+        with ResourceUploadBody(utils.sha256hash_file(path), path, chunk_size=3 * 7) as body:
+            data = body.read()
+        assert len(data) == len(body)
+        assert json.loads(data.decode('utf-8')) == self.expected_json(path)
+
+    def test_small_reads_and_rewind(self):
+        path = os.path.join(TEST_FILES_DIR, 'static', 'styles.css')
+        body = ResourceUploadBody(utils.sha256hash_file(path), path, chunk_size=3)
+        first = b''.join(iter(lambda: body.read(5), b''))
+        assert body.tell() == len(body) == len(first)
+
+        body.seek(0)
+        assert body.tell() == 0
+        assert b''.join(body) == first
+        assert json.loads(first.decode('utf-8')) == self.expected_json(path)
+        body.close()
+
+    def test_empty_file(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            with ResourceUploadBody('abc', path) as body:
+                data = body.read()
+            assert len(data) == len(body)
+            assert json.loads(data.decode('utf-8'))['data']['attributes']['base64-content'] == ''
+        finally:
+            os.remove(path)
+
+
+class TestIterencode(unittest.TestCase):
+    def test_streams_items(self):
+        data = {'data': {'type': 'builds', 'resources': streaming.STREAM_PLACEHOLDER}}
+        items = ({'id': i} for i in range(3))
+        chunks = list(streaming.iterencode(data, items))
+        assert len(chunks) > 3
+        assert json.loads(b''.join(chunks).decode('utf-8')) == {
+            'data': {'type': 'builds', 'resources': [{'id': 0}, {'id': 1}, {'id': 2}]},
+        }
+
+    def test_empty_and_without_placeholder(self):
+        data = {'data': streaming.STREAM_PLACEHOLDER}
+        assert json.loads(b''.join(streaming.iterencode(data, [])).decode('utf-8')) == {
+            'data': [],
+        }
+        assert b''.join(streaming.iterencode({'a': 1}, [1, 2])) == b'{"a": 1}'
+
+
+class TestSpooledBody(unittest.TestCase):
+    def test_spills_to_disk(self):
+        with SpooledBody(max_memory=10) as body:
+            body.write(b'12345')
+            assert body.in_memory
+            body.write(b'678901')
+            assert not body.in_memory
+            assert len(body) == 11
+            assert body.getvalue() == b'12345678901'
+            body.seek(0)
+            assert body.read(4) == b'1234'
+            assert body.tell() == 4
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+from percy.instrumentation import Instrumentation
+from percy.throttle import AdaptiveThrottle, parse_retry_after
+
+
+class TestAdaptiveThrottle(unittest.TestCase):
+    def test_additive_increase(self):
+        throttle = AdaptiveThrottle(max_limit=8, initial_limit=2)
+        for _ in range(2):
+            throttle.release(throttle.acquire(), 200)
+        # +1/2, then +1/2.5: about one per round trip of `limit` requests.
+        assert abs(throttle.limit - 2.9) < 1e-9
+        for _ in range(100):
+            throttle.release(throttle.acquire(), 200)
+        assert throttle.limit == 8
+
+    def test_multiplicative_decrease_once_per_round_trip(self):
+        throttle = AdaptiveThrottle(max_limit=8)
+        started = [throttle.acquire() for _ in range(3)]
+        for started_at in started:
+            throttle.release(started_at, 503)
+        assert throttle.limit == 4
+        assert throttle.stats['decreases'] == 1
+
+        # A request sent after the decrease can shrink it again, down to min_limit.
+        for _ in range(5):
+            throttle.release(throttle.acquire(), None)
+        assert throttle.limit == 1
+        assert throttle.in_flight == 0
+
+    def test_slow_responses_decrease(self):
+        throttle = AdaptiveThrottle(max_limit=8)
+        throttle.release(time.time() - 0.5, 200, key='builds')
+        throttle.release(time.time() - 5.0, 200, key='resources')
+        assert throttle.limit == 8
+        throttle.release(time.time() - 5.0, 200, key='builds')
+        assert throttle.limit == 4
+
+    def test_large_bodies_are_not_slow(self):
+        throttle = AdaptiveThrottle(max_limit=8)
+        throttle.release(time.time() - 0.1, 200, key='resources', size=1024)
+        # A multi-MB upload takes longer because of its size, not because of congestion.
+        throttle.release(time.time() - 5.0, 200, key='resources', size=5 * 1024 * 1024)
+        assert throttle.limit == 8
+        throttle.release(time.time() - 5.0, 200, key='resources', size=1024)
+        assert throttle.limit == 4
+
+    def test_limit_blocks(self):
+        throttle = AdaptiveThrottle(max_limit=1)
+        started_at = throttle.acquire()
+        acquired = threading.Event()
+
+        def second():
+            throttle.release(throttle.acquire(), 200)
+            acquired.set()
+
+        thread = threading.Thread(target=second)
+        thread.start()
+        assert not acquired.wait(0.1)
+        throttle.release(started_at, 200)
+        assert acquired.wait(5)
+        thread.join()
+        assert throttle.stats['throttled_waits'] == 1
+
+    def test_retry_after_pauses_all_requests(self):
+        events = []
+        instrumentation = Instrumentation()
+        instrumentation.subscribe(lambda event, data: events.append((event, data['kind'])))
+        throttle = AdaptiveThrottle(instrumentation=instrumentation)
+
+        assert throttle.backoff(1, retry_after='0.2') is not None
+        start = time.time()
+        throttle.release(throttle.acquire(), 200)
+        assert time.time() - start >= 0.15
+        assert throttle.metrics()['pauses'] == 1
+        assert events == [('throttle', 'pause')]
+
+    def test_jittered_backoff(self):
+        throttle = AdaptiveThrottle(backoff_factor=0.01)
+        for attempt in range(1, 4):
+            assert 0 <= throttle.backoff(attempt) <= 0.01 * 2 ** attempt
+        assert throttle.stats['retries'] == 3
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('120') == 120
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('soon') is None
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+        future = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 30))
+        assert 25 < parse_retry_after(future) <= 30
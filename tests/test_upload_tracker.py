@@ -0,0 +1,93 @@
+import threading
+import unittest
+
+import pytest
+
+from percy.upload_tracker import UploadTracker
+
+
+class TestUploadTracker(unittest.TestCase):
+    def test_skips_uploaded_sha(self):
+        tracker = UploadTracker()
+        calls = []
+        assert tracker.upload(1, 'abc', lambda: calls.append('abc') or 'ok') == 'ok'
+        assert tracker.upload(1, 'abc', lambda: calls.append('abc') or 'ok') is None
+        assert calls == ['abc']
+        assert tracker.stats == {'hits': 1, 'misses': 1}
+
+    def test_builds_are_separate(self):
+        tracker = UploadTracker()
+        tracker.upload(1, 'abc', lambda: 'ok')
+        assert tracker.upload(2, 'abc', lambda: 'ok') == 'ok'
+
+        tracker.forget(1)
+        assert tracker.upload(1, 'abc', lambda: 'ok') == 'ok'
+        assert tracker.stats == {'hits': 0, 'misses': 3}
+
+    def test_failed_upload_is_retried(self):
+        tracker = UploadTracker()
+
+        def fail():
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError):
+            tracker.upload(1, 'abc', fail)
+        assert tracker.upload(1, 'abc', lambda: 'ok') == 'ok'
+
+    def test_joins_in_flight_upload(self):
+        tracker = UploadTracker()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_upload():
+            calls.append('upload')
+            started.set()
+            release.wait(5)
+            return 'ok'
+
+        owner = threading.Thread(target=tracker.upload, args=(1, 'abc', slow_upload))
+        owner.start()
+        started.wait(5)
+
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(tracker.upload(1, 'abc', slow_upload)))
+        waiter.start()
+        release.set()
+        owner.join()
+        waiter.join()
+
+        assert calls == ['upload']
+        assert results == [None]
+        assert tracker.stats == {'hits': 1, 'misses': 1}
+
+    def test_waiter_takes_over_failed_upload(self):
+        tracker = UploadTracker()
+        started = threading.Event()
+        release = threading.Event()
+
+        def failing_upload():
+            started.set()
+            release.wait(5)
+            raise ValueError('boom')
+
+        def owner():
+            try:
+                tracker.upload(1, 'abc', failing_upload)
+            except ValueError:
+                pass
+
+        owner_thread = threading.Thread(target=owner)
+        owner_thread.start()
+        started.wait(5)
+
+        results = []
+        waiter = threading.Thread(
+            target=lambda: results.append(tracker.upload(1, 'abc', lambda: 'retried')))
+        waiter.start()
+        release.set()
+        owner_thread.join()
+        waiter.join()
+
+        assert results == ['retried']
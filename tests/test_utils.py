@@ -38,3 +38,14 @@ class TestPercyUtils(unittest.TestCase):
           binary_content = '\x01\x02\x99'
 
         self.assertEqual(utils.base64encode(binary_content), 'AQKZ')
+
+    def test_sha256hash_file(self):
+        path = os.path.join(os.path.dirname(__file__), 'testdata', 'static', 'styles.css')
+        with open(path, 'rb') as f:
+            content = f.read()
+        self.assertEqual(utils.sha256hash_file(path, chunk_size=7), utils.sha256hash(content))
+
+    def test_git_output(self):
+        self.assertEqual(utils.git_output(['--version'])[:12], b'git version ')
+        # git exits nonzero.
+        self.assertIsNone(utils.git_output(['rev-parse', '--verify', 'no-such-ref-' * 3]))
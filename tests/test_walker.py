@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from percy import utils
+from percy import walker
+from percy.path_filter import PathFilter
+from percy.resource_loader import ResourceLoader
+from percy.walker import walk_files
+
+TEST_FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+
+def os_walk_files(root_dir):
+    paths = []
+    for root, dirs, files in os.walk(root_dir, followlinks=True):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files))
+    return paths
+
+
+class TestWalkFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp_dir, 'static')
+        shutil.copytree(os.path.join(TEST_FILES_DIR, 'static'), self.root_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_matches_sorted_os_walk(self):
+        for root_dir in (TEST_FILES_DIR, self.root_dir):
+            paths = [path for path, _, _ in walk_files(root_dir)]
+            assert paths == os_walk_files(root_dir)
+
+    def test_listdir_fallback(self):
+        original = walker.scandir
+        walker.scandir = None
+        try:
+            stats = {}
+            files = list(walk_files(self.root_dir, stats=stats))
+        finally:
+            walker.scandir = original
+        assert [path for path, _, _ in files] == os_walk_files(self.root_dir)
+        assert all(first_seen for _, _, first_seen in files)
+        assert stats['files'] == 4
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'needs symlinks')
+    def test_symlink_cycles_and_duplicate_inodes(self):
+        images_dir = os.path.join(self.root_dir, 'images')
+        os.symlink(self.root_dir, os.path.join(images_dir, 'loop'))
+        os.symlink(images_dir, os.path.join(self.root_dir, 'pictures'))
+        os.symlink(os.path.join(self.tmp_dir, 'gone'), os.path.join(self.root_dir, 'broken'))
+        os.link(os.path.join(self.root_dir, 'app.js'), os.path.join(self.root_dir, 'copy.js'))
+
+        stats = {}
+        files = [
+            (os.path.relpath(path, self.root_dir), first_seen)
+            for path, _, first_seen in walk_files(self.root_dir, stats=stats)]
+        assert files == [
+            ('app.js', True),
+            ('copy.js', False),
+            ('styles.css', True),
+            (os.path.join('images', 'jellybeans.png'), True),
+            (os.path.join('images', 'logo.png'), True),
+            (os.path.join('pictures', 'jellybeans.png'), False),
+            (os.path.join('pictures', 'logo.png'), False),
+        ]
+        assert stats['symlink_cycles'] == 2
+        assert stats['duplicate_inodes'] == 3
+        assert stats['errors'] == 1
+
+    def test_stats(self):
+        with open(os.path.join(self.root_dir, 'big.bin'), 'wb') as f:
+            f.write(b'x' * 101)
+        stats = {}
+        list(walk_files(
+            self.root_dir, path_filter=PathFilter(exclude=['images/', '*.css']), max_size=100,
+            stats=stats))
+        assert stats == {
+            'files': 1, 'files_excluded': 1, 'files_too_large': 1, 'dirs_pruned': 1,
+            'duplicate_inodes': 0, 'symlink_cycles': 0, 'errors': 0,
+        }
+
+    def test_missing_root_dir(self):
+        stats = {}
+        assert list(walk_files(os.path.join(self.tmp_dir, 'missing'), stats=stats)) == []
+        assert stats['errors'] == 1
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'needs symlinks')
+    def test_loader_reuses_digests_for_duplicate_inodes(self):
+        os.symlink(
+            os.path.join(self.root_dir, 'images'), os.path.join(self.root_dir, 'pictures'))
+        hashed = []
+        original = utils.sha256hash_file
+
+        def counting_hash(path):
+            hashed.append(path)
+            return original(path)
+        utils.sha256hash_file = counting_hash
+        try:
+            loader = ResourceLoader(root_dir=self.root_dir, base_url='/assets/', workers=2)
+            resources = dict((r.resource_url, r.sha) for r in loader.build_resources)
+        finally:
+            utils.sha256hash_file = original
+
+        assert len(hashed) == 4
+        assert len(resources) == 6
+        assert resources['/assets/pictures/logo.png'] == resources['/assets/images/logo.png']
+        assert loader.scan_stats['duplicate_inodes'] == 2